@@ -248,6 +248,13 @@ def main():
                   "BD":"bd_redumper"
                 },
             "output": "",
+            "job_db": None,
+            "convert_workers": None,
+            "convert_threads": None,
+            "verify_retries": 0,
+            "musicbrainz_cache": None,
+            "convert_cache": None,
+            "convert_cache_size": 20,
             "watch": None,
             "fifo": False
         }
@@ -8,7 +8,7 @@ import subprocess
 from datetime import datetime
 from pathlib import Path
 import time
-import random
+import threading
 from pprint import pprint
 
 # External Modules
@@ -40,6 +40,17 @@ if __name__ == "__main__":
 else:
     from handler.controller.controller_handler import ControllerHandler as ControllerParent
 
+try:
+    from handler.util.robot_queue import RobotQueue
+    from handler.util.lock import QueueLock
+    from handler.util.serial_broker import SerialClient
+except ImportError:
+    # Probably running directly
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../util'))
+    from robot_queue import RobotQueue
+    from lock import QueueLock
+    from serial_broker import SerialClient
+
 
 class ControllerAutoPublisherLS(ControllerParent):
     """Handler for CD Aleratec AutoPublisher LS
@@ -58,8 +69,8 @@ class ControllerAutoPublisherLS(ControllerParent):
         self.type_id="AutoPublisherLS"
         # Default id
         self.controller_id = "apls"
-        # Instance check delay
-        self.delay = 5
+        # Serial port settings
+        self.serial_options={"baudrate":9600, "parity":serial.PARITY_EVEN, "timeout":30}
         # Default config data
         self.config_data={
             "camera":self.camera_defaults,
@@ -70,6 +81,8 @@ class ControllerAutoPublisherLS(ControllerParent):
             "serial_port":None,
             "drives":[], # media_name, open
             "drive_focus": [35,35,30],
+            "plan_max_wait":120, # Seconds before a request is run ahead of planned order
+            "plan_tray_cost":2000, # Tray movement cost in arm calibration steps when planning
             "cal":
                 {
                     "BIN_1":652,
@@ -98,8 +111,14 @@ class ControllerAutoPublisherLS(ControllerParent):
                 0
                 ],
             "drive_open":[False,False,False],
+            "arm_drive":None,
             "active":False
             }
+        # Tray being closed in background
+        self.tray_thread=None
+        # Lock for using robot
+        self.robot_lock=None
+        self.robot_lock_pid=None
 
         # Device commands (use python string format to add params)
         self.cmd = {
@@ -215,8 +234,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         #if d is None or n is None:
         if 1:
             print("Full cal")
-            for cal_cmd in self.cal:
-                self.cmdSend(cal_cmd)
+            self.cmdSendBatch(self.cal)
 
             # Drive 1 tray height
             self.cmdSend(f"c09d21n{self.config_data["cal"]["DRIVE_1"]}")
@@ -265,8 +283,10 @@ class ControllerAutoPublisherLS(ControllerParent):
                 os.remove(f"{tmp}/instance.json")
             return
 
-        with open(f"{tmp}/instance.json", 'w', encoding="utf-8") as output:
+        # Replace in one step so readers never see a partial file
+        with open(f"{tmp}/instance.json.tmp", 'w', encoding="utf-8") as output:
             output.write(json.dumps(instance, indent=4))
+        os.replace(f"{tmp}/instance.json.tmp", f"{tmp}/instance.json")
 
 
     def instance_get(self):
@@ -299,28 +319,44 @@ class ControllerAutoPublisherLS(ControllerParent):
         self.instance_save(self.instance_data)
 
 
-    def active(self,state=None):
+    def robotLock(self):
+        """ Get lock shared by all processes using this robot
+
+        """
+        if self.robot_lock is None or self.robot_lock_pid != os.getpid():
+            self.robot_lock=QueueLock(f"/tmp/discrip/apls/{self.controller_id}/lock")
+            self.robot_lock_pid=os.getpid()
+        return self.robot_lock
+
+
+    def active(self,state=None,request=None):
         """ Manage active state to prevent multiple process from trying to
         use robot at once
 
+        Processes get the robot in the order they asked for it. If a request
+        is given, waiting stops when another process has already run it.
         """
 
         # Block execution until robot is inactive
         if state is None:
             # Wait if the arm is doing another task
-            while self.instance_data["active"]:
-                time.sleep(self.delay + random.random()*self.delay)
-                #TODO - reload json data
-                self.instance_data = self.instance_get()
+            while not self.robotLock().acquire(timeout=1):
+                # Another process already ran the request
+                if request is not None and self.robotQueue().result(request) is not None:
+                    self.robotLock().release()
+                    return False
 
             # Claim active status and perform action
+            self.instance_data = self.instance_get()
             self.instance_data["active"]=True
             self.instance_save(self.instance_data)
-            return
+            return True
         else:
             # Set active status to provided value
             self.instance_data["active"]=state
             self.instance_save(self.instance_data)
+            if not state:
+                self.robotLock().release()
 
 
     def initialize(self):
@@ -331,6 +367,7 @@ class ControllerAutoPublisherLS(ControllerParent):
 
         # Clear existing instance data
         self.instance_save(None)
+        self.robotQueue().clear()
 
         # Setup bin order stuff
         self.setBin(self.config_data["bin"])
@@ -369,7 +406,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         """
 
         # Open serial port
-        ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_EVEN,)
+        ser = self.serialOpen()
         # Prepare
         ser.dtr=False
         ser.reset_input_buffer()
@@ -412,6 +449,10 @@ class ControllerAutoPublisherLS(ControllerParent):
                     cmd_stat=False
                     ser.write( bytes(self.cmd["CLEAR_ALARM"]+"\n",'ascii',errors='ignore') )
 
+            except serial.SerialException:
+                # Connection to the port is gone so reading would never end
+                ser.close()
+                raise
             except Exception as e:
                 print("Unexpected response error")
 
@@ -419,6 +460,47 @@ class ControllerAutoPublisherLS(ControllerParent):
         return response
 
 
+    def cmdSendBatch(self, cmd_lines):
+        """ Send several standard commands in one exchange with the serial
+        broker
+
+        Falls back to sending one at a time if the port was opened directly.
+        """
+        ser = self.serialOpen()
+        if not isinstance(ser, SerialClient):
+            ser.close()
+            return [self.cmdSend(cmd_line) for cmd_line in cmd_lines]
+
+        # Prepare
+        ser.dtr=False
+        ser.reset_input_buffer()
+        ser.reset_output_buffer()
+
+        # Responses end the same way as for cmdSend
+        results = ser.batch([
+            {
+                "data": cmd_line+"\n",
+                "until": [cmd_line[:3].upper(), "PARAM", "C00", "S01C01E00I11111000O11111111"],
+                "clear": self.cmd["CLEAR_ALARM"]+"\n"
+            }
+            for cmd_line in cmd_lines
+        ])
+        ser.close()
+
+        responses=[]
+        for cmd_line, lines in zip(cmd_lines, results):
+            response = lines[-1]
+            if self.config_data["debug_print"]:
+                print(f"[{str(datetime.now().isoformat())}] {cmd_line}: {response}")
+            if "S01C01E00I11111000O11111111" in response:
+                print("Command failed")
+                response = None
+            elif response == "" or response == '\x15':
+                print("Assuming error")
+            responses.append(response)
+        return responses
+
+
     def cmd_unloadIfNotEmpty(self, drive, hopper = 5):
         """ C10 wrapped unload command
 
@@ -428,7 +510,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         """
 
         # Open serial port
-        ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_EVEN,)
+        ser = self.serialOpen()
         # Prepare
         ser.dtr=False
         ser.reset_input_buffer()
@@ -495,7 +577,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         """
 
         # Open serial port
-        ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_EVEN,)
+        ser = self.serialOpen()
         # Prepare
         ser.dtr=False
         ser.reset_input_buffer()
@@ -568,7 +650,7 @@ class ControllerAutoPublisherLS(ControllerParent):
             sys.exit(0)
 
         # Open serial port
-        ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_EVEN,)
+        ser = self.serialOpen()
         # Prepare
         ser.dtr=False
         ser.reset_input_buffer()
@@ -637,7 +719,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         """
 
         # Open serial port
-        ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_EVEN,)
+        ser = self.serialOpen()
         # Prepare
         ser.dtr=False
         ser.reset_input_buffer()
@@ -668,6 +750,10 @@ class ControllerAutoPublisherLS(ControllerParent):
                     # Instantly reclamp disc before it falls
                     ser.write( bytes(self.cmd["GRAB"]+"\n",'ascii',errors='ignore') )
                     cmd_stat=False
+            except serial.SerialException:
+                # Connection to the port is gone, nothing can be sent to it
+                ser.close()
+                raise
             except Exception as e:
                     print("Probably dropped the disc")
                     cmd_stat=False
@@ -707,33 +793,98 @@ class ControllerAutoPublisherLS(ControllerParent):
         self.osRun(["eject","-t", f"{self.config_data["drives"][drive-1]}"])
 
 
-    def load(self, drive):
-        """ Managed load into drive
-        Takes drive path and loads next available disc into it
+    def trayCloseOthers(self, drive, timing):
+        """ Close all trays except one at the same time
+
+        """
+        # Tray closed in background by previous request
+        self.trayWait()
+        start=time.time()
+        closing=[]
+        for i in range(1, 4):
+            if i != drive:
+                closing.append(threading.Thread(target=self.drive_trayClose, args=(i,)))
+                self.instance_data["drive_open"][i-1]=False
+        for thread in closing:
+            thread.start()
+        for thread in closing:
+            thread.join()
+        timing["tray"]+=time.time()-start
+
+
+    def trayCloseLater(self, drive):
+        """ Close tray in background while the next request starts
+
+        """
+        self.tray_thread=threading.Thread(target=self.drive_trayClose, args=(drive,))
+        self.tray_thread.start()
+        self.instance_data["drive_open"][drive-1]=False
 
-        Automatically switches to next bin when empty
+
+    def trayWait(self):
+        """ Wait for background tray close
 
         """
-        #Read instance data from JSON
-        self.instance_data = self.instance_get()
-        # Wait until inactive
-        self.active()
+        if self.tray_thread is not None:
+            self.tray_thread.join()
+            self.tray_thread=None
+
+
+    def robotQueue(self):
+        """ Get queue of load and eject requests for this robot
+
+        """
+        return RobotQueue(f"/tmp/discrip/apls/{self.controller_id}/requests")
+
+
+    def planCost(self, request):
+        """ Estimate cost of running a request next
 
+        Tray movements cost the most so requests on a drive with its tray
+        already open come first, then requests needing the least arm travel.
+        """
+        drive=request["drive"]
+        drive_open=self.instance_data["drive_open"]
+        cost=0
+        # Other trays are closed at the same time
+        if any(drive_open[i-1] for i in range(1, 4) if i != drive):
+            cost+=self.config_data["plan_tray_cost"]
+        if not drive_open[drive-1]:
+            cost+=self.config_data["plan_tray_cost"]
+        # Arm travel from the last drive used
+        arm_drive=self.instance_data.get("arm_drive")
+        if arm_drive is not None:
+            cost+=abs(self.config_data["cal"][f"DRIVE_{drive}"]-self.config_data["cal"][f"DRIVE_{arm_drive}"])
+        return cost
+
+
+    def planNext(self, pending):
+        """ Pick next request to run from all pending requests
+
+        """
+        # Don't let planning keep a request waiting forever
+        overdue=[request for request in pending if time.time()-request["time"] > self.config_data["plan_max_wait"]]
+        if overdue:
+            return overdue[0]
+        # Pending is in order added so ties are first come first served
+        return min(pending, key=self.planCost)
+
+
+    def runLoad(self, drive_load, timing):
+        """ Load next available disc into drive
+
+        """
         # Find which bin has new media (internally tracked)
         bin_load = self.instance_data["bin_load"]
-        # Get drive ID from drive path
-        drive_load=self.config_data["drives"].index(drive)+1
         # Close all other trays if open
-        for i in range(1, 4):
-            if i != drive_load:
-                self.drive_trayClose(i)
-                self.instance_data["drive_open"][i-1]=False
+        self.trayCloseOthers(drive_load, timing)
         # Check if tray was only left open (internally tracked)
         if not self.instance_data["drive_open"][drive_load-1]:
             # False: closed
+            start=time.time()
             self.drive_trayOpen(drive_load)
+            timing["tray"]+=time.time()-start
             self.instance_data["drive_open"][drive_load-1]=True
-            #time.sleep(5)
 
         # Save tray status
         self.instance_save(self.instance_data)
@@ -742,6 +893,7 @@ class ControllerAutoPublisherLS(ControllerParent):
         end = self.instance_data["bin_unload"]
 
         # Run load command
+        self.instance_data["arm_drive"]=drive_load
         loading_disc=True
         while(loading_disc):
             # Attempt load
@@ -754,55 +906,141 @@ class ControllerAutoPublisherLS(ControllerParent):
                 bin_load = self.instance_data["bin_load"]
                 # If next bin was last unload error out assuming no new media
                 if self.instance_data["bin_load"] == end:
-                    print("No discs found")
-                    sys.exit(0) # TODO - Need to be able to halt here until media is found
+                    return {"status":"empty"}
 
         # Take disc photo
+        start=time.time()
         self.cmdSend(self.cmd["MOVE_BIN_1"])
         time.sleep(1)
         self.photoDrive(self.cleanFilename(self.config_data["drives"][drive_load-1]), self.config_data["drive_focus"][drive_load-1])
+        timing["photo"]+=time.time()-start
 
-        # Close tray for reading
-        self.drive_trayClose(drive_load)
-        self.instance_data["drive_open"][drive_load-1]=False
-        # Release active state
-        self.active(False)
-        return False
+        # Close tray for reading while the next request starts
+        self.trayCloseLater(drive_load)
+        return {"status":"loaded"}
 
 
-
-    def eject(self, drive):
-        """ Managed unload from drive
-        Takes drive path and unloads to tracked output hopper
-
-        Automatically switches to next bin when empty
+    def runEject(self, drive_unload, timing):
+        """ Unload disc from drive to tracked output hopper
 
         """
-        #Read instance data from JSON
-        self.instance_data = self.instance_get()
-        # Wait until inactive
-        self.active()
-
-        # Get drive ID from drive path
-        drive_unload=self.config_data["drives"].index(drive)+1
         # Close all other trays if open
-        for i in range(1, 4):
-            if i != drive_unload:
-                self.drive_trayClose(i)
-                self.instance_data["drive_open"][i-1]=False
+        self.trayCloseOthers(drive_unload, timing)
         # eject tray
+        start=time.time()
         self.drive_trayOpen(drive_unload)
-        #time.sleep(5) # Wait for tray action
+        timing["tray"]+=time.time()-start
 
         # Run unload command
+        self.instance_data["arm_drive"]=drive_unload
         self.cmd_unload(drive_unload,self.instance_data["bin_unload"])
         # Add to bin count
         self.instance_data["bin_count"][self.instance_data["bin_unload"]-1]+=1
-        # leave tray open for quick loading5
+        # leave tray open for quick loading
         self.instance_data["drive_open"][drive_unload-1]=True
-        self.instance_save(self.instance_data)
-        # Release active state
-        self.active(False)
+        return {"status":"ejected"}
+
+
+    def runPlanned(self, queue):
+        """ Run all pending requests in planned order
+
+        Called while holding the robot so requests from every drive are run
+        without each process waiting for the active state.
+        """
+        batch=0
+        while True:
+            pending=queue.pending()
+            if not pending:
+                return
+            request=self.planNext(pending)
+
+            start=time.time()
+            timing={
+                "op": request["op"],
+                "drive": request["drive"],
+                "queued": start-request["time"],
+                "batch": batch,
+                "tray": 0,
+                "photo": 0
+            }
+            if request["op"] == "load":
+                result=self.runLoad(request["drive"], timing)
+            else:
+                result=self.runEject(request["drive"], timing)
+            timing["run"]=time.time()-start
+            timing["status"]=result["status"]
+
+            self.instance_save(self.instance_data)
+            queue.finish(request, result)
+            self.reportTiming(timing)
+            batch+=1
+
+
+    def reportTiming(self, timing):
+        """ Print and store timing of a request
+
+        """
+        print(f"[{self.controller_id}] {timing["op"]} drive {timing["drive"]}: queued {timing["queued"]:.1f}s, run {timing["run"]:.1f}s (tray {timing["tray"]:.1f}s, photo {timing["photo"]:.1f}s), batch position {timing["batch"]}")
+        tmp=self.ensureDir("/tmp/discrip/apls/"+self.controller_id)
+        timing["time"]=time.time()
+        with open(f"{tmp}/timing.jsonl", 'a', encoding="utf-8") as output:
+            output.write(json.dumps(timing)+"\n")
+
+
+    def runRequest(self, request):
+        """ Wait for a request to be run, running the queue if the robot is free
+
+        """
+        queue=self.robotQueue()
+        while True:
+            result=queue.collect(request)
+            if result is not None:
+                return result
+
+            #Read instance data from JSON
+            self.instance_data = self.instance_get()
+            # Wait until inactive or request was run by another process
+            if not self.active(request=request):
+                continue
+            try:
+                self.runPlanned(queue)
+            finally:
+                # Leave trays in a known state for the next process
+                self.trayWait()
+                self.active(False)
+                # Finish saving photos after the robot is free
+                self.photoWait()
+
+
+    def load(self, drive):
+        """ Managed load into drive
+        Takes drive path and loads next available disc into it
+
+        Automatically switches to next bin when empty. Requests from all
+        drives are queued and run in planned order by the process that has
+        the robot.
+
+        """
+        # Get drive ID from drive path
+        drive_load=self.config_data["drives"].index(drive)+1
+        result=self.runRequest(self.robotQueue().submit("load", drive_load))
+        if result["status"] == "empty":
+            print("No discs found")
+            sys.exit(0) # TODO - Need to be able to halt here until media is found
+        return False
+
+
+
+    def eject(self, drive):
+        """ Managed unload from drive
+        Takes drive path and unloads to tracked output hopper
+
+        Automatically switches to next bin when empty
+
+        """
+        # Get drive ID from drive path
+        drive_unload=self.config_data["drives"].index(drive)+1
+        self.runRequest(self.robotQueue().submit("eject", drive_unload))
         return True
 
 
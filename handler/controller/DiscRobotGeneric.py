@@ -72,6 +72,13 @@ if __name__ == "__main__":
 else:
     from handler.controller.controller_handler import ControllerHandler
 
+try:
+    from handler.util.lock import QueueLock
+except ImportError:
+    # Probably running directly
+    sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '../util'))
+    from lock import QueueLock
+
 
 class ControllerDiscRobotGeneric(ControllerHandler):
     """Handler for generic disc changing robot
@@ -92,6 +99,8 @@ class ControllerDiscRobotGeneric(ControllerHandler):
         self.type_id="DiscRobotGeneric"
         # Default id
         self.controller_id = "changer"
+        # Serial port settings
+        self.serial_options={"baudrate":9600, "parity":serial.PARITY_NONE, "timeout":30}
         # Default config data
         self.config_data={
             "debug_print":True,
@@ -105,6 +114,9 @@ class ControllerDiscRobotGeneric(ControllerHandler):
             "active":False
             }
         self.instance_data={}
+        # Lock for using robot
+        self.robot_lock=None
+        self.robot_lock_pid=None
 
         # Device commands
         self.cmd = {
@@ -127,9 +139,11 @@ class ControllerDiscRobotGeneric(ControllerHandler):
                 os.remove(f"{tmp}/instance.json")
             return
 
-        with open(f"{tmp}/instance.json", 'w', encoding="utf-8") as output:
+        # Replace in one step so readers never see a partial file
+        with open(f"{tmp}/instance.json.tmp", 'w', encoding="utf-8") as output:
             print("saving file?")
             output.write(json.dumps(instance, indent=4))
+        os.replace(f"{tmp}/instance.json.tmp", f"{tmp}/instance.json")
 
 
     def instance_get(self):
@@ -148,21 +162,30 @@ class ControllerDiscRobotGeneric(ControllerHandler):
             return self.instance_data_init
 
 
+    def robotLock(self):
+        """ Get lock shared by all processes using this robot
+
+        """
+        if self.robot_lock is None or self.robot_lock_pid != os.getpid():
+            self.robot_lock=QueueLock(f"/tmp/discrip/cdchanger/{self.controller_id}/lock")
+            self.robot_lock_pid=os.getpid()
+        return self.robot_lock
+
+
     def active(self,state=None):
         """ Manage active state to prevent multiple process from trying to
         use robot at once
 
+        Processes get the robot in the order they asked for it.
         """
 
         # Block execution until robot is inactive
         if state is None:
             # Wait if the arm is doing another task
-            while self.instance_data["active"]:
-                time.sleep(1)
-                #TODO - reload json data
-                self.instance_data = self.instance_get()
+            self.robotLock().acquire()
 
             # Claim active status and perform action
+            self.instance_data = self.instance_get()
             self.instance_data["active"]=True
             self.instance_save(self.instance_data)
             return
@@ -170,6 +193,8 @@ class ControllerDiscRobotGeneric(ControllerHandler):
             # Set active status to provided value
             self.instance_data["active"]=state
             self.instance_save(self.instance_data)
+            if not state:
+                self.robotLock().release()
 
 
     def initialize(self):
@@ -201,7 +226,7 @@ class ControllerDiscRobotGeneric(ControllerHandler):
 
         # Open serial port
         try:
-            ser = serial.Serial(self.config_data["serial_port"],9600,timeout=30,parity=serial.PARITY_NONE,)
+            ser = self.serialOpen()
             # Prepare
             ser.reset_input_buffer()
             ser.reset_output_buffer()
@@ -35,6 +35,8 @@ class ControllerRoboRacerLS(ControllerHandler):
         self.type_id="RoboRacerLS"
         # Default config data
         self.config_data={"serial_port":None}
+        # Serial port settings, device resets when the port is opened
+        self.serial_options={"baudrate":9600, "timeout":1, "settle":1}
         # Device commands
         self.cmd = {
             "CLEAR":"\r\n",
@@ -48,8 +50,7 @@ class ControllerRoboRacerLS(ControllerHandler):
     def initialize(self):
         try:
             # Arm up
-            with serial.Serial(self.config_data["serial_port"],9600,timeout=1) as ser:
-                time.sleep(1)
+            with self.serialOpen() as ser:
                 ser.write( bytes(self.cmd["ARM_DOWN"],'ascii',errors='ignore') )
                 time.sleep(3)
                 ser.write( bytes(self.cmd["ARM_UP"],'ascii',errors='ignore') )
@@ -64,7 +65,7 @@ class ControllerRoboRacerLS(ControllerHandler):
     def load(self, drive):
         try:
             # Arm up
-            with serial.Serial(self.config_data["serial_port"],9600,timeout=1) as ser:
+            with self.serialOpen() as ser:
                 ser.write( bytes(self.cmd["ARM_UP"],'ascii',errors='ignore') )
                 time.sleep(0.5)
 
@@ -73,7 +74,7 @@ class ControllerRoboRacerLS(ControllerHandler):
             time.sleep(5)
 
             # Drop disc
-            with serial.Serial(self.config_data["serial_port"],9600,timeout=1) as ser:
+            with self.serialOpen() as ser:
                 ser.write( bytes(self.cmd["DISC_DROP"],'ascii',errors='ignore') )
                 time.sleep(5)
 
@@ -91,7 +92,7 @@ class ControllerRoboRacerLS(ControllerHandler):
     def eject(self, drive):
         try:
             # Arm down
-            with serial.Serial(self.config_data["serial_port"],9600,timeout=1) as ser:
+            with self.serialOpen() as ser:
                 ser.write( bytes(self.cmd["ARM_DOWN"],'ascii',errors='ignore') )
                 time.sleep(5)
 
@@ -6,6 +6,7 @@
 import sys, os
 import json
 import time
+import threading
 from enum import Enum
 from datetime import datetime
 
@@ -16,11 +17,6 @@ except Exception as e:
     # Probably running directly
     sys.path.append('../../handler')
     from handler import Handler
-try:
-    from wand.image import Image
-except Exception as e:
-        print("Need to install Python module [wand]")
-        sys.exit(1)
 
 class ControllerHandler(Handler):
     """Base class for Media Types to handle identification and ripping
@@ -54,12 +50,35 @@ class ControllerHandler(Handler):
                 "crop_y1":1080,
                 "focus":0
             }
+        # Serial port settings for controllers using a serial port
+        self.serial_options=None
+        # Photos being saved
+        self.photo_threads=[]
 
 
     def initialize(self):
         return
 
 
+    def serialStart(self):
+        """Start broker keeping the serial port open
+
+        Run by the scheduler before rip processes are started.
+        """
+        if self.serial_options is None or self.config_data.get("serial_port") is None:
+            return
+        from handler.util.serial_broker import SerialBroker
+        SerialBroker.start(self.config_data["serial_port"], **self.serial_options)
+
+
+    def serialOpen(self):
+        """Get connection to serial port, through its broker when running
+
+        """
+        from handler.util.serial_broker import SerialBroker
+        return SerialBroker.connect(self.config_data["serial_port"], **(self.serial_options or {}))
+
+
     def controllerMatch(self, media_sample=None):
         """Check if the media sample should be handled by this type"""
         return media_sample["controller_type"] == self.type_id
@@ -70,8 +89,30 @@ class ControllerHandler(Handler):
             callback(callback_arg)
 
 
+    def cameraStart(self):
+        """Start capture service keeping the camera streaming
+
+        Run by the scheduler before rip processes are started.
+        """
+        if self.config_data is None or "camera" not in self.config_data or self.config_data["camera"]["video_id"] == -1:
+            return
+        from handler.util.camera import CameraService
+        try:
+            CameraService.start(
+                self.config_data["camera"]["video_id"],
+                self.config_data["camera"]["camera_x"],
+                self.config_data["camera"]["camera_y"])
+        except Exception as e:
+            print(f"Could not start camera service, photos will open the camera each time: {repr(e)}")
+
+
     def photoDrive(self,driveName, focus=None):
-        """ Take a photo of media related to drive """
+        """ Take a photo of media related to drive
+
+        Only the frame is captured before returning, it is converted and saved
+        in the background so the robot can keep moving. A pending marker is
+        left beside the photo until it is saved.
+        """
 
         # Check if camera is configured
         if self.config_data["camera"]["video_id"] == -1:
@@ -85,52 +126,74 @@ class ControllerHandler(Handler):
         drivepath=driveName+"/"
 
         print("Taking photo of media")
-        from linuxpy.video.device import Device, MenuControl, VideoCapture, BufferType
-        # Init camera device
-        cam = Device.from_id(self.config_data["camera"]["video_id"])
-        cam.open()
-        # set camera data format
-        capture = VideoCapture(cam)
-        capture.set_format(
-            self.config_data["camera"]["camera_x"],
-            self.config_data["camera"]["camera_y"],
-            "YUYV"
-            )
-        cam.controls["focus_automatic_continuous"].value=False
-        cam.controls["focus_absolute"].value=focus
-        time.sleep(3)
-
-        # get frame from camera
-        img = None
-        for i, frame in enumerate(cam):
-            if i > 30:
-                img = frame
-                break
-
-        # extract raw data from frame
-        raw_yuv = list(img.data)
-
-        # Byteswap for wand
-        hold = None
-        for i in range(0,len(raw_yuv),2):
-            hold = raw_yuv[i]
-            raw_yuv[i] = raw_yuv[i+1]
-            raw_yuv[i+1] = hold
-        data = bytes(raw_yuv)
-        cam.close()
-
-        with Image(blob=data, format='UYVY',width=self.config_data["camera"]["camera_x"],height=self.config_data["camera"]["camera_y"],depth=8,colorspace="yuv") as image:
-            # Build path to save image
-            tmp=self.ensureDir("/tmp/discrip/photo/"+drivepath)
-            # Apply crop
-            image.crop(
-                self.config_data["camera"]["crop_x0"],
-                self.config_data["camera"]["crop_y0"],
-                self.config_data["camera"]["crop_x1"],
-                self.config_data["camera"]["crop_y1"],
-                )
-
-            image.save(filename=tmp+"photo.jpg")
+        from handler.util.camera import CameraService, capture_direct
+        try:
+            # Latest frame from capture service
+            data = CameraService.frame(self.config_data["camera"]["video_id"], focus)
+        except OSError as e:
+            # No service running or its camera stopped, open camera for this photo
+            print(f"Camera service not available, capturing directly: {repr(e)}")
+            data = capture_direct(
+                self.config_data["camera"]["video_id"],
+                self.config_data["camera"]["camera_x"],
+                self.config_data["camera"]["camera_y"],
+                focus)
+
+        # Build path to save image
+        tmp=self.ensureDir("/tmp/discrip/photo/"+drivepath)
+        # Old photo must not be used for this media
+        with open(tmp+"photo.pending", 'w', encoding="utf-8") as output:
+            output.write(str(os.getpid()))
+        if os.path.isfile(tmp+"photo.jpg"):
+            os.remove(tmp+"photo.jpg")
+
+        thread = threading.Thread(target=self.photoSave, args=(data, tmp))
+        thread.start()
+        self.photo_threads.append(thread)
+        return True
+
+
+    def photoSave(self, data, tmp):
+        """ Convert frame and save photo
+
+        """
+        try:
+            try:
+                from wand.image import Image
+            except Exception as e:
+                # Exiting would only end this thread and leave the marker
+                print("Need to install Python module [wand]")
+                return
+
+            # Byteswap YUYV to UYVY for wand
+            data = bytearray(data)
+            data[0::2], data[1::2] = data[1::2], data[0::2]
+
+            with Image(blob=bytes(data), format='UYVY',width=self.config_data["camera"]["camera_x"],height=self.config_data["camera"]["camera_y"],depth=8,colorspace="yuv") as image:
+                # Apply crop
+                image.crop(
+                    self.config_data["camera"]["crop_x0"],
+                    self.config_data["camera"]["crop_y0"],
+                    self.config_data["camera"]["crop_x1"],
+                    self.config_data["camera"]["crop_y1"],
+                    )
+
+                # Replace in one step so photo is never read partially written
+                image.save(filename=tmp+"photo.tmp.jpg")
+            os.replace(tmp+"photo.tmp.jpg", tmp+"photo.jpg")
+        except Exception as e:
+            print(f"Could not save photo: {repr(e)}")
+        finally:
+            os.remove(tmp+"photo.pending")
+
+
+    def photoWait(self):
+        """ Wait for photos being saved by this process
+
+        """
+        for thread in self.photo_threads:
+            thread.join()
+        self.photo_threads=[]
 
 
     def load(self, drive):
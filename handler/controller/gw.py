@@ -16,6 +16,7 @@ import pycdio, cdio
 
 # Internal Modules
 from handler.controller.controller_handler import ControllerHandler
+from handler.util.lock import QueueLock
 
 
 class ControllerGw(ControllerHandler):
@@ -37,24 +38,30 @@ class ControllerGw(ControllerHandler):
         # Data types output
         self.data_outputs=[]
         self.cd_tracks=0
+        # Lock for floppy bus
+        self.bus_lock=None
+        self.bus_lock_pid=None
         return
 
     def floppy_bus_check(self, state=None):
-        """Sets and stores PID state of a process as a dict in json to /tmp folder
+        """Lock the floppy bus shared by all drives on this controller
 
+        True waits for and takes the bus, False releases it and no state waits
+        until the bus is free. The bus is freed if the process using it dies.
         """
         print(f"Checking bus of : {self.controller_id}")
 
-        tmp=self.ensureDir("/tmp/discrip/gw")
+        if self.bus_lock is None or self.bus_lock_pid != os.getpid():
+            self.bus_lock=QueueLock(f"/tmp/discrip/gw/{self.controller_id}.lock")
+            self.bus_lock_pid=os.getpid()
+
         if state is None:
-            # read
-            while os.path.isfile(f"{tmp}/{self.controller_id}"):
-                time.sleep(3)
+            # Wait for turn then let rip take the bus
+            self.bus_lock.acquire()
+            self.bus_lock.release()
         else:
-            # write
             print(f"Setting bus state: {self.controller_id} = {state}")
             if state:
-                Path(f"{tmp}/{self.controller_id}").touch()
+                self.bus_lock.acquire()
             else:
-                os.remove(f"{tmp}/{self.controller_id}")
-
+                self.bus_lock.release()
@@ -3,22 +3,24 @@
 # Media ripping manager for pyDiscRip. Can be used to rip a CD and fetch metadata
 
 # External Modules
-import pyudev
 from pprint import pprint
 
 # Internal Modules
-from handler.controller.RoboRacerLS import ControllerRoboRacerLS
-from handler.controller.AutoPublisherLS import ControllerAutoPublisherLS
-from handler.controller.DiscRobotGeneric import ControllerDiscRobotGeneric
-from handler.controller.gw import ControllerGw
-# Testing only
-from handler.media.dummy import MediaHandlerDummy
+from handler.util.registry import HandlerRegistry
 
 class ControllerHandlerManager(object):
     """Manager for controllers
 .
     """
 
+    # All supported controllers, handlers are imported when first used
+    HANDLERS={
+        "RoboRacerLS": {"module": "handler.controller.RoboRacerLS", "class": "ControllerRoboRacerLS", "type_id": "RoboRacerLS"},
+        "AutoPublisherLS": {"module": "handler.controller.AutoPublisherLS", "class": "ControllerAutoPublisherLS", "type_id": "AutoPublisherLS"},
+        "DiscRobotGeneric": {"module": "handler.controller.DiscRobotGeneric", "class": "ControllerDiscRobotGeneric", "type_id": "DiscRobotGeneric"},
+        "Greaseweazle": {"module": "handler.controller.gw", "class": "ControllerGw", "type_id": "Greaseweazle"},
+    }
+
     def __init__(self):
         """Constructor to setup basic data and config defaults
 
@@ -27,12 +29,7 @@ class ControllerHandlerManager(object):
         super().__init__()
 
         # Add all supported media types
-        self.controller_types={}
-        self.controller_types["RoboRacerLS"] = ControllerRoboRacerLS()
-        self.controller_types["AutoPublisherLS"] = ControllerAutoPublisherLS()
-        self.controller_types["DiscRobotGeneric"] = ControllerDiscRobotGeneric()
-        self.controller_types["Greaseweazle"] = ControllerGw()
+        self.controller_types=HandlerRegistry(ControllerHandlerManager.HANDLERS)
 
     def getController(self,controller_type):
-        return(self.controller_types[controller_type])
-
+        return(self.controller_types.get(controller_type))
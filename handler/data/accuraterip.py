@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+
+# AccurateRip verification module for pyDiscRip.
+
+# Python System
+import os
+import json
+
+# Internal Modules
+from handler.data.data_handler import DataHandler
+from handler.util.cuesheet import CueSheet
+from handler.util.accuraterip import track_checksums, disc_ids, dbar_name, AccurateRipDatabase
+
+
+class DataHandlerAccurateRip(DataHandler):
+    """Handler for verifying BINCUE audio with AccurateRip
+
+    Calculates AccurateRip v1/v2 and CRC32 of each audio track and compares
+    them to a local copy of the AccurateRip database. The result is stored as
+    verified in the data output:
+        True - every audio track matched
+        False - the disc is known but some tracks did not match
+        None - the disc could not be checked
+
+    Options are read from the ACCURATERIP section of the config rather than
+    the BINCUE section of the type it handles:
+        {"ACCURATERIP": {"database": "~/accuraterip", "read_offset": 6}}
+    """
+
+    def __init__(self):
+        """Constructor to setup basic data and config defaults
+
+        """
+        # Call parent constructor
+        super().__init__()
+        # Set handle ID
+        self.handle_id="DataHandlerAccurateRip"
+        # Set data type to handle
+        self.type_id="BINCUE"
+        # Options have their own config section
+        self.config_id="ACCURATERIP"
+        # Default config data
+        self.config_data={
+            "database": None, # Folder of dBAR files or JSON stand-ins
+            "read_offset": 0 # Drive read offset in samples
+        }
+        # Data types output
+        self.data_outputs=["ACCURATERIP"]
+
+
+    def readTrack(self, sheet, track):
+        """Read audio of a track corrected for the drive read offset
+
+        Audio outside the BIN is read as silence.
+        """
+        shift=int(self.config_data["read_offset"])*4
+        bin_path=sheet.filePath(sheet.files[track["file"]])
+        start=track["offset"]+shift
+        end=track["end"]+shift
+
+        with open(bin_path, 'rb') as bin_file:
+            size=os.fstat(bin_file.fileno()).st_size
+            bin_file.seek(max(0, start))
+            data=bin_file.read(max(0, min(end, size)-max(0, start)))
+
+        # Pad samples shifted past either end of the BIN
+        return bytes(max(0, -start)) + data + bytes(max(0, end-max(start, size)))
+
+
+    def matchTrack(self, pressings, index, result):
+        """Find best match for a track in the pressings of a disc
+
+        """
+        result["confidence"]=0
+        result["matched"]=None
+        for pressing in pressings:
+            if index >= len(pressing["tracks"]):
+                continue
+            entry=pressing["tracks"][index]
+            for version in ["v1", "v2"]:
+                if entry.get("crc") == int(result[version], 16) and entry["confidence"] >= result["confidence"]:
+                    result["confidence"]=entry["confidence"]
+                    result["matched"]=version
+            if "crc32" in entry and entry["crc32"] == int(result["crc32"], 16) and result["matched"] is None:
+                result["matched"]="crc32"
+                result["confidence"]=entry.get("confidence", 0)
+
+
+    def convertData(self, data_in):
+        """Checksum all audio tracks of a BINCUE and check them
+
+        """
+        cue_path=f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}"
+        sheet=CueSheet.load(cue_path)
+
+        # Disc IDs are based on track positions within the session
+        offsets=[sheet.files[track["file"]]["sector_base"]+track["start"] for track in sheet.tracks]
+        leadout=sheet.files[-1]["sector_base"]+sheet.files[-1]["sectors"]
+        id1, id2, cddb = disc_ids(offsets, leadout)
+        report={
+            "disc_id": dbar_name(len(sheet.tracks), id1, id2, cddb),
+            "database": self.config_data["database"],
+            "read_offset": self.config_data["read_offset"],
+            "tracks": [],
+            "verified": None
+        }
+
+        # Discs with several sessions can't be identified from one session
+        pressings=None
+        if len(sheet.sessions) == 1:
+            pressings=AccurateRipDatabase(self.config_data["database"]).lookup(len(sheet.tracks), id1, id2, cddb)
+        if pressings is None:
+            print(f"Disc [{report["disc_id"]}] not found in AccurateRip database")
+
+        # Checksum audio tracks
+        for index, track in enumerate(sheet.tracks):
+            if track["mode"] != "AUDIO":
+                continue
+            v1, v2, crc32 = track_checksums(
+                self.readTrack(sheet, track),
+                first=index == 0,
+                last=index == len(sheet.tracks)-1)
+            result={
+                "number": track["number"],
+                "v1": f"{v1:08x}",
+                "v2": f"{v2:08x}",
+                "crc32": f"{crc32:08x}"
+            }
+            if pressings is not None:
+                self.matchTrack(pressings, index, result)
+            print(f"Track {track["number"]}: v1 {result["v1"]} v2 {result["v2"]} crc32 {result["crc32"]} matched {result.get("matched")}")
+            report["tracks"].append(result)
+
+        # Set verified only if the disc was found
+        if pressings is not None and len(report["tracks"]) > 0:
+            report["verified"]=all(result["matched"] is not None for result in report["tracks"])
+
+        # Build data output
+        data = {
+            "type_id": "ACCURATERIP",
+            "processed_by": [],
+            "verified": report["verified"],
+            "data_dir": self.ensureDir(f"{self.getPath()}/ACCURATERIP"),
+            "data_files": {
+                "JSON": f"{data_in["data_files"]["CUE"].replace(".cue","")}.json"
+            }
+        }
+        with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
+            output.write(json.dumps(report, indent=4))
+        self.log("accuraterip",report,json_output=True)
+
+        # Return all generated data
+        return [data]
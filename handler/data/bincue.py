@@ -10,12 +10,15 @@ import json
 
 # Internal Modules
 from handler.data.data_handler import DataHandler
+from handler.util.binsplit import cue_split
+from handler.util.cuesheet import CueSheet
+from handler.util.convert_cache import ConvertCache
 
 
 class DataHandlerBINCUE(DataHandler):
     """Handler for BINCUE data types
 
-    Extracts files using bchunk
+    Splits tracks into WAV and ISO files with binsplit
     """
 
     def __init__(self):
@@ -33,7 +36,7 @@ class DataHandlerBINCUE(DataHandler):
 
 
     def convertData(self,data_in):
-        """Use bchunk to extract all WAVs and ISOs from BINCUE
+        """Split all WAVs and ISOs from BINCUE
 
         """
 
@@ -63,58 +66,44 @@ class DataHandlerBINCUE(DataHandler):
             }
         }
 
-        # Check for files in ouput directory
-        wavs = glob.glob(f"{data_wav["data_dir"]}/*.wav")
-        isos = glob.glob(f"{data_iso["data_dir"]}/*.iso")
-
-        # Don't re-convert if files exist
-        if len(wavs) == 0 and len(isos) == 0 :
-
-            if type(data_in["data_files"]["BIN"]) is list:
-                if len(data_in["data_files"]["BIN"]) > 1:
-
-                    with open(f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}") as in_cue:
-                        with open(f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}-s1.cue", 'w') as out_cue:
-                            for line in in_cue:
-                                if not "SESSION 02" in line:
-                                    out_cue.write(line+"\n")
-                                else:
-                                    break
-                    # Build bchunk command to generate CUE
-                    cmd = [
-                        "bchunk",
-                        "-w",
-                        f"{data_in["data_dir"]}/{data_in["data_files"]["BIN"][0]}",
-                        f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}-s1.cue",
-                        f"{data_wav["data_dir"]}/track"
-                    ]
-
-
-                else:
-                    # Build bchunk command to generate CUE
-                    cmd = [
-                        "bchunk",
-                        "-w",
-                        f"{data_in["data_dir"]}/{data_in["data_files"]["BIN"][0]}",
-                        f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}",
-                        f"{data_wav["data_dir"]}/track"
-                    ]
-
-
-            else:
-                # Build bchunk command to generate CUE
-                cmd = [
-                    "bchunk",
-                    "-w",
-                    f"{data_in["data_dir"]}/{data_in["data_files"]["BIN"]}",
-                    f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}",
-                    f"{data_wav["data_dir"]}/track"
-                ]
-
-            # Run command
-            result = self.osRun(cmd)
-            self.log("bchunk_stdout",str(result.stdout))
-            self.log("bchunk_stderr",str(result.stderr))
+        # Conversion is keyed by the CUE and every BIN it uses
+        cache = ConvertCache.get(self.settings)
+        try:
+            sheet = CueSheet.load(f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}")
+            inputs = [f"{data_in["data_dir"]}/{data_in["data_files"]["CUE"]}"]
+            inputs += [sheet.filePath(bin_file) for bin_file in sheet.files]
+            key = cache.key(self.handle_id, inputs, self.config_data, [f"WAV/{bin_path}", f"ISO9660/{bin_path}"]) if cache is not None else None
+        except Exception as e:
+            print(f"Could not read BINCUE: {repr(e)}")
+            self.log("binsplit_error",repr(e))
+            sheet = None
+
+        # Don't re-convert if outputs for the same BINCUE are cached, or
+        # without a cache if any outputs exist
+        if cache is None:
+            convert = len(glob.glob(f"{data_wav["data_dir"]}/*.wav")) == 0 and len(glob.glob(f"{data_iso["data_dir"]}/*.iso")) == 0
+        else:
+            convert = sheet is not None and cache.restore(key, self.getPath()) is None
+        if sheet is not None and convert:
+
+            # Outputs of an earlier attempt may be partial and can be linked
+            # to cached files so they are removed rather than overwritten
+            for stale in glob.glob(f"{data_wav["data_dir"]}/*.wav") + glob.glob(f"{data_iso["data_dir"]}/*.iso"):
+                os.remove(stale)
+
+            # Split all sessions and BIN files into tracks
+            try:
+                written = cue_split(
+                    sheet,
+                    data_wav["data_dir"],
+                    data_iso["data_dir"])
+                self.log("binsplit",written,json_output=True)
+                # Record outputs only after all were written
+                if cache is not None:
+                    cache.store(key, self.getPath(), [os.path.relpath(filepath, self.getPath()) for filepath in written])
+            except Exception as e:
+                print(f"Could not split BINCUE: {repr(e)}")
+                self.log("binsplit_error",repr(e))
 
 
         # Get files in ouput directory
@@ -11,6 +11,7 @@ import json
 # Internal Modules
 from handler.data.data_handler import DataHandler
 from handler.util.bincon import cue_by_line
+from handler.util.cuesheet import CueSheet
 
 
 class DataHandlerBINCUESPLIT(DataHandler):
@@ -34,7 +35,7 @@ class DataHandlerBINCUESPLIT(DataHandler):
 
 
     def convertData(self,data_in):
-        """Use bchunk to extract all WAVs and ISOs from BINCUE
+        """Merge split BIN files of each session into one BIN
 
         """
         # Build data output
@@ -50,7 +51,8 @@ class DataHandlerBINCUESPLIT(DataHandler):
         }
 
         # Merge BIN files
-        cue_by_line(data_in["data_dir"]+"/"+data_in["data_files"]["CUE"], data_in["data_files"]["CUE"].replace(".cue",""),path=data["data_dir"])
+        sheet = CueSheet.load(data_in["data_dir"]+"/"+data_in["data_files"]["CUE"])
+        cue_by_line(sheet, data_in["data_files"]["CUE"].replace(".cue",""),path=data["data_dir"])
 
 
         # Get files in output directory
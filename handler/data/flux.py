@@ -14,6 +14,7 @@ from pprint import pprint
 
 # Internal Modules
 from handler.data.data_handler import DataHandler
+from handler.util.convert_cache import ConvertCache
 
 
 class DataHandlerFLUX(DataHandler):
@@ -133,17 +134,48 @@ class DataHandlerFLUX(DataHandler):
 
 
 
-        # Don't re-convert flux
-        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BINARY"]}"):
+        # Conversion is keyed by the flux and gw settings
+        cache = ConvertCache.get(self.settings)
+        if isinstance(data_in["data_files"]["flux"], list):
+            inputs = [f"{data_in["data_dir"]}/{flux}" for flux in data_in["data_files"]["flux"]]
+        else:
+            inputs = [f"{data_in["data_dir"]}/{data_in["data_files"]["flux"]}"]
+        output = f"BINARY/{data["data_files"]["BINARY"]}"
+        if cache is not None:
+            key = cache.key(self.handle_id, inputs, self.config_data, [output])
+
+        # Don't re-convert flux with the same settings, or without a cache
+        # if the output exists
+        if cache is None:
+            convert = not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BINARY"]}")
+        else:
+            convert = cache.restore(key, self.getPath()) is None
+        if convert:
+            # Output of an earlier attempt may be partial or linked to a
+            # cached file so it is removed rather than overwritten
+            if os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BINARY"]}"):
+                os.remove(f"{data["data_dir"]}/{data["data_files"]["BINARY"]}")
+
             # Run the gw read process using arguments
             try:
-                # Use default diskdef
-                args = self.buildArgs(data_in, data)
-                res = main(args)
+                try:
+                    # Use default diskdef
+                    args = self.buildArgs(data_in, data)
+                    res = main(args)
+                except Exception as e:
+                    # Use repo diskdef
+                    args = self.buildArgs(data_in, data,default_diskdef=False)
+                    res = main(args)
             except Exception as e:
-                # Use repo diskdef
-                args = self.buildArgs(data_in, data,default_diskdef=False)
-                res = main(args)
+                # Leave flux unprocessed rather than output a missing image
+                print(f"Could not convert flux: {repr(e)}")
+                self.log("gw_convert_error",repr(e))
+                return None
+
+            # Record output only after conversion worked, gw returns nothing
+            # or 0 when it did
+            if cache is not None and res in [None, 0] and os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BINARY"]}"):
+                cache.store(key, self.getPath(), [output])
 
         # Return all generated data
         return [data]
@@ -14,6 +14,7 @@ from pprint import pprint
 
 # Internal Modules
 from handler.data.data_handler import DataHandler
+from handler.util.convert_cache import ConvertCache
 
 
 class DataHandlerHXCImage(DataHandler):
@@ -52,9 +53,25 @@ class DataHandlerHXCImage(DataHandler):
 
         print("Make image")
 
-        # Don't re-render image
-        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["PNG"]}"):
-            script=os.path.realpath(__file__).replace(os.path.basename(__file__),"")+"/../../config/handler/hxc_image/config.script"
+        # Rendering is keyed by the flux and hxcfe script
+        cache = ConvertCache.get(self.settings)
+        script=os.path.realpath(__file__).replace(os.path.basename(__file__),"")+"/../../config/handler/hxc_image/config.script"
+        output = f"status/{data["data_files"]["PNG"]}"
+        if cache is not None:
+            key = cache.key(self.handle_id, [f"{data_in["data_dir"]}/{data_in["data_files"]["flux"][0]}", script], self.config_data, [output])
+
+        # Don't re-render image of the same flux, or without a cache if the
+        # image exists
+        if cache is None:
+            convert = not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["PNG"]}")
+        else:
+            convert = cache.restore(key, self.getPath()) is None
+        if convert:
+            # Image of an earlier attempt may be partial or linked to a
+            # cached file so it is removed rather than overwritten
+            if os.path.exists(f"{data["data_dir"]}/{data["data_files"]["PNG"]}"):
+                os.remove(f"{data["data_dir"]}/{data["data_files"]["PNG"]}")
+
             # Build hxcfe command
             cmd = [
                 "hxcfe",
@@ -78,6 +95,10 @@ class DataHandlerHXCImage(DataHandler):
             img.save(filename=f"{os.getcwd()}/{data["data_dir"]}/{data["data_files"]["PNG"]}")
             os.remove(f"{os.getcwd()}/{data["data_dir"]}/{data["data_files"]["PNG"]}.bmp")
 
+            # Record image only after it was rendered
+            if cache is not None and result.returncode == 0:
+                cache.store(key, self.getPath(), [output])
+
         # Return all generated data
         return [data]
 
@@ -6,15 +6,17 @@
 import os
 import glob
 import json
+import struct
 
 # Internal Modules
 from handler.data.data_handler import DataHandler
+from handler.util.isoread import IsoImage
 
 
 class DataHandlerISO9660(DataHandler):
-    """Handler for BINCUE data types
+    """Handler for ISO9660 data types
 
-    Extracts files using 7zip
+    Extracts files by reading the image directly, using 7zip for other formats
     """
 
     def __init__(self):
@@ -27,14 +29,41 @@ class DataHandlerISO9660(DataHandler):
         self.handle_id="DataHandlerISO9660"
         # Set data type to handle
         self.type_id="ISO9660"
+        # Default config data
+        self.config_data={
+            "extract":True, # Extract files from image
+            "manifest":True, # Write file list with hashes beside image
+            "workers":None # Files read at once, defaults to thread pool size
+        }
         # Data types output
         self.data_outputs=["Z_FILES"]
 
 
+    def extract7z(self,iso_path,out_dir):
+        """Use 7-zip to extract files out of images that aren't ISO9660
+
+        """
+        # Build 7z command to extract files
+        cmd = [
+            "7z",
+            "-y",
+            "x",
+            iso_path,
+            f"-o{out_dir}"
+        ]
+
+        # Run command
+        result = self.osRun(cmd)
+        self.log("7z_stdout",str(result.stdout.decode("utf-8")))
+        self.log("7z_stderr",str(result.stderr.decode("utf-8")))
+
+
     def convertData(self,data):
-        """Use 7-zip to extract files out of ISO
+        """Read ISO9660 directly to write a manifest and extract files
 
         """
+        outputs=[]
+        manifests=[]
 
         # Go through all ISOs
         for iso in data["data_files"]["ISO"]:
@@ -43,7 +72,7 @@ class DataHandlerISO9660(DataHandler):
             data_files = {
                 "type_id": "Z_FILES",
                 "processed_by": [],
-                "data_dir": self.ensureDir(f"{data["data_dir"]}/{iso.replace(".iso","")}"),
+                "data_dir": f"{data["data_dir"]}/{iso.replace(".iso","")}",
                 "data_files": {
                     "Z_FILES": f"{iso.replace(".iso","")}"
                 }
@@ -51,21 +80,33 @@ class DataHandlerISO9660(DataHandler):
 
             print(f"Working on: {iso} => {data["data_dir"]}")
 
-            # Build 7z command to extract files
-            cmd = [
-                "7z",
-                "-y",
-                "x",
-                f"{data["data_dir"]}/{iso}",
-                f"-o{data_files["data_dir"]}"
-            ]
-
-            # Run command
-            result = self.osRun(cmd)
-            self.log("7z_stdout",str(result.stdout.decode("utf-8")))
-            self.log("7z_stderr",str(result.stderr.decode("utf-8")))
-
-            return [data_files]
-
-        # Only returned if an error happens
-        return None
+            try:
+                with IsoImage(f"{data["data_dir"]}/{iso}") as image:
+                    # Write file list with hashes
+                    if self.config_data["manifest"]:
+                        manifest=f"{iso.replace(".iso","")}.manifest.json"
+                        with open(f"{data["data_dir"]}/{manifest}", 'w', encoding="utf-8") as output:
+                            output.write(json.dumps(image.manifest(self.config_data["workers"]), indent=4))
+                        manifests.append(manifest)
+
+                    # Extract all files
+                    if self.config_data["extract"]:
+                        extracted = image.extract(self.ensureDir(data_files["data_dir"]), self.config_data["workers"])
+                        self.log("isoread",extracted,json_output=True)
+                        outputs.append(data_files)
+
+            except (ValueError, struct.error, IndexError) as e:
+                # Not ISO9660 or damaged, may be UDF or another format 7z can read
+                print(f"Using 7z for {iso}: {e}")
+                if self.config_data["extract"]:
+                    self.extract7z(f"{data["data_dir"]}/{iso}", self.ensureDir(data_files["data_dir"]))
+                    outputs.append(data_files)
+
+        # Add manifests beside ISOs
+        if len(manifests) > 0:
+            data["data_files"]["MANIFEST"]=manifests
+
+        # Only None if no ISOs could be read
+        if len(outputs) == 0 and len(manifests) == 0:
+            return None
+        return outputs
@@ -2,16 +2,12 @@
 
 # Data conversion manager for pyDiscRip. Can be used to rip a CD and fetch metadata
 
+import copy
 from pprint import pprint
 
 # Internal Modules
 from handler.data.data_handler import DataHandler
-from handler.data.bincue import DataHandlerBINCUE
-from handler.data.bincue_split import DataHandlerBINCUESPLIT
-from handler.data.iso9660 import DataHandlerISO9660
-from handler.data.wav import DataHandlerWAV
-from handler.data.flux import DataHandlerFLUX
-from handler.data.hxc_image import DataHandlerHXCImage
+from handler.util.registry import HandlerRegistry
 
 
 class DataHandlerManager(object):
@@ -21,6 +17,20 @@ class DataHandlerManager(object):
     setting configuration data.
     """
 
+    # All supported data types, handlers are imported when first matched
+    HANDLERS={
+        "BINCUE": {"module": "handler.data.bincue", "class": "DataHandlerBINCUE", "type_id": "BINCUE", "handle_id": "DataHandlerBINCUE", "data_outputs": ["WAV","ISO9660"]},
+        "BINCUE_SPLIT": {"module": "handler.data.bincue_split", "class": "DataHandlerBINCUESPLIT", "type_id": "BINCUE_SPLIT", "handle_id": "DataHandlerBINCUESPLIT", "data_outputs": ["BINCUE"]},
+        "ACCURATERIP": {"module": "handler.data.accuraterip", "class": "DataHandlerAccurateRip", "type_id": "BINCUE", "handle_id": "DataHandlerAccurateRip", "data_outputs": ["ACCURATERIP"]},
+        "ISO9660": {"module": "handler.data.iso9660", "class": "DataHandlerISO9660", "type_id": "ISO9660", "handle_id": "DataHandlerISO9660", "data_outputs": ["Z_FILES"]},
+        "WAV": {"module": "handler.data.wav", "class": "DataHandlerWAV", "type_id": "WAV", "handle_id": "DataHandlerWAV", "data_outputs": ["FLAC"]},
+        "FLUX": {"module": "handler.data.flux", "class": "DataHandlerFLUX", "type_id": "FLUX", "handle_id": "DataHandlerFLUX", "data_outputs": ["BINARY"]},
+        "HXC": {"module": "handler.data.hxc_image", "class": "DataHandlerHXCImage", "type_id": "FLUX", "handle_id": "DataHandlerHXCImage", "data_outputs": ["IMAGE"]},
+    }
+
+    # Config options of all handlers, built once per process
+    config_options=None
+
     def __init__(self):
         """Constructor to setup basic data and config defaults
 
@@ -28,13 +38,7 @@ class DataHandlerManager(object):
         # Call parent constructor
         super().__init__()
         # Add all supported data types
-        self.data_types={}
-        self.data_types["BINCUE"] = DataHandlerBINCUE()
-        self.data_types["BINCUE_SPLIT"] = DataHandlerBINCUESPLIT()
-        self.data_types["ISO9660"] = DataHandlerISO9660()
-        self.data_types["WAV"] = DataHandlerWAV()
-        self.data_types["FLUX"] = DataHandlerFLUX()
-        self.data_types["HXC"] = DataHandlerHXCImage()
+        self.data_types=HandlerRegistry(DataHandlerManager.HANDLERS)
 
     def configVirtual(self,config):
         """Configure a new handler to use as a virtual data format
@@ -44,8 +48,72 @@ class DataHandlerManager(object):
             # Add all new virtual formats
             for data in config["Virtual"]["Data"]:
                 # Create and configure new handler
-                self.data_types[data["input_type_id"]] = DataHandler()
-                self.data_types[data["input_type_id"]].prepareVirtualFormat(data)
+                data_handler = DataHandler()
+                data_handler.prepareVirtualFormat(data)
+                self.data_types.add(data["input_type_id"], data_handler, handle_id=data_handler.handle_id, data_outputs=data_handler.data_outputs)
+
+    def plan(self, type_ids):
+        """Get keys of handlers that can run for data types in dependency order
+
+        Builds the graph of data types each handler takes and outputs from
+        the declarations and keeps handlers reachable from the types given.
+        A handler comes after every handler that outputs its type.
+        """
+        # Handlers by the type they take
+        by_type={}
+        for key, handler in self.data_types.declarations():
+            by_type.setdefault(handler["type_id"], []).append(key)
+
+        # Find all handlers reachable from the starting types
+        reachable=[]
+        types=list(type_ids)
+        seen=set(types)
+        while types:
+            for key in by_type.get(types.pop(0), []):
+                if key in reachable:
+                    continue
+                reachable.append(key)
+                for type_id in self.data_types.handlers[key].get("data_outputs", []):
+                    if type_id not in seen:
+                        seen.add(type_id)
+                        types.append(type_id)
+
+        # Order so producers of a type come before handlers of it
+        inputs={key: 0 for key in reachable}
+        for key in reachable:
+            for type_id in self.data_types.handlers[key].get("data_outputs", []):
+                for after in by_type.get(type_id, []):
+                    inputs[after]+=1
+        ordered=[]
+        ready=[key for key in reachable if inputs[key] == 0]
+        while ready:
+            key=ready.pop(0)
+            ordered.append(key)
+            for type_id in self.data_types.handlers[key].get("data_outputs", []):
+                for after in by_type.get(type_id, []):
+                    inputs[after]-=1
+                    if inputs[after] == 0:
+                        ready.append(after)
+
+        # Handlers in a cycle still run, in declaration order
+        for key in reachable:
+            if key not in ordered:
+                print(f"Data handler [{key}] is in a conversion cycle")
+                ordered.append(key)
+
+        return ordered
+
+
+    def handlersFor(self, data, keys):
+        """Get keys of handlers from a plan that have not worked on data yet
+
+        """
+        return [
+            key for key in keys
+            if self.data_types.handlers[key]["type_id"] == data["type_id"]
+            and self.data_types.handlers[key].get("handle_id") not in data["processed_by"]
+        ]
+
 
     def findDataType(self,data):
         """Match data handler to type and return handler
@@ -53,8 +121,9 @@ class DataHandlerManager(object):
         """
 
         # Iterate through all handlers
-        for type_id, data_handler in self.data_types.items():
-            if data_handler.dataMatch(data) and not data_handler.handle_id in data["processed_by"]:
+        for type_id, handler in self.data_types.declarations():
+            if handler["type_id"] == data["type_id"] and not handler["handle_id"] in data["processed_by"]:
+                data_handler = self.data_types.get(type_id)
                 print(f"Found handler: {data_handler.handle_id}")
                 return data_handler
 
@@ -65,11 +134,13 @@ class DataHandlerManager(object):
         """Get all config data for media handlers and dump it to json
 
         """
-        config_options={}
-        # Iterate through all handlers
-        for type_id, data_handler in self.data_types.items():
-            # Add all config options for handler
-            config_options[type_id]=data_handler.configOptions()
-
-        return config_options
+        if DataHandlerManager.config_options is None:
+            config_options={}
+            # Iterate through all handlers
+            for type_id, data_handler in HandlerRegistry(DataHandlerManager.HANDLERS).items():
+                # Add all config options for handler
+                config_options[type_id]=copy.deepcopy(data_handler.configOptions())
+            DataHandlerManager.config_options=config_options
+
+        return copy.deepcopy(DataHandlerManager.config_options)
 
@@ -6,6 +6,7 @@
 import os, sys
 import glob
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 # External Modules
 try:
@@ -39,10 +40,27 @@ class DataHandlerWAV(DataHandler):
         self.handle_id="DataHandlerWAV"
         # Set data type to handle
         self.type_id="WAV"
+        # Default config data
+        self.config_data={
+            "encode_workers":None # Tracks encoded at once, defaults to CPU count or 1 in conversion pool
+        }
         # Data types output
         self.data_outputs=["FLAC"]
 
 
+    def encodeFLAC(self,wav,flac,metadata):
+        """Use ffmpeg to convert a single WAV to FLAC
+
+        """
+        (ffmpeg
+            .input(wav)
+            .output(flac, **metadata)
+            .overwrite_output()
+            .run(capture_stdout=True, capture_stderr=True)
+        )
+        return flac
+
+
     def convertWAV(self,data,data_meta=None):
         """Use ffmpeg to convert WAVs to FLAC
 
@@ -140,68 +158,49 @@ class DataHandlerWAV(DataHandler):
 
 
 
-        # Iterate over WAV files
+        # Build encode list for WAV files
+        encodes=[]
         for i,v in enumerate(data["data_files"]["WAV"]):
+            track_metadata = dict(metadata)
             if data_meta is not None:
                 print(f"Working on: {data["data_files"]["WAV"][i]}: {self.cleanFilename(tracks[i])}")
                 # Set track title in ffmpeg metadata
-                metadata["metadata:g:0"] = f"title={tracks[i]}"
-                # Run ffmpeg to conver WAV to FLAC
-                (ffmpeg
-                    .input(f"{data["data_dir"]}/{data["data_files"]["WAV"][i]}")
-                    .output(f"{data_files["data_dir"]}/{(i+1):02} - {self.cleanFilename(tracks[i])}.flac", **metadata)
-                    .overwrite_output()
-                    .run(capture_stdout=True, capture_stderr=True)
-                )
+                track_metadata["metadata:g:0"] = f"title={tracks[i]}"
+                flac = f"{(i+1):02} - {self.cleanFilename(tracks[i])}.flac"
             else:
                 print(f"Working on: {data["data_files"]["WAV"][i]}")
-                metadata["metadata:g:0"] = f"title=Track - {(i+1):02}"
-                (ffmpeg
-                    .input(f"{data["data_dir"]}/{data["data_files"]["WAV"][i]}")
-                    .output(f"{data_files["data_dir"]}/{(i+1):02} - Track.flac", **metadata)
-                    .overwrite_output()
-                    .run(capture_stdout=True, capture_stderr=True)
-                )
-
-
-        # Get FLAC files
-        flacs = glob.glob(f"{data_files["data_dir"]}/*.flac")
-        # If FLACs were created add them to data output
-        if len(flacs) > 0:
-            for flac in flacs:
-                data_files["data_files"]["FLAC"].append(f"{flac.replace(data_files["data_dir"]+"/","")}")
+                track_metadata["metadata:g:0"] = f"title=Track - {(i+1):02}"
+                flac = f"{(i+1):02} - Track.flac"
+            encodes.append((f"{data["data_dir"]}/{v}", f"{data_files["data_dir"]}/{flac}", track_metadata))
+
+        # Run ffmpeg to convert WAVs to FLAC with multiple tracks at once
+        workers = self.config_data["encode_workers"]
+        if workers is None:
+            workers = 1 if self.pooled else os.cpu_count()
+        with ThreadPoolExecutor(max_workers=max(1,int(workers))) as pool:
+            flacs = list(pool.map(lambda encode: self.encodeFLAC(*encode), encodes))
+
+        # Add FLACs to data output in track order
+        for flac in flacs:
+            data_files["data_files"]["FLAC"].append(f"{flac.replace(data_files["data_dir"]+"/","")}")
         return data_files
 
 
-    def convert(self, media_sample):
+    def convertEntry(self, media_sample, data):
         """Take in WAV and convert to FLACs with taging if available
 
         """
+        print("Convert WAV to FLAC")
+
+        # Check for metadata
+        data_meta=None
+        for data_sup in list(media_sample["data"]):
+            if data_sup["type_id"] == "MUSICBRAINZ":
+                data_meta=data_sup
+
+        # Convert data
+        data_output = self.convertWAV(data, data_meta)
 
-        # Setup rip output path
-        self.setProjectDir(media_sample["name"])
-
-        # Go through all data in media sample
-        for data in media_sample["data"]:
-            # Check handler can work on data
-            if data["type_id"] == self.type_id:
-                # Check if handler has already worked on data
-                if self.type_id not in data["processed_by"]:
-                    print("Convert WAV to FLAC")
-
-                    # Check for metadata
-                    data_meta=None
-                    for data_sup in media_sample["data"]:
-                        if data_sup["type_id"] == "MUSICBRAINZ":
-                            data_meta=data_sup
-
-                    # Convert data
-                    data_output = self.convertWAV(data, data_meta)
-
-                    if data_output is not None:
-                        # Mark data as processed
-                        data["processed_by"].append(self.type_id)
-                        media_sample["data"].append(data_output)
-
-        # Return media sample with new data
-        return media_sample
+        if data_output is None:
+            return None
+        return [data_output]
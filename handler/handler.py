@@ -6,9 +6,12 @@
 import sys, os,re
 import json
 import time
+import atexit
 from enum import Enum
 from datetime import datetime
 import subprocess
+import threading
+from collections import deque
 from pprint import pprint
 from urllib import request, parse
 
@@ -19,12 +22,35 @@ except Exception as e:
         print("Need to install Python module [unidecode]")
         sys.exit(1)
 
+# Internal Modules
+from handler.util.job_store import JobStore
+from handler.util.status_index import StatusIndex
+from handler.util.status_reporter import StatusReporter
+from handler.util.progress import parser_for
+
 
 class Handler(object):
     """Base handler for media and data samples
 
 
     """
+
+    # Lines of each output stream kept for osRun results
+    OSRUN_TAIL_LINES=5000
+
+    # Seconds between writes of the same status file
+    STATUS_INTERVAL=1
+    # Status files held to be written later by path
+    status_pending={}
+    status_written={}
+    status_lock=threading.Lock()
+    # Status index connection kept open for this process
+    status_index=None
+    status_index_pid=None
+    status_index_lock=threading.Lock()
+    # Running in conversion pool which already has a worker for each CPU
+    pooled=False
+
     def __init__(self):
         """Constructor to setup basic data and config defaults
 
@@ -33,6 +59,8 @@ class Handler(object):
         self.handle_id=None
         # Set data type to handle
         self.type_id=None # TODO - Genericize media and data IDs
+        # Config section to read, type ID when not set
+        self.config_id=None
         # Set main directory to work in
         self.output_dir="./"
         # Set sub directory to work in
@@ -43,6 +71,8 @@ class Handler(object):
         self.data_outputs=[]
         # Default config data
         self.config_data=None
+        # Program settings from last config
+        self.settings=None
 
         # Virtual Handler Setup
         self.virt_cmd=None
@@ -81,19 +111,25 @@ class Handler(object):
         return not wait_time>action_time
 
     def web_update(self,data, config_data):
+        """Send update to web interface without waiting for it
 
+        Updates are merged and sent by a background thread in this process.
+        """
         try:
-            # Post Method is invoked if data != None
-            endpoint=f"http://{config_data["settings"]["web"]["ip"]}:{config_data["settings"]["web"]["port"]}/update"
-            data=json.dumps(data).encode("utf-8")
-            req =  request.Request(endpoint, data=data)
-
-            # Response
-            resp = request.urlopen(req)
+            StatusReporter.get(config_data["settings"]["web"]["ip"],config_data["settings"]["web"]["port"]).send(data)
         except Exception as e:
-            # Web server probably isn't running, fail silently
+            # Web server probably isn't configured, fail silently
             return
 
+    def web_flush(self, config_data, timeout=5):
+        """Wait for updates from this process to be sent to web interface
+
+        Needed before a process exits as background threads are stopped.
+        """
+        try:
+            return StatusReporter.get(config_data["settings"]["web"]["ip"],config_data["settings"]["web"]["port"]).flush(timeout)
+        except Exception as e:
+            return False
 
 
     def cleanFilename(self, filename_raw):
@@ -134,9 +170,12 @@ class Handler(object):
         return path
 
 
-    def status(self,data):
+    def status(self,data,force=False):
         """Log status from processes
 
+        Writes of the same status file closer together than STATUS_INTERVAL
+        are held and only the latest data is written by the next write or by
+        flushStatus. Finished samples and forced writes are written right away.
         """
         # Setup rip output path
         if "name" in data:
@@ -150,36 +189,120 @@ class Handler(object):
         else:
             filepath=f"{status_path}/status.json"
 
-        # Write data
-        with open(filepath, 'w', encoding="utf-8") as output:
-            output.write(json.dumps(data, indent=4))
+        # Hold rapid writes until later
+        now=time.time()
+        with Handler.status_lock:
+            if not force and not data.get("done", False) and now-Handler.status_written.get(filepath, 0) < Handler.STATUS_INTERVAL:
+                Handler.status_pending[filepath]=(data, self, os.getpid())
+                return
+            Handler.status_pending.pop(filepath, None)
+            Handler.status_written[filepath]=now
+
+        self.writeStatus(filepath, data)
         return
 
 
+    def flushStatus(self):
+        """Write all held status files from this process
+
+        """
+        with Handler.status_lock:
+            pending=Handler.status_pending
+            Handler.status_pending={}
+            for filepath in pending:
+                Handler.status_written[filepath]=time.time()
+
+        for filepath, (data, handler, pid) in pending.items():
+            # Held by parent process before fork
+            if pid != os.getpid():
+                continue
+            handler.writeStatus(filepath, data)
+
+
+    def writeStatus(self, filepath, data):
+        """Write status file atomically and update index
+
+        """
+        # Replace file in one step so readers never see a partial write
+        tmp_path=f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as output:
+            output.write(json.dumps(data, separators=(",",":")))
+        os.replace(tmp_path, filepath)
+
+        # Update index used by web status
+        if "type_id" not in data and "name" in data:
+            try:
+                if self.settings is not None:
+                    path = JobStore.dbPath(self.settings)
+                else:
+                    path = f"{self.output_dir}/discrip.db"
+                # Conversion threads share the connection
+                with Handler.status_index_lock:
+                    self.statusIndex(path).update(data)
+            except Exception as e:
+                print(f"Status index update failed: {repr(e)}")
+
+
+    def statusIndex(self, path):
+        """Get status index opened once per process
+
+        Must be called holding status_index_lock.
+        """
+        # Connections opened before a fork belong to the parent process
+        if Handler.status_index_pid != os.getpid():
+            Handler.status_index=None
+            Handler.status_index_pid=os.getpid()
+            atexit.register(Handler.statusClose, None)
+
+        # Reopen if settings point to another database
+        if Handler.status_index is not None and Handler.status_index.path != path:
+            Handler.status_index.close()
+            Handler.status_index=None
+
+        if Handler.status_index is None:
+            Handler.status_index=StatusIndex(path, check_same_thread=False)
+        return Handler.status_index
+
+
+    def statusClose(self):
+        """Close status index of this process
+
+        """
+        with Handler.status_index_lock:
+            if Handler.status_index is not None and Handler.status_index_pid == os.getpid():
+                Handler.status_index.close()
+            Handler.status_index=None
+
+
     def log(self,action_name,text,json_output=False):
         """Log data from processes
 
-        Supports JSON as an output format
-
+        Each entry is appended as one JSON line to the project log so all
+        commands of a project are in a single file in order.
         """
         # Set filepath for log
         log_path=self.ensureDir(f"{self.getPath()}/log")
 
-        # Build filename
+        # Build entry
+        entry={
+            "time": datetime.now().isoformat(),
+            "project": self.project_timestamp,
+            "action": action_name
+        }
         if json_output:
-            filepath=f"{log_path}/{self.project_timestamp}_{action_name}.json"
+            entry["data"]=text
+        elif isinstance(text, (bytes, bytearray)):
+            entry["text"]=text.decode("utf-8", "replace")
         else:
-            filepath=f"{log_path}/{self.project_timestamp}_{action_name}.log"
-
-        # Write data
-        with open(filepath, 'w', encoding="utf-8") as output:
-            if json_output:
-                output.write(json.dumps(text, indent=4))
-            else:
-                if isinstance(text, (bytes, bytearray)):
-                    output.write(str(text.decode("utf-8")))
-                else:
-                    output.write(str(text))
+            entry["text"]=str(text)
+
+        # Single append write so entries from other processes don't mix
+        line=(json.dumps(entry, default=str)+"\n").encode("utf-8")
+        fd=os.open(f"{log_path}/discrip.jsonl", os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
 
         return
 
@@ -188,10 +311,13 @@ class Handler(object):
 
         """
 
-        # Check for config data for handler
-        if self.type_id in config_data:
+        # Check for config data for handler, handlers of the same type share
+        # config unless they have their own section and handlers without
+        # options skip it
+        config_id = self.config_id or self.type_id
+        if config_id in config_data and self.config_data is not None:
             # Iterate over all top level config values
-            for key, value in config_data[self.type_id].items():
+            for key, value in config_data[config_id].items():
                 if value is not None:
                     # Set all config values
                     self.config_data[key] = value
@@ -199,6 +325,8 @@ class Handler(object):
         if config_data["settings"]["output"] != "":
             self.setOutputDir(config_data["settings"]["output"])
 
+        self.settings=config_data["settings"]
+
     def configDirect(self, config_data):
         """Set configuration data for handler by matching ID
 
@@ -220,14 +348,107 @@ class Handler(object):
         return self.config_data
 
 
-    def osRun(self, cmd):
-        """Runs a command at the OS level and returns stdout and stderr"""
+    def osRun(self, cmd, drive=None):
+        """Runs a command at the OS level and returns stdout and stderr
+
+        Output is read as it is written and appended to a log file line by
+        line. Only the last lines of each stream are kept for the returned
+        result so memory use doesn't grow with tool verbosity. If a drive is
+        given, progress from supported tools is sent to the web interface.
+        """
         try:
             # Run command and store output
             # stack = ''.join(traceback.format_stack())
             # self.log("stack",str(stack))
             self.log(cmd[0],' '.join(cmd))
-            result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # Status should be current while a tool runs
+            Handler.flushStatus(None)
+
+            # Tool output is written here as it runs
+            log_path=self.ensureDir(f"{self.getPath()}/log")
+            log_file=open(f"{log_path}/{self.project_timestamp}_{os.path.basename(cmd[0])}_output.log", 'ab')
+            log_lock=threading.Lock()
+
+            # Progress parsing for drive status
+            parser=parser_for(cmd) if drive is not None and self.settings is not None else None
+            progress_lock=threading.Lock()
+            progress_sent=[0]
+
+            def progress(line):
+                with progress_lock:
+                    if not parser.parse(line.decode("utf-8", "replace")):
+                        return
+                    # Limit update rate, the reporter merges anything faster
+                    if time.time()-progress_sent[0] < 1:
+                        return
+                    progress_sent[0]=time.time()
+                    update={"title":f"Ripping: {parser.text}"}
+                    if parser.percent is not None:
+                        update["progress"]=parser.percent
+                    self.web_update({"drive_status":{drive:update}},{"settings":self.settings})
+
+            def read(stream, name, tail):
+                pending=b""
+                partial=b""
+                while True:
+                    chunk=stream.read1(65536)
+                    if not chunk:
+                        break
+                    pending+=chunk
+                    # Split on both newline and carriage return used for progress
+                    lines=re.split(rb'(\r\n|\n|\r)', pending)
+                    pending=lines.pop()
+                    for i in range(0, len(lines), 2):
+                        line=lines[i]
+                        if parser is not None:
+                            # Output must keep being read even if progress fails
+                            try:
+                                progress(line)
+                            except Exception as e:
+                                print(f"Progress update failed: {repr(e)}")
+                        if lines[i+1] == b"\r":
+                            # Progress redraws are only kept until the next line
+                            partial=line
+                            continue
+                        partial=b""
+                        tail.append(line+b"\n")
+                        with log_lock:
+                            log_file.write(f"[{name}] ".encode("utf-8")+line+b"\n")
+                    # Bound line length for tools that never end a line
+                    if len(pending) > 65536:
+                        tail.append(pending+b"\n")
+                        with log_lock:
+                            log_file.write(f"[{name}] ".encode("utf-8")+pending+b"\n")
+                        pending=b""
+
+                # Keep last redraw and any unterminated output
+                for line in (partial, pending):
+                    if line:
+                        tail.append(line+b"\n")
+                        with log_lock:
+                            log_file.write(f"[{name}] ".encode("utf-8")+line+b"\n")
+
+            process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            tails = {
+                "stdout": deque(maxlen=Handler.OSRUN_TAIL_LINES),
+                "stderr": deque(maxlen=Handler.OSRUN_TAIL_LINES)
+            }
+            readers = [
+                threading.Thread(target=read, args=(process.stdout, "stdout", tails["stdout"]), daemon=True),
+                threading.Thread(target=read, args=(process.stderr, "stderr", tails["stderr"]), daemon=True)
+            ]
+            for reader in readers:
+                reader.start()
+            for reader in readers:
+                reader.join()
+            returncode = process.wait()
+            log_file.close()
+
+            result = subprocess.CompletedProcess(
+                cmd,
+                returncode,
+                stdout=b"".join(tails["stdout"]),
+                stderr=b"".join(tails["stderr"]))
 
             return result
 
@@ -261,6 +482,19 @@ class Handler(object):
 
         return [data]
 
+    def convertEntry(self, media_sample, data):
+        """Convert one data entry of a media sample
+
+        Returns new data without changing the media sample so entries can be
+        converted at the same time. The media sample is passed to support
+        conversion using multiple data sources at once.
+        """
+        print(f"Converting {data["type_id"]} to {self.data_outputs[0]}")
+        data_outputs = self.convertData(data)
+        if data_outputs is None:
+            return None
+        return [data_new for data_new in data_outputs if data_new is not None]
+
     def convert(self, media_sample):
         """Generic convert process for one data output
 
@@ -270,22 +504,19 @@ class Handler(object):
         self.setProjectDir(media_sample["name"])
 
         # Go through all data in media sample
-        for data in media_sample["data"]:
+        for data in list(media_sample["data"]):
             # Check handler can work on data
             if data["type_id"] == self.type_id:
                 # Check if handler has already worked on data
-                if self.type_id not in data["processed_by"]:
+                if self.handle_id not in data["processed_by"]:
                     # Convert data
-                    print(f"Converting {data["type_id"]} to {self.data_outputs[0]}")
-                    data_outputs = self.convertData(data)
+                    data_outputs = self.convertEntry(media_sample, data)
 
                     if data_outputs is not None:
                         # Mark data as processed
                         data["processed_by"].append(self.handle_id)
                         # Add new data to media sample
-                        for data_new in data_outputs:
-                            if data_new is not None:
-                                media_sample["data"].append(data_new)
+                        media_sample["data"] += data_outputs
 
         # Return media sample with new data
         return media_sample
@@ -63,7 +63,7 @@ class MediaHandlerBDRedumper(MediaOptical):
                 ]
 
             # Run command
-            self.osRun(cmd)
+            self.osRun(cmd, drive=media_sample["drive"])
 
         data["done"]=True
         self.status(data)
@@ -17,6 +17,8 @@ import pycdio, cdio
 # Internal Modules
 from handler.media.media_handler import MediaHandler
 from handler.media.optical import MediaOptical
+from handler.util.media_monitor import MediaMonitor
+from handler.util.convert_cache import ConvertCache
 
 
 class MediaHandlerCD(MediaOptical):
@@ -72,6 +74,13 @@ class MediaHandlerCD(MediaOptical):
 # Last Track           : 23
 # Appendable           : no
 
+        # Use session count found by udev when the disc was loaded
+        info = MediaMonitor.get().read(media_sample["drive"])
+        if info is not None and info["present"] and info["sessions"]:
+            self.cd_sessions=info["sessions"]
+            print(f"Sessions Found: {self.cd_sessions}")
+            return
+
         # Run command
         result = self.osRun(["cdrdao", "disk-info", "--device", f"{media_sample["drive"]}"])
 
@@ -108,8 +117,33 @@ class MediaHandlerCD(MediaOptical):
 
             self.status(data)
 
-            # Don't re-rip BIN/TOC
-            if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BIN"]}"):
+            cache = ConvertCache.get(self.settings)
+            bin_output = f"BINCUE/{media_sample["name"]}-S{sessions}/{data["data_files"]["BIN"]}"
+            toc_output = f"BINCUE/{media_sample["name"]}-S{sessions}/{data["data_files"]["TOC"]}"
+            cue_output = f"BINCUE/{media_sample["name"]}-S{sessions}/{data["data_files"]["CUE"]}"
+
+            # A disc can't be keyed by content before it is read so the rip is
+            # only checked against the record of a finished rip to this path,
+            # a sample ripped again after failing verification is a new rip.
+            # Rips are recorded in the project when caching is not enabled.
+            rip_cache = cache or ConvertCache.get({"convert_cache": f"{self.getPath()}/status/convert"})
+            rip_key = rip_cache.key(self.handle_id, [], None, [os.path.realpath(self.getPath()), bin_output, toc_output, media_sample.get("rip_attempt",0)])
+            pending_path = f"{data["data_dir"]}/{data["data_files"]["BIN"]}.pending"
+
+            # Don't re-rip BIN/TOC that finished, rips from before they were
+            # recorded are trusted unless a rip was started and not finished
+            ripped = rip_cache.verify(rip_key, self.getPath()) is not None
+            if not ripped and not os.path.exists(pending_path) and media_sample.get("rip_attempt",0) == 0:
+                ripped = os.path.exists(f"{data["data_dir"]}/{data["data_files"]["BIN"]}")
+
+            if not ripped:
+                # Remove rip of an attempt that didn't finish or failed verification
+                for stale in [data["data_files"]["BIN"], data["data_files"]["TOC"]]:
+                    if os.path.exists(f"{data["data_dir"]}/{stale}"):
+                        os.remove(f"{data["data_dir"]}/{stale}")
+                # Marks rip as started until it is recorded
+                open(pending_path, 'w').close()
+
                 # Build cdrdao command to read CD
                 cmd = [
                     "cdrdao",
@@ -129,22 +163,38 @@ class MediaHandlerCD(MediaOptical):
                 ]
 
                 # Run command
-                self.osRun(cmd)
-
-
-            # Don't re-convert CUE
-            if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["CUE"]}"):
-                # Build toc2cue command to generate CUE
-                cmd = [
-                    "toc2cue",
-                    f"{data["data_dir"]}/{data["data_files"]["TOC"]}",
-                    f"{data["data_dir"]}/{data["data_files"]["CUE"]}"
-                ]
-
-                # Run command
-                result = self.osRun(cmd)
-                self.log("cdrdao_stdout",str(result.stdout))
-                self.log("cdrdao_stderr",str(result.stderr))
+                result = self.osRun(cmd, drive=media_sample["drive"])
+
+                # Record rip only after cdrdao finished it, sizes and hashes
+                # are kept but the rip is not copied into the cache
+                if result is not None and result.returncode == 0:
+                    rip_cache.store(rip_key, self.getPath(), [bin_output, toc_output], keep=False)
+                    os.remove(pending_path)
+
+
+            # Don't re-convert CUE from the same TOC
+            if os.path.exists(f"{data["data_dir"]}/{data["data_files"]["TOC"]}"):
+                if cache is not None:
+                    cue_key = cache.key("toc2cue", [f"{data["data_dir"]}/{data["data_files"]["TOC"]}"], None, [cue_output])
+                if cache is None or cache.restore(cue_key, self.getPath()) is None:
+                    if os.path.exists(f"{data["data_dir"]}/{data["data_files"]["CUE"]}"):
+                        os.remove(f"{data["data_dir"]}/{data["data_files"]["CUE"]}")
+
+                    # Build toc2cue command to generate CUE
+                    cmd = [
+                        "toc2cue",
+                        f"{data["data_dir"]}/{data["data_files"]["TOC"]}",
+                        f"{data["data_dir"]}/{data["data_files"]["CUE"]}"
+                    ]
+
+                    # Run command
+                    result = self.osRun(cmd)
+                    self.log("cdrdao_stdout",str(result.stdout))
+                    self.log("cdrdao_stderr",str(result.stderr))
+
+                    # Record CUE only after toc2cue made it
+                    if cache is not None and result.returncode == 0 and os.path.exists(f"{data["data_dir"]}/{data["data_files"]["CUE"]}"):
+                        cache.store(cue_key, self.getPath(), [cue_output])
 
             # Continue to next session
             sessions += 1
@@ -157,79 +207,6 @@ class MediaHandlerCD(MediaOptical):
         return datas
 
 
-    def fetchMetadata(self,media_sample):
-        """Use musicbrainzngs to fetch Audio CD metadata
-
-        """
-        data = {
-            "type_id": "MUSICBRAINZ",
-            "processed_by": [],
-            "data_dir": self.ensureDir(f"{self.getPath()}/MUSICBRAINZ"),
-            "data_files": {
-                "JSON": f"{media_sample["name"]}-musicbrainz.json"
-            }
-        }
-
-
-        # Wait for 30 seconds between requests to not get blocked
-        tmp=self.ensureDir("/tmp/discrip")
-        wait=True
-        while(wait):
-            if not os.path.isfile(f"{tmp}/musicbrainz.json"):
-                wait=False
-            else:
-                with open(f"{tmp}/musicbrainz.json", newline='') as output:
-                    tdata = json.load(output)
-
-                    if tdata["next"] < int(datetime.now().timestamp()):
-                        wait=False
-                    else:
-                        print(f"Waiting: {tdata["next"]} < {int(datetime.now().timestamp())}")
-                        time.sleep(10)
-        state_store={}
-        state_store["next"]=int(datetime.now().timestamp()) + 30
-
-        with open(f"{tmp}/musicbrainz.json", 'w', encoding="utf-8") as output:
-            output.write(json.dumps(state_store, indent=4))
-
-
-        # Don't re-download data if exists
-        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["JSON"]}"):
-            # https://python-discid.readthedocs.io/en/latest/usage/#fetching-metadata
-            musicbrainzngs.set_useragent("AkBKukU: pyDiscRip", "0.1", "akbkuku@akbkuku.com")
-
-            try:
-                # Get calculated discid for CD
-                # NOTE - This process is not failureproof and can result in discid collisions
-                disc = libdiscid.read(device=media_sample["drive"])
-                self.log("disc.id",disc.id)
-            except libdiscid.exceptions.DiscError:
-                print("no actual audio tracks on disc: CDROM or DVD?")
-                return None
-            try:
-                # Fetch metadata using discid
-                result = musicbrainzngs.get_releases_by_discid(disc.id,
-                                                            includes=["artists", "recordings"])
-            except musicbrainzngs.ResponseError:
-                print("disc not found or bad response")
-                return None
-            else:
-                # Received metadata
-                if result.get("disc"):
-                    # Write data to json
-                    self.ensureDir(data["data_dir"])
-                    with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
-                        output.write(json.dumps(result, indent=4))
-
-                elif result.get("cdstub"):
-                    with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
-                        output.write(json.dumps(result, indent=4))
-                        print("Waring: Musicbrainz returned a CD stub which is not as good as a full entry.")
-
-                return data
-        return data
-
-
     def rip(self, media_sample):
         """Rip CD with cdrdao and fetch metadata with musicbrainzngs
 
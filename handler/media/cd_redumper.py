@@ -81,7 +81,7 @@ class MediaHandlerCDRedumper(MediaOptical):
                 ]
 
             # Run command
-            self.osRun(cmd)
+            self.osRun(cmd, drive=media_sample["drive"])
 
 
         # Get files in output directory
@@ -100,79 +100,6 @@ class MediaHandlerCDRedumper(MediaOptical):
         return datas
 
 
-    def fetchMetadata(self,media_sample):
-        """Use musicbrainzngs to fetch Audio CD metadata
-
-        """
-        data = {
-            "type_id": "MUSICBRAINZ",
-            "processed_by": [],
-            "data_dir": self.ensureDir(f"{self.getPath()}/MUSICBRAINZ"),
-            "data_files": {
-                "JSON": f"{media_sample["name"]}-musicbrainz.json"
-            }
-        }
-
-
-        # Wait for 30 seconds between requests to not get blocked
-        tmp=self.ensureDir("/tmp/discrip")
-        wait=True
-        while(wait):
-            if not os.path.isfile(f"{tmp}/musicbrainz.json"):
-                wait=False
-            else:
-                with open(f"{tmp}/musicbrainz.json", newline='') as output:
-                    tdata = json.load(output)
-
-                    if tdata["next"] < int(datetime.now().timestamp()):
-                        wait=False
-                    else:
-                        print(f"Waiting: {tdata["next"]} < {int(datetime.now().timestamp())}")
-                        time.sleep(10)
-        state_store={}
-        state_store["next"]=int(datetime.now().timestamp()) + 30
-
-        with open(f"{tmp}/musicbrainz.json", 'w', encoding="utf-8") as output:
-            output.write(json.dumps(state_store, indent=4))
-
-
-        # Don't re-download data if exists
-        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["JSON"]}"):
-            # https://python-discid.readthedocs.io/en/latest/usage/#fetching-metadata
-            musicbrainzngs.set_useragent("AkBKukU: pyDiscRip", "0.1", "akbkuku@akbkuku.com")
-
-            try:
-                # Get calculated discid for CD
-                # NOTE - This process is not failureproof and can result in discid collisions
-                disc = libdiscid.read(device=media_sample["drive"])
-                self.log("disc.id",disc.id)
-            except libdiscid.exceptions.DiscError:
-                print("no actual audio tracks on disc: CDROM or DVD?")
-                return None
-            try:
-                # Fetch metadata using discid
-                result = musicbrainzngs.get_releases_by_discid(disc.id,
-                                                            includes=["artists", "recordings"])
-            except musicbrainzngs.ResponseError:
-                print("disc not found or bad response")
-                return None
-            else:
-                # Received metadata
-                if result.get("disc"):
-                    # Write data to json
-                    self.ensureDir(data["data_dir"])
-                    with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
-                        output.write(json.dumps(result, indent=4))
-
-                elif result.get("cdstub"):
-                    with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
-                        output.write(json.dumps(result, indent=4))
-                        print("Waring: Musicbrainz returned a CD stub which is not as good as a full entry.")
-                return data
-
-        return data
-
-
     def rip(self, media_sample):
         """Rip CD with cdrdao and fetch metadata with musicbrainzngs
 
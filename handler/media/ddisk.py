@@ -87,13 +87,13 @@ class MediaHandlerDDisk(MediaHandler):
         ]
 
         # Run command
-        result = self.osRun(cmd1)
+        result = self.osRun(cmd1, drive=media_sample["drive"])
         self.log("ddrescue_1-3_out",str(result.stdout))
         self.log("ddrescue_1-3_err",str(result.stderr))
-        result = self.osRun(cmd2)
+        result = self.osRun(cmd2, drive=media_sample["drive"])
         self.log("ddrescue_2-3_out",str(result.stdout))
         self.log("ddrescue_2-3_err",str(result.stderr))
-        result = self.osRun(cmd3)
+        result = self.osRun(cmd3, drive=media_sample["drive"])
         self.log("ddrescue_3-3_out",str(result.stdout))
         self.log("ddrescue_3-3_err",str(result.stderr))
 
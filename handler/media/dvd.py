@@ -10,6 +10,7 @@ from pathlib import Path
 # Internal Modules
 from handler.media.media_handler import MediaHandler
 from handler.media.optical import MediaOptical
+from handler.util.ddrescue import mapfile_read, mapfile_remaining, mapfile_write, mapfile_merge, domain_write, disc_matches, STATUS_FINISHED
 
 
 class MediaHandlerDVD(MediaOptical):
@@ -30,13 +31,34 @@ class MediaHandlerDVD(MediaOptical):
         self.type_id="DVD"
         # Data types output
         self.data_outputs=["ISO9660"]
+        # Default config data
+        self.config_data={
+            "rescue_drives": 0, # Other drives to try before scraping bad areas
+            "rescue_group": None # Drive group to send damaged discs to
+        }
         # DVD info to be collected
         self.dvd_partition_filesystem=""
 
 
+    def mergeMapfile(self, mapfile_path, drive_mapfile):
+        """Mark areas a follow-up drive read as finished in the main mapfile
+
+        """
+        if drive_mapfile == mapfile_path:
+            return
+        blocks = mapfile_read(mapfile_path)
+        drive_blocks = mapfile_read(drive_mapfile)
+        if blocks is not None and drive_blocks is not None:
+            mapfile_write(mapfile_merge(blocks, drive_blocks), mapfile_path)
+
+
     def ripDVD(self, media_sample):
         """Use ddrescue to rip DVD with multiple passes and mapfile
 
+        If rescue_drives is set and the first pass leaves areas unread, the
+        sample is marked as needing another drive instead of retrying here.
+        The next drive continues with the same ISO and mapfile once the disc
+        in it is checked against what was already read.
         """
         # TODO - Data is not always ISO9660, support for UDF is needed still
         data = {
@@ -50,8 +72,61 @@ class MediaHandlerDVD(MediaOptical):
         }
         self.status(data)
 
-        # Don't re-rip ISO
-        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["ISO"][0]}"):
+        iso_path=f"{data["data_dir"]}/{data["data_files"]["ISO"][0]}"
+        mapfile_path=f"{data["data_dir"]}/mapfile"
+
+        # Samples ripped by the scheduler can be moved to another drive to
+        # read what this drive could not, each drive they were in is listed.
+        # Rescue is only added to the sample when it is handed off.
+        rescue = media_sample.get("rescue")
+        if rescue is None and self.scheduled:
+            rescue = {"job_id": media_sample.get("id"), "drives": [media_sample["drive"]]}
+        handoff = (
+            rescue is not None
+            and not rescue.get("final", False)
+            and len(rescue["drives"]) <= self.config_data["rescue_drives"]
+        )
+        # A robot would load whichever disc is next in its bin, so only
+        # drives loaded by hand can take the sample
+        if handoff:
+            group = self.config_data["rescue_group"] or media_sample.get("group")
+            manual = [
+                drive["drive"]
+                for drives in self.settings.get("drives",{}).values()
+                for drive in drives
+                if drive["group"] == group and "controller_id" not in drive
+            ]
+            if not any(drive not in rescue["drives"] for drive in manual):
+                print(f"No drive in [{group}] is loaded by hand, finishing rescue of [{media_sample["name"]}] in [{media_sample["drive"]}]")
+                handoff = False
+
+        # Don't re-rip ISO unless a rescue is continuing with areas left from
+        # an earlier drive
+        blocks = mapfile_read(mapfile_path)
+        following = rescue is not None and len(rescue["drives"]) > 1
+        if not os.path.exists(iso_path) or (following and blocks is not None and mapfile_remaining(blocks) > 0):
+
+            # Only continue reading into the ISO from the same disc
+            if blocks is not None and any(status == STATUS_FINISHED for position, size, status in blocks):
+                if disc_matches(media_sample["drive"], iso_path, blocks) is not True:
+                    print(f"Disc in [{media_sample["drive"]}] does not match what was read for [{media_sample["name"]}], not continuing")
+                    self.log("ddrescue_mismatch",{"drive": media_sample["drive"], "mapfile": mapfile_path},json_output=True)
+                    if "rescue" in media_sample:
+                        media_sample["rescue"]["needed"]=False
+                    self.status(data)
+                    return None
+
+            # Later drives only read areas earlier drives couldn't. Each uses
+            # its own mapfile so areas earlier passes gave up on are read
+            # again, then what it read is merged into the main mapfile.
+            domain=[]
+            drive_mapfile=mapfile_path
+            if blocks is not None and rescue is not None and len(rescue["drives"]) > 1:
+                domain_path=f"{data["data_dir"]}/domain-{len(rescue["drives"])}.map"
+                drive_mapfile=f"{data["data_dir"]}/mapfile-{len(rescue["drives"])}"
+                domain_write(blocks, domain_path)
+                domain=[f"--domain-mapfile={domain_path}"]
+                print(f"Continuing rescue of {mapfile_remaining(blocks)} bytes on [{media_sample["drive"]}]")
 
             # ddrescue is a multi step process that is run three times
             cmd1 = [
@@ -60,9 +135,10 @@ class MediaHandlerDVD(MediaOptical):
                 "2048",
                 "-n",
                 "-v",
+                *domain,
                 f"{media_sample["drive"]}",
-                f"{data["data_dir"]}/{data["data_files"]["ISO"][0]}",
-                f"{data["data_dir"]}/mapfile"
+                iso_path,
+                drive_mapfile
             ]
             cmd2 = [
                 "ddrescue",
@@ -72,9 +148,10 @@ class MediaHandlerDVD(MediaOptical):
                 "-r",
                 "3",
                 "-v",
+                *domain,
                 f"{media_sample["drive"]}",
-                f"{data["data_dir"]}/{data["data_files"]["ISO"][0]}",
-                f"{data["data_dir"]}/mapfile"
+                iso_path,
+                drive_mapfile
             ]
             cmd3 = [
                 "ddrescue",
@@ -85,18 +162,37 @@ class MediaHandlerDVD(MediaOptical):
                 "-r",
                 "3",
                 "-v",
+                *domain,
                 f"{media_sample["drive"]}",
-                f"{data["data_dir"]}/{data["data_files"]["ISO"][0]}",
-                f"{data["data_dir"]}/mapfile"
+                iso_path,
+                drive_mapfile
             ]
 
             # Run command
-            result = self.osRun(cmd1)
+            result = self.osRun(cmd1, drive=media_sample["drive"])
             self.log("ddrescue_stdout",str(result.stdout))
             self.log("ddrescue_stderr",str(result.stderr))
-
-            self.osRun(cmd2)
-            self.osRun(cmd3)
+            self.mergeMapfile(mapfile_path, drive_mapfile)
+
+            # Retry and scrape bad areas only on the last drive
+            blocks = mapfile_read(mapfile_path)
+            if handoff and blocks is not None and mapfile_remaining(blocks) > 0:
+                rescue["needed"]=True
+                rescue["remaining"]=mapfile_remaining(blocks)
+                rescue["group"]=self.config_data["rescue_group"]
+                media_sample["rescue"]=rescue
+                print(f"{rescue["remaining"]} bytes not read, [{media_sample["name"]}] needs another drive")
+                self.log("ddrescue_handoff",rescue,json_output=True)
+                self.status(data)
+                return data
+
+            self.osRun(cmd2, drive=media_sample["drive"])
+            self.mergeMapfile(mapfile_path, drive_mapfile)
+            self.osRun(cmd3, drive=media_sample["drive"])
+            self.mergeMapfile(mapfile_path, drive_mapfile)
+
+        if "rescue" in media_sample:
+            media_sample["rescue"]["needed"]=False
 
         data["done"]=True
         self.status(data)
@@ -114,5 +210,8 @@ class MediaHandlerDVD(MediaOptical):
         self.setProjectDir(media_sample["name"])
 
         # Rip and return data
-        return [self.ripDVD(media_sample)]
+        data = self.ripDVD(media_sample)
+        if data is None:
+            return None
+        return [data]
 
@@ -64,7 +64,7 @@ class MediaHandlerDVDRedumper(MediaOptical):
                 ]
 
             # Run command
-            self.osRun(cmd)
+            self.osRun(cmd, drive=media_sample["drive"])
 
         data["done"]=True
         self.status(data)
@@ -5,25 +5,13 @@
 # External Modules
 import time, sys
 import json
+import copy
 from pprint import pprint
 import pathlib
-try:
-    import pyudev
-except Exception as e:
-        print("Need to install Python module [pyudev]")
-        sys.exit(1)
 
 # Internal Modules
-from handler.media.optical import MediaOptical
-from handler.media.cd import MediaHandlerCD
-from handler.media.cd_redumper import MediaHandlerCDRedumper
-from handler.media.dvd import MediaHandlerDVD
-from handler.media.dvd_redumper import MediaHandlerDVDRedumper
-from handler.media.bd_redumper import MediaHandlerBDRedumper
-from handler.media.ddisk import MediaHandlerDDisk
-from handler.media.floppy import MediaHandlerFloppy
-# Testing only
-from handler.media.dummy import MediaHandlerDummy
+from handler.util.registry import HandlerRegistry
+from handler.util.media_monitor import MediaMonitor
 
 class MediaHandlerManager(object):
     """Manager for media types
@@ -32,6 +20,26 @@ class MediaHandlerManager(object):
     setting configuration data.
     """
 
+    # All supported media types, handlers are imported when first matched
+    HANDLERS={
+        "OPTICAL": {"module": "handler.media.optical", "class": "MediaOptical", "type_id": "OPTICAL", "handler_id": None},
+        "CD_cdrdao": {"module": "handler.media.cd", "class": "MediaHandlerCD", "type_id": "CD", "handler_id": "cdrdao"},
+        "CD_redumper": {"module": "handler.media.cd_redumper", "class": "MediaHandlerCDRedumper", "type_id": "CD", "handler_id": "cd_redumper"},
+        "DVD": {"module": "handler.media.dvd", "class": "MediaHandlerDVD", "type_id": "DVD", "handler_id": "dvd_ddrescue"},
+        "DVD_redumper": {"module": "handler.media.dvd_redumper", "class": "MediaHandlerDVDRedumper", "type_id": "DVD", "handler_id": "dvd_redumper"},
+        "BD_redumper": {"module": "handler.media.bd_redumper", "class": "MediaHandlerBDRedumper", "type_id": "BD", "handler_id": "bd_redumper"},
+        "DDISK": {"module": "handler.media.ddisk", "class": "MediaHandlerDDisk", "type_id": "DDISK", "handler_id": None},
+        "FLOPPY": {"module": "handler.media.floppy", "class": "MediaHandlerFloppy", "type_id": "FLOPPY", "handler_id": None},
+        # Testing only
+        "DUMMY": {"module": "handler.media.dummy", "class": "MediaHandlerDummy", "type_id": "DUMMY", "handler_id": None},
+    }
+
+    # Config options of all handlers, built once per process
+    config_options=None
+
+    # Seconds to wait for a disc type before assuming CD
+    GUESS_TIMEOUT=30
+
     def __init__(self):
         """Constructor to setup basic data and config defaults
 
@@ -40,29 +48,24 @@ class MediaHandlerManager(object):
         super().__init__()
 
         # Add all supported media types
-        self.media_types={}
-        self.media_types["OPTICAL"] = MediaOptical()
-        self.media_types["CD_cdrdao"] = MediaHandlerCD()
-        self.media_types["CD_redumper"] = MediaHandlerCDRedumper()
-        self.media_types["DVD"] = MediaHandlerDVD()
-        self.media_types["DVD_redumper"] = MediaHandlerDVDRedumper()
-        self.media_types["BD_redumper"] = MediaHandlerBDRedumper()
-        self.media_types["DDISK"] = MediaHandlerDDisk()
-        self.media_types["FLOPPY"] = MediaHandlerFloppy()
-        # Testing only
-        self.media_types["DUMMY"] = MediaHandlerDummy()
+        self.media_types=HandlerRegistry(MediaHandlerManager.HANDLERS)
+
+    def matchMediaType(self,media_sample):
+        """Get keys of handlers for the type of a media sample
+
+        """
+        return [type_id for type_id, handler in self.media_types.declarations() if handler["type_id"] == media_sample["media_type"]]
 
     def loadMediaType(self,media_sample,bypass=False,controller=None):
         """Match media handler to type and return handler
 
         """
-        # Iterate through all handlers
-        for type_id, media_type in self.media_types.items():
-            # If handler can proccess media return it
-            if media_type.mediaMatch(media_sample):
-                # Set controller
-                media_type.controller = controller
-                return media_type.load(media_sample,bypass)
+        # Iterate through all handlers for media
+        for type_id in self.matchMediaType(media_sample):
+            media_type = self.media_types.get(type_id)
+            # Set controller
+            media_type.controller = controller
+            return media_type.load(media_sample,bypass)
 
         # No handlers found
 
@@ -71,20 +74,19 @@ class MediaHandlerManager(object):
 
         """
         print("Ejecting through manager")
-        # Iterate through all handlers
-        for type_id, media_type in self.media_types.items():
-            # If handler can proccess media return it
-            if media_type.mediaMatch(media_sample):
-                print(f"Matched: {type_id}")
-                # Set controller
-                media_type.controller = controller
-                media_type.eject(media_sample)
-                return
+        # Iterate through all handlers for media
+        for type_id in self.matchMediaType(media_sample):
+            print(f"Matched: {type_id}")
+            media_type = self.media_types.get(type_id)
+            # Set controller
+            media_type.controller = controller
+            media_type.eject(media_sample)
+            return
 
         # Generic optical
         print("No match found, attempting generic optical")
         if typeIsOptical(selfmedia_sample):
-            self.media_types["OPTICAL"].eject(media_sample)
+            self.media_types.get("OPTICAL").eject(media_sample)
         # No handlers found
         return
 
@@ -99,14 +101,13 @@ class MediaHandlerManager(object):
             print("Finding media type")
             media_sample["media_type"] = self.guessMediaType(media_sample["drive"])
 
-        # Iterate through all handlers
-        for type_id, media_type in self.media_types.items():
-            # If handler can proccess media return it
-            if media_type.mediaMatch(media_sample):
-                if media_type.handler_id == None:
-                    return media_type
-                if config_data["settings"]["media_handlers"][media_sample["media_type"]] == media_type.handler_id:
-                    return media_type
+        # Iterate through all handlers for media
+        for type_id in self.matchMediaType(media_sample):
+            handler_id = self.media_types.handlers[type_id]["handler_id"]
+            if handler_id == None:
+                return self.media_types.get(type_id)
+            if config_data["settings"]["media_handlers"][media_sample["media_type"]] == handler_id:
+                return self.media_types.get(type_id)
 
         # No handlers found
         print(f"No handlers found for following media sample:")
@@ -118,64 +119,33 @@ class MediaHandlerManager(object):
         """Get all config data for media handlers and dump it to json
 
         """
-        config_options={}
-        # Iterate through all handlers
-        for type_id, media_type in self.media_types.items():
-            # Add all config options for handler
-            config_options[type_id]=media_type.configOptions()
+        if MediaHandlerManager.config_options is None:
+            config_options={}
+            # Iterate through all handlers
+            for type_id, media_type in HandlerRegistry(MediaHandlerManager.HANDLERS).items():
+                # Add all config options for handler
+                config_options[type_id]=copy.deepcopy(media_type.configOptions())
+            MediaHandlerManager.config_options=config_options
 
-        return config_options
+        return copy.deepcopy(MediaHandlerManager.config_options)
 
 
     def guessMediaType(self,drivepath=None):
         """ Guess media type in drive which will determine how it is ripped
 
-        Only useful for optical discs.
+        Only useful for optical discs. Waits on udev media events so the type
+        is known as soon as the drive reports it.
         """
+        print("FIND A DISC TYPE")
+        info = MediaMonitor.get().wait(drivepath,MediaHandlerManager.GUESS_TIMEOUT,known_type=True)
+
+        # Assume it's a weird CD
+        if info is None:
+            print("Is probably a weird CD")
+            return "CD"
 
-        # Init udev interface to access drive
-        context = pyudev.Context()
-
-        # Countdown to assume it's a weird CD
-        countdown = 10
-
-        # Get info from device
-        output = True
-        while(output):
-            print("FIND A DISC TYPE")
-            #print(f"Drive path: {drivepath}")
-
-            # Solve and symlinks to standard drive path
-            drivepath=str(pathlib.Path(drivepath).resolve())
-            # NOTE: Returns as list but we are accessing a specific device
-            devices = context.list_devices(sys_name=drivepath.replace("/dev/",""))
-            dev = next(iter(devices))
-
-            #print(json.dumps(dict(dev.properties),indent=4))
-            # Determine media type by ID
-            if dev.properties.get("ID_CDROM_MEDIA_CD", False) or dev.properties.get("ID_CDROM_MEDIA_CD_R", False):
-                media_type="CD"
-                output = False
-                print("Is CD")
-            elif dev.properties.get("ID_CDROM_MEDIA_DVD", False):
-                media_type="DVD"
-                output = False
-                print("Is DVD")
-            elif dev.properties.get("ID_CDROM_MEDIA_BD", False):
-                media_type="BD"
-                output = False
-
-            if output:
-                countdown-=1
-                if not countdown:
-                    media_type="CD"
-                    output = False
-                    print("Is probably a weird CD")
-
-            #print(json.dumps(dict(dev.properties),indent=4))
-            time.sleep(3)
-
-        return media_type
+        print(f"Is {info["media_type"]}")
+        return info["media_type"]
 
     def typeIsOptical(selfmedia_sample):
 
@@ -6,6 +6,7 @@
 import sys, os
 import json
 import shutil
+import time
 from enum import Enum
 from datetime import datetime
 
@@ -36,6 +37,8 @@ class MediaHandler(Handler):
         self.data_outputs=[]
         # Set controller
         self.controller=None
+        # Set when ripped by the scheduler which can move samples between drives
+        self.scheduled=False
 
 
     def mediaMatch(self, media_sample=None):
@@ -47,6 +50,10 @@ class MediaHandler(Handler):
             drivepath = self.cleanFilename(media_sample["drive"])
             tmp="/tmp/discrip/photo/"+drivepath
             print(f"Looking for photo :{tmp}/photo.jpg")
+            # Photo may still be being saved by the robot process
+            wait_end = time.time() + 30
+            while os.path.isfile(f"{tmp}/photo.pending") and time.time() < wait_end:
+                time.sleep(0.1)
             if os.path.isfile(f"{tmp}/photo.jpg"):
 
                 data = {
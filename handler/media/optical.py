@@ -31,6 +31,8 @@ except Exception as e:
 
 # Internal Modules
 from handler.media.media_handler import MediaHandler
+from handler.util.media_monitor import MediaMonitor
+from handler.util.musicbrainz import lookup_discid
 
 
 class MediaOptical(MediaHandler):
@@ -68,11 +70,18 @@ class MediaOptical(MediaHandler):
         print(f"Please insert [{media_sample["name"]}] into [{media_sample["drive"]}]")
         wait_load=0
         while(True):
+            # Wakes as soon as udev reports media
+            info = MediaMonitor.get().wait(media_sample["drive"],wait_load)
+            if info is not None:
+                self.cd_tracks = info["tracks"]
+                print(f"Found disc with {self.cd_tracks} tracks")
+                return True
+
+            # Ask drive directly in case it doesn't send media events
             try:
-                time.sleep(wait_load)
                 d=cdio.Device(media_sample["drive"])
-                tracks = d.get_num_tracks()
-                print(f"Found disc with {tracks} tracks")
+                self.cd_tracks = d.get_num_tracks()
+                print(f"Found disc with {self.cd_tracks} tracks")
                 return True
             except cdio.TrackError:
                 print(f"Please insert [{media_sample["name"]}] into [{media_sample["drive"]}]")
@@ -86,10 +95,58 @@ class MediaOptical(MediaHandler):
                     return False
 
 
+    def fetchMetadata(self,media_sample):
+        """Use musicbrainzngs to fetch Audio CD metadata
+
+        Lookups are shared with other rip processes through a rate limiter and
+        responses are cached by discid.
+        """
+        data = {
+            "type_id": "MUSICBRAINZ",
+            "processed_by": [],
+            "data_dir": self.ensureDir(f"{self.getPath()}/MUSICBRAINZ"),
+            "data_files": {
+                "JSON": f"{media_sample["name"]}-musicbrainz.json"
+            }
+        }
+
+        # Don't re-download data if exists
+        if not os.path.exists(f"{data["data_dir"]}/{data["data_files"]["JSON"]}"):
+            try:
+                # Get calculated discid for CD
+                # NOTE - This process is not failureproof and can result in discid collisions
+                disc = libdiscid.read(device=media_sample["drive"])
+                self.log("disc.id",disc.id)
+            except libdiscid.exceptions.DiscError:
+                print("no actual audio tracks on disc: CDROM or DVD?")
+                return None
+
+            result = lookup_discid(disc.id, self.settings.get("musicbrainz_cache") if self.settings is not None else None)
+            if result is None:
+                return None
+
+            # Received metadata
+            if result.get("disc"):
+                # Write data to json
+                self.ensureDir(data["data_dir"])
+                with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
+                    output.write(json.dumps(result, indent=4))
+
+            elif result.get("cdstub"):
+                with open(f"{data["data_dir"]}/{data["data_files"]["JSON"]}", 'w', encoding="utf-8") as output:
+                    output.write(json.dumps(result, indent=4))
+                    print("Waring: Musicbrainz returned a CD stub which is not as good as a full entry.")
+
+            return data
+        return data
+
+
     def eject(self,media_sample, controller=None):
         """Eject drive tray
         """
         print("OPTICAL EJECT")
+        # Old media info is no longer valid
+        MediaMonitor.get().clear(media_sample["drive"])
         if self.controller is not None:
             controller = self.controller
         if controller is not None:
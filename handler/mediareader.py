@@ -1,7 +1,10 @@
 
 # Python System
 from pprint import pprint
-from multiprocessing import Process
+from multiprocessing import Process, Queue, get_context
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+import threading
+import queue as queue_module
 import time
 import subprocess
 import glob
@@ -14,6 +17,10 @@ from handler.media.manager import MediaHandlerManager
 from handler.data.manager import DataHandlerManager
 from handler.controller.manager import ControllerHandlerManager
 from handler.handler import Handler
+from handler.util.watch import WatchFolder
+from handler.util.sample_queue import SampleQueue
+from handler.util.job_store import JobStore
+from handler.util.media_monitor import MediaMonitor
 from datetime import datetime
 
 class MediaReader(object):
@@ -51,19 +58,51 @@ class MediaReader(object):
                 output.write(json.dumps(value, indent=4))
 
 
+    def jobState(media_sample,config_data,state,store_sample=False):
+        """Set state of a media sample in the persistent job store
+
+        Opens a new connection so it can be used from any process.
+        """
+        try:
+            jobs = JobStore(JobStore.dbPath(config_data["settings"]))
+            jobs.setState(media_sample["name"], state, media_sample if store_sample else None)
+            jobs.close()
+        except Exception as e:
+            print(f"Job store update failed: {repr(e)}")
+
+        # queue update
+        Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":state,"done":state in JobStore.STATES_FINISHED}},config_data)
+
+
     def rip_queue_drives(media_samples,config_data,callback_update=None):
         """ Use pre-set drive values in media_samples queue to rip data
 
         """
 
+        # Persistent job queue
+        jobs = JobStore(JobStore.dbPath(config_data["settings"]))
+        sample_counter = jobs.nextSeq()
+
         # Build dict of drives for tracking usage
         drive_process={}
+        samples_left=0
         for media_sample in media_samples:
             drive_process[media_sample["drive"]]=None
+
+            # Skip samples finished in a previous run
+            job = jobs.get(media_sample["name"])
+            if job is not None and job["done"]:
+                print(f"Skipping [{media_sample["name"]}], already {job["state"]}")
+                media_sample["done"]=True
+                continue
             media_sample["done"]=False
+            samples_left+=1
 
-        # Count of samples to rip
-        samples_left = len(media_samples)
+            # Add new job
+            if job is None:
+                media_sample["id"]=sample_counter
+                sample_counter+=1
+                jobs.add(media_sample)
         while(samples_left):
             # Check if any media samples have free drives
             for media_sample in media_samples:
@@ -90,7 +129,7 @@ class MediaReader(object):
 
                     # Start rip
                     drive_process[media_sample["drive"]] = Process(
-                            target=MediaReader.rip,
+                            target=MediaReader.rip_process,
                             kwargs={
                                 "media_sample":media_sample,
                                 "config_data":config_data,
@@ -99,6 +138,7 @@ class MediaReader(object):
                         )
                     # Mark media as done
                     media_sample["done"]=True
+                    jobs.setState(media_sample["name"],"loading",media_sample)
 
                     # Start ripping process
                     drive_process[media_sample["drive"]].start()
@@ -110,7 +150,8 @@ class MediaReader(object):
 
         # Wait for all process to end
         for key, value in drive_process.items():
-            value.join()
+            if value is not None:
+                value.join()
 
     def rip_queue_groups(media_samples,config_data,callback_update=None):
         """ Live ripping with drive groups. Uses folder of JSON for input of samples
@@ -129,6 +170,10 @@ class MediaReader(object):
             for config in config_data["settings"]["controllers"]:
                 controllers[config["id"]] = controller_manager.getController(config["controller_type"])
                 controllers[config["id"]].configDirect(config)
+                # Keep serial port open for all rip processes
+                controllers[config["id"]].serialStart()
+                # Keep camera streaming for photos
+                controllers[config["id"]].cameraStart()
                 controllers[config["id"]].initialize()
                 controllers[config["id"]].controller_id = config["id"]
                 print(f"Setting {config["controller_type"]} to {controllers[config["id"]].controller_id}")
@@ -156,6 +201,10 @@ class MediaReader(object):
                 if "controller_id" in drive:
                     groups[drive["group"]]["drive"][drive["drive"]]["controller"]=drive["controller_id"]
 
+        # One media listener for all optical drives, started before rip processes
+        if any(group["type"] == "OPTICAL" for group in groups.values()):
+            MediaMonitor.get()
+
         # Drive update
         Handler.web_update(None,{"drive_status":MediaReader.drive_status},config_data)
 
@@ -166,54 +215,136 @@ class MediaReader(object):
         # Sample counter for media order preservation
         sample_counter=0
 
+        # Indexed queue of samples
+        queue = SampleQueue()
+
+        # Persistent job queue
+        jobs = JobStore(JobStore.dbPath(config_data["settings"]))
+
+        # Conversion runs in a pool so drives are free as soon as the rip ends
+        convert_workers = config_data["settings"].get("convert_workers")
+        if convert_workers is None:
+            convert_workers = os.cpu_count()
+        # Workers start from a fork server as controllers and the media
+        # monitor already have threads running that a fork would copy
+        convert_pool = ProcessPoolExecutor(max_workers=convert_workers,mp_context=get_context("forkserver"),initializer=MediaReader.convert_init)
+        # Ripping processes send finished rips to be converted
+        convert_queue = Queue()
+        # Conversions running in the pool
+        converting = []
+        print(f"Converting with {convert_workers} workers")
+
+        # Requeue jobs interrupted by a restart
+        for media_sample in jobs.recover():
+            media_sample.pop("state")
+            print(f"Resuming conversion of [{media_sample["name"]}]")
+            converting.append(convert_pool.submit(MediaReader.convert_resume,media_sample,config_data))
+        # Restore queue from job store in order they were added
+        for media_sample in sorted(jobs.jobs(), key=lambda job: job["id"]):
+            # Only queued jobs still need a drive
+            media_sample["done"] = media_sample.pop("state") != "queued"
+            queue.add(media_sample,front=not ("queue_front" not in media_sample or media_sample["queue_front"] == "false"))
+        sample_counter=max(sample_counter,jobs.nextSeq())
+
+        # Add any samples passed in directly
+        for media_sample in media_samples:
+            if "done" not in media_sample:
+                media_sample["done"]=False
+            media_sample["id"]=sample_counter
+            sample_counter+=1
+            if queue.add(media_sample):
+                jobs.add(media_sample)
+
         # Setup Watch dir
         Handler.ensureDir(None,config_data["settings"]["watch"])
+        watch = WatchFolder(config_data["settings"]["watch"])
 
         run=True # TODO - This should be controled by callback_update to be able to stop
         while(run):
-            # Load media samples from a directory of JSON files instead of passing
-            sample_files = glob.glob(f"{config_data["settings"]["watch"]}/*.json")
-            for sample_file in sample_files:
+            # Load new or modified media samples from a directory of JSON files
+            for sample_file in watch.changed():
 
                 with open(sample_file, newline='') as jsonfile:
-                    raw_media_samples = json.load(jsonfile)
+                    try:
+                        raw_media_samples = json.load(jsonfile)
+                    except ValueError as e:
+                        # File may still be being written, read it again later
+                        print(f"Could not read sample file [{sample_file}]: {repr(e)}")
+                        watch.retry(sample_file)
+                        continue
                     # If it's not a list make it one
                     if not isinstance(raw_media_samples, list):
                         raw_media_samples = [raw_media_samples]
 
                     # Check all sample files
                     for raw_media_sample in raw_media_samples:
-                        new = True
+                        # Skip samples already in queue
+                        if raw_media_sample["name"] in queue:
+                            continue
 
-                        # Check if sample already in queue
-                        for media_sample in media_samples:
-                            if media_sample["name"] == raw_media_sample["name"]:
-                                new = False
                         # Add new sample to queue
-                        if new:
-                            if "done" not in raw_media_sample:
-                                raw_media_sample["done"]=False
-
-                            # Set ingest start time
-                            if "time_added" not in raw_media_sample:
-                                raw_media_sample["time_added"] =  str(datetime.now().isoformat()).replace(":","-")
-
-                            raw_media_sample["media_type"]=raw_media_sample["media_type"].upper()
-                            raw_media_sample["id"]=sample_counter
-                            sample_counter+=1
-                            if "queue_front" not in raw_media_sample or raw_media_sample["queue_front"] == "false":
-                                print("Adding to end of queue")
-                                media_samples.append(raw_media_sample)
-                            else:
-                                print("Adding to front of queue")
-                                media_samples.insert(0,raw_media_sample)
-
-                            # Drive update
-                            Handler.web_update(None,{"queue":raw_media_sample},config_data)
-                            # Ingest status
-                            media_handler = Handler()
-                            media_handler.config(config_data)
-                            media_handler.status(raw_media_sample)
+                        if "done" not in raw_media_sample:
+                            raw_media_sample["done"]=False
+
+                        # Set ingest start time
+                        if "time_added" not in raw_media_sample:
+                            raw_media_sample["time_added"] =  str(datetime.now().isoformat()).replace(":","-")
+
+                        raw_media_sample["media_type"]=raw_media_sample["media_type"].upper()
+                        raw_media_sample["id"]=sample_counter
+                        sample_counter+=1
+                        if "queue_front" not in raw_media_sample or raw_media_sample["queue_front"] == "false":
+                            print("Adding to end of queue")
+                            queue.add(raw_media_sample)
+                            jobs.add(raw_media_sample)
+                        else:
+                            print("Adding to front of queue")
+                            queue.add(raw_media_sample,front=True)
+                            jobs.add(raw_media_sample,front=True)
+
+                        # Drive update
+                        Handler.web_update(None,{"queue":raw_media_sample},config_data)
+                        # Ingest status
+                        media_handler = Handler()
+                        media_handler.config(config_data)
+                        media_handler.status(raw_media_sample,force=True)
+
+            # Start conversion of finished rips
+            while True:
+                try:
+                    media_sample = convert_queue.get_nowait()
+                except queue_module.Empty:
+                    break
+                # Damaged discs go to another drive before being converted
+                if media_sample.get("rescue",{}).get("needed"):
+                    MediaReader.rescue_follow_up(media_sample,groups,queue,jobs,config_data)
+                    continue
+                print(f"Queued conversion of [{media_sample["name"]}]")
+                converting.append(convert_pool.submit(MediaReader.convert_resume,media_sample,config_data))
+
+            # Rip samples that failed verification again
+            for future in [future for future in converting if future.done()]:
+                converting.remove(future)
+                try:
+                    media_sample = future.result()
+                except Exception as e:
+                    print(f"Conversion failed: {repr(e)}")
+                    continue
+                if media_sample.get("verified") is False and media_sample.get("rip_attempt",0) < config_data["settings"].get("verify_retries",0):
+                    # A robot would load the next disc in its bin rather than this one
+                    robots, manual = MediaReader.sample_drives(media_sample,groups)
+                    if not manual:
+                        print(f"No drive loaded by hand for unverified [{media_sample["name"]}], not ripping again")
+                        jobs.setState(media_sample["name"],"failed",media_sample)
+                        Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":"failed","done":True}},config_data)
+                        continue
+                    media_sample["exclude_drives"] = robots
+                    media_sample["rip_attempt"] = media_sample.get("rip_attempt",0)+1
+                    media_sample["done"] = False
+                    print(f"Requeueing unverified [{media_sample["name"]}] for attempt {media_sample["rip_attempt"]+1}")
+                    queue.requeue(media_sample)
+                    jobs.setState(media_sample["name"],"queued",media_sample)
+                    Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":"queued","done":False}},config_data)
 
             if os.path.isfile(f"{config_data["settings"]["watch"]}/pause"):
                 print("Queue is paused, waiting...")
@@ -230,83 +361,144 @@ class MediaReader(object):
                             MediaReader.processState(group["drive"][drive]["process"].pid, {"is_alive":group["drive"][drive]["process"].is_alive()})
 
                         # Drive is free, find media
-                        for media_sample in media_samples:
-
-                            if media_sample["done"]:
-                                continue
-
-                            # Check if sample can be handled by group
-                            if "group" not in media_sample and "drive" in media_sample and media_sample["drive"] == drive:
-                                print("Non-group Rip")
-                            elif "group" not in media_sample or media_sample["group"] != group_name:
-                                continue
-
-                            # Assign free drive to sample
-                            media_sample["drive"]=drive
-
-                            # Find preceeding media samples to wait for
-                            before=[]
-                            if config_data["settings"]["fifo"]:
-                                for driveb, data in group["drive"].items():
-                                    if data["order"] is not None and data["order"] < media_sample["id"]:
-                                        before.append(group["drive"][driveb]["process"].pid)
-
-                            # Override Config data
-                            if "config_data" in media_sample:
-                                config_submit = media_sample["config_data"]
-                                config_submit["settings"] = config_data["settings"]
-                            else:
-                                config_submit = config_data
-
-                            # Get controller
-                            if group["drive"][drive]["controller"] is not None:
-                                controller = controllers[group["drive"][drive]["controller"]]
-                                print(f"controller: {controller.type_id}")
-                            else:
-                                print("CONTROLLER NOT FOUND")
-                                pprint(controllers)
-                                controller = None
-
-                            # Store media sample order
-                            group["drive"][drive]["order"]=media_sample["id"]
-                            # Configure rip
-                            group["drive"][drive]["process"] = Process(
-                                    target=MediaReader.rip_auto,
-                                    kwargs={
-                                        "media_sample":media_sample,
-                                        "config_data":config_submit,
-                                        "callback_update":callback_update,
-                                        "wait":before,
-                                        "controller": controller
-                                    }
-                                )
-                            # Pre-rip status
-                            media_handler = Handler()
-                            media_handler.config(config_submit)
-                            media_handler.status(media_sample)
-                            # Mark sample done
-                            media_sample["done"]=True
-
-                            # Start rip
-                            group["drive"][drive]["process"].start()
-                            # Allow process moment to start because is_alive() is not instant
-                            time.sleep(1)
-                            # Process state
-                            MediaReader.processState(group["drive"][drive]["process"].pid, {"is_alive":group["drive"][drive]["process"].is_alive()})
-                            break
-
-            # Wait before checking for free drives
-            time.sleep(3)
+                        media_sample = queue.next(group_name, drive)
+                        if media_sample is None:
+                            continue
+
+                        # Samples without a group were queued directly to this drive
+                        if "group" not in media_sample:
+                            print("Non-group Rip")
+
+                        # Assign free drive to sample
+                        media_sample["drive"]=drive
+                        # Track drives a sample being rescued was in
+                        if "rescue" in media_sample:
+                            media_sample["rescue"]["drives"].append(drive)
+                        media_sample.pop("exclude_drives",None)
+
+                        # Find preceeding media samples to wait for
+                        before=[]
+                        if config_data["settings"]["fifo"]:
+                            for driveb, data in group["drive"].items():
+                                if data["order"] is not None and data["order"] < media_sample["id"]:
+                                    before.append(group["drive"][driveb]["process"].pid)
+
+                        # Override Config data
+                        if "config_data" in media_sample:
+                            config_submit = media_sample["config_data"]
+                            config_submit["settings"] = config_data["settings"]
+                        else:
+                            config_submit = config_data
+
+                        # Get controller
+                        if group["drive"][drive]["controller"] is not None:
+                            controller = controllers[group["drive"][drive]["controller"]]
+                            print(f"controller: {controller.type_id}")
+                        else:
+                            print("CONTROLLER NOT FOUND")
+                            pprint(controllers)
+                            controller = None
+
+                        # Store media sample order
+                        group["drive"][drive]["order"]=media_sample["id"]
+                        # Configure rip
+                        group["drive"][drive]["process"] = Process(
+                                target=MediaReader.rip_auto,
+                                kwargs={
+                                    "media_sample":media_sample,
+                                    "config_data":config_submit,
+                                    "callback_update":callback_update,
+                                    "wait":before,
+                                    "controller": controller,
+                                    "convert_queue": convert_queue
+                                }
+                            )
+                        # Pre-rip status
+                        media_handler = Handler()
+                        media_handler.config(config_submit)
+                        media_handler.status(media_sample,force=True)
+                        # Mark sample done
+                        media_sample["done"]=True
+                        jobs.setState(media_sample["name"],"loading",media_sample)
+                        # queue update
+                        Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":"loading","drive":drive}},config_data)
+
+                        # Start rip
+                        group["drive"][drive]["process"].start()
+                        # Allow process moment to start because is_alive() is not instant
+                        time.sleep(1)
+                        # Process state
+                        MediaReader.processState(group["drive"][drive]["process"].pid, {"is_alive":group["drive"][drive]["process"].is_alive()})
+
+            # Wait before checking for free drives, new samples end the wait early
+            watch.wait(3)
 
         # Wait for all processes to end
         for group, drives in groups.items():
             for drive, process in drives.items():
                 process["process"].join()
+        convert_pool.shutdown(wait=True)
+
 
+    def sample_drives(media_sample,groups):
+        """Get drives a sample can be queued to split by how they are loaded
 
-    def rip(media_sample,config_data,callback_update=None,controller=None):
+        Returns drives with a robot and drives loaded by hand of the sample's
+        group, or of the drive it was queued to directly.
+        """
+        if media_sample.get("group") in groups:
+            drives = groups[media_sample["group"]]["drive"]
+        else:
+            drives = {drive: state for group in groups.values() for drive, state in group["drive"].items() if drive == media_sample.get("drive")}
+        robots = [drive for drive, state in drives.items() if state["controller"] is not None]
+        manual = [drive for drive, state in drives.items() if state["controller"] is None]
+        return robots, manual
+
+
+    def rescue_follow_up(media_sample,groups,queue,jobs,config_data):
+        """Queue a sample again as a follow-up job for a drive it wasn't in
+
+        The rip handler continues from what earlier drives read. Drives with
+        a robot are never used as it would load the next disc in its bin
+        rather than this one. If no other drive is in the group the last pass
+        is run in any drive loaded by hand.
+        """
+        rescue = media_sample["rescue"]
+        rescue["needed"] = False
+
+        # Follow-up can go to another group of drives
+        if rescue.get("group") is not None:
+            if rescue["group"] in groups:
+                media_sample["group"] = rescue["group"]
+            else:
+                print(f"Rescue group [{rescue["group"]}] not found")
+
+        # Keep out of drives already tried if another drive can take it
+        robots, manual = MediaReader.sample_drives(media_sample,groups)
+        if not manual:
+            print(f"No drive loaded by hand for [{media_sample["name"]}], rescue not continued")
+            jobs.setState(media_sample["name"],"failed",media_sample)
+            Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":"failed","done":True}},config_data)
+            return
+        if any(drive not in rescue["drives"] for drive in manual):
+            media_sample["exclude_drives"] = list(rescue["drives"]) + [drive for drive in robots if drive not in rescue["drives"]]
+        else:
+            print(f"No other drive for [{media_sample["name"]}], finishing rescue in any drive loaded by hand")
+            rescue["final"] = True
+            media_sample["exclude_drives"] = robots
+
+        print(f"Follow-up job {rescue["job_id"]} for [{media_sample["name"]}] with {rescue.get("remaining")} bytes left")
+        media_sample["done"] = False
+        queue.requeue(media_sample,front=True)
+        jobs.setState(media_sample["name"],"queued",media_sample)
+        Handler.web_update(None,{"queue":{"name":media_sample["name"],"state":"queued","done":False}},config_data)
+
+
+    def rip(media_sample,config_data,callback_update=None,controller=None,convert_queue=None):
         """Determine media_sample type and start ripping
 
+        If a convert_queue is given the ripped sample is sent to it to be
+        converted elsewhere and this returns as soon as the rip is finished.
         """
 
         # Set starting status
@@ -337,12 +529,18 @@ class MediaReader(object):
         if "time_start" not in media_sample:
             media_sample["time_start"] =  str(datetime.now().isoformat()).replace(":","-")
 
+        # Job state
+        ripped = False
+        MediaReader.jobState(media_sample,config_data,"ripping")
+
         # If a handler exists attempt to rip
         if media_handler is not None:
             # Setup config
             media_handler.config(config_data)
             # Set controller
             media_handler.controller = controller
+            # Samples handed to a conversion queue come from the scheduler
+            media_handler.scheduled = convert_queue is not None
             # Rip media and store information about resulting data
             data_outputs = media_handler.rip(media_sample)
             # Add all data to the media object
@@ -350,8 +548,16 @@ class MediaReader(object):
                 for data in data_outputs:
                     media_sample["data"].append(data)
 
-                # Post-rip status
-                media_handler.status(media_sample)
+                # Post-rip status, written now as conversion may run in another process
+                ripped = True
+                media_handler.status(media_sample,force=True)
+                MediaReader.jobState(media_sample,config_data,"converting",True)
+
+                # Hand off to conversion pool
+                if convert_queue is not None:
+                    Handler.flushStatus(None)
+                    convert_queue.put(media_sample)
+                    return
 
                 # Begin processing data
                 try:
@@ -378,9 +584,63 @@ class MediaReader(object):
         if "time_end" not in media_sample:
             media_sample["time_end"] = str(datetime.now().isoformat()).replace(":","-")
         media_handler.status(media_sample)
+        MediaReader.jobState(media_sample,config_data,"done" if ripped else "failed",True)
+
+
+    def rip_process(media_sample,config_data,callback_update=None):
+        """Run rip as the target of a process
+
+        Web updates are sent by a background thread that stops when the
+        process exits so they are flushed first.
+        """
+        MediaReader.rip(media_sample,config_data,callback_update)
+        Handler.flushStatus(None)
+        Handler.statusClose(None)
+        Handler.web_flush(None,config_data)
+
+
+    def convert_init():
+        """Setup conversion pool worker process
+
+        """
+        # Pool runs a conversion per CPU so handlers default to one thread
+        Handler.pooled=True
 
 
-    def rip_auto(media_sample,config_data,callback_update=None,wait=None,controller=None):
+    def convert_resume(media_sample,config_data):
+        """Finish converting a sample that was already ripped
+
+        Run by the conversion pool after a rip and for jobs that were
+        interrupted during conversion by a restart. Returns the converted
+        sample so the scheduler can check it.
+        """
+        # Override Config data
+        if "config_data" in media_sample:
+            config_submit = media_sample["config_data"]
+            config_submit["settings"] = config_data["settings"]
+        else:
+            config_submit = config_data
+
+        media_handler = Handler()
+        media_handler.config(config_submit)
+
+        # Begin processing data
+        try:
+            MediaReader.convert_data(media_sample,config_submit)
+        except Exception as e:
+            print("Conversion no worky: "+repr(e))
+
+        # Set ending status
+        media_sample["done"] = True
+        if "time_end" not in media_sample:
+            media_sample["time_end"] = str(datetime.now().isoformat()).replace(":","-")
+        media_handler.status(media_sample)
+        MediaReader.jobState(media_sample,config_submit,"done",True)
+        Handler.flushStatus(None)
+        return media_sample
+
+
+    def rip_auto(media_sample,config_data,callback_update=None,wait=None,controller=None,convert_queue=None):
         """ Attempt to automatically manage ripping process for samples
 
         """
@@ -395,12 +655,15 @@ class MediaReader(object):
         if media_manager.loadMediaType(media_sample,True,controller) == False:
             # media was unreadable
             Handler.web_update(None,{"drive_status":{media_sample["drive"]:{"status":2,"title":"Media unreadable, removing from queue"}}},config_data)
+            MediaReader.jobState(media_sample,config_data,"failed")
             media_manager.ejectMediaType(media_sample,controller)# queue update
             Handler.web_update(None,{"queue":{"name":media_sample["name"],"done":True}},config_data)
 
             # Drive update
             MediaReader.drive_status[media_sample["drive"]]["status"]=0
             Handler.web_update(None,{"drive_status":{media_sample["drive"]:{"status":0,"title":"Idle","media":""}}},config_data)
+            Handler.statusClose(None)
+            Handler.web_flush(None,config_data)
             return
 
         # Get a media handler for this type of media_sample
@@ -415,7 +678,7 @@ class MediaReader(object):
         Handler.web_update(None,{"drive_status":{media_sample["drive"]:{"status":1,"title":"Ripping"}}},config_data)
 
         # Rip
-        MediaReader.rip(media_sample,config_data,callback_update,controller)
+        MediaReader.rip(media_sample,config_data,callback_update,controller,convert_queue)
 
         # Drive update
         MediaReader.drive_status[media_sample["drive"]]["status"]=2
@@ -439,11 +702,19 @@ class MediaReader(object):
         # Drive update
         MediaReader.drive_status[media_sample["drive"]]["status"]=0
         Handler.web_update(None,{"drive_status":{media_sample["drive"]:{"status":0,"title":"Idle","media":""}}},config_data)
+        # Send updates before process exits
+        Handler.flushStatus(None)
+        Handler.statusClose(None)
+        Handler.web_flush(None,config_data)
 
 
     def convert_data(media_sample,config_data):
         """ Converts all possible data types until media sample if fully processed.
 
+        Handlers are planned from the data types they take and output. Each
+        data entry and handler that can work on it is a conversion that starts
+        as soon as the entry exists, so independent branches run at the same
+        time. A handler works on one entry at a time.
         """
 
         # Init media manager
@@ -452,23 +723,70 @@ class MediaReader(object):
         # Create virtual data formats from config
         data_manager.configVirtual(config_data)
 
-        # Setup config
-        data_processed=0
-        # Iterate over all data from media sample which can increase as data is processed
-        while data_processed < len(media_sample["data"]):
-            # Update data count
-            data_processed = len(media_sample["data"])
-            # Convert all data
-            for data in media_sample["data"]:
-                # Get a media handler for this type of media_sample
-                data_handler = data_manager.findDataType(data)
-
-                # If a handler exists attempt to rip
-                if data_handler is not None:
-                    # Setup config
-                    data_handler.config(config_data)
-                    # Pass entire media sample to converter to support conversion using multiple data sources at once
-                    media_sample = data_handler.convert(media_sample)
-
-                else:
-                    print(f"No data handler found for [{data["type_id"]}]")
+        # Plan handlers for all types the sample can be converted to
+        plan = data_manager.plan([data["type_id"] for data in media_sample["data"]])
+        print(f"Conversion plan: {plan}")
+
+        # Setup config once for each handler
+        locks={}
+        for key in plan:
+            data_handler = data_manager.data_types.get(key)
+            data_handler.config(config_data)
+            data_handler.setProjectDir(media_sample["name"])
+            locks[key]=threading.Lock()
+
+        def convert_entry(key, data):
+            with locks[key]:
+                return data_manager.data_types.get(key).convertEntry(media_sample, data)
+
+        # Each handler works on one entry at a time so more threads than
+        # handlers would never be used, the pool already converts a sample
+        # per CPU
+        convert_threads = config_data["settings"].get("convert_threads")
+        if convert_threads is None:
+            convert_threads = 1 if Handler.pooled else len(plan)
+
+        handled_types = {data_manager.data_types.handlers[key]["type_id"] for key in plan}
+
+        # Conversions started by entry index and handler key
+        started=set()
+        running={}
+        with ThreadPoolExecutor(max_workers=max(1,int(convert_threads))) as pool:
+            while True:
+                # Start conversions for entries that are ready, in plan order
+                for index, data in enumerate(media_sample["data"]):
+                    if data["type_id"] not in handled_types and (index, None) not in started:
+                        started.add((index, None))
+                        print(f"No data handler found for [{data["type_id"]}]")
+                    keys = data_manager.handlersFor(data, plan)
+                    for key in keys:
+                        if (index, key) not in started:
+                            started.add((index, key))
+                            running[pool.submit(convert_entry, key, data)]=(key, data)
+
+                if not running:
+                    break
+
+                # Add outputs of finished conversions to the sample
+                done, pending = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key, data = running.pop(future)
+                    try:
+                        data_outputs = future.result()
+                    except Exception as e:
+                        print(f"Conversion of [{data["type_id"]}] with [{key}] failed: {repr(e)}")
+                        continue
+                    if data_outputs is not None:
+                        # Mark data as processed
+                        data["processed_by"].append(data_manager.data_types.handlers[key].get("handle_id"))
+                        media_sample["data"] += data_outputs
+
+        # Sample is verified if every check was, unverified if any check failed
+        checks=[data["verified"] for data in media_sample["data"] if "verified" in data]
+        if len(checks) > 0:
+            if False in checks:
+                media_sample["verified"]=False
+            elif all(check is True for check in checks):
+                media_sample["verified"]=True
+            else:
+                media_sample["verified"]=None
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+
+# AccurateRip checksums for pyDiscRip. Calculates AccurateRip v1/v2 and CRC32
+# of audio tracks and reads AccurateRip database files stored locally.
+
+# Python System
+import os
+import sys
+import json
+import zlib
+import array
+import struct
+from operator import mul, rshift
+from itertools import repeat
+
+# External Modules
+try:
+    import numpy
+except Exception as e:
+    # Checksums are calculated with builtins when numpy is not available
+    numpy = None
+
+
+# Samples (both channels as one 32 bit word) in each CD sector
+SECTOR_SAMPLES=588
+
+# Samples skipped at the start of the first track and end of the last track
+EDGE_SAMPLES=5*SECTOR_SAMPLES
+
+# Samples checksummed at once to limit memory use
+CHUNK_SAMPLES=1024*1024
+
+
+def sum_products(words, first_multiplier):
+    """Sum of each sample multiplied by its position
+
+    Returns the total of all products and the total of the high 32 bits of
+    each product. Uses numpy when available.
+    """
+    if numpy is not None:
+        samples=numpy.frombuffer(words, dtype="<u4").astype(numpy.uint64)
+        products=samples*numpy.arange(first_multiplier, first_multiplier+len(samples), dtype=numpy.uint64)
+        # Sums wrap at 64 bits which keeps the low 32 bits correct
+        return int(products.sum(dtype=numpy.uint64)), int((products >> numpy.uint64(32)).sum(dtype=numpy.uint64))
+
+    samples=array.array("I")
+    samples.frombytes(words)
+    if sys.byteorder == "big":
+        samples.byteswap()
+    positions=range(first_multiplier, first_multiplier+len(samples))
+    return sum(map(mul, samples, positions)), sum(map(rshift, map(mul, samples, positions), repeat(32)))
+
+
+def track_checksums(data, first=False, last=False):
+    """Get AccurateRip v1, v2 and CRC32 of the audio of one track
+
+    Data is little endian 16 bit stereo audio. The first and last five sectors
+    of a disc are not included in AccurateRip checksums as drive offsets make
+    them unreliable.
+    """
+    count=len(data)//4
+    # Positions are counted from 1
+    check_from=EDGE_SAMPLES if first else 1
+    check_to=count-EDGE_SAMPLES if last else count
+
+    total=0
+    high=0
+    view=memoryview(data)
+    for start in range(check_from, check_to+1, CHUNK_SAMPLES):
+        end=min(start+CHUNK_SAMPLES, check_to+1)
+        chunk_total, chunk_high=sum_products(view[(start-1)*4:(end-1)*4], start)
+        total+=chunk_total
+        high+=chunk_high
+
+    # v2 adds the high and low 32 bits of each product which is the product
+    # less the high bits shifted out
+    v1=total & 0xFFFFFFFF
+    v2=(total-high*0xFFFFFFFF) & 0xFFFFFFFF
+    return v1, v2, zlib.crc32(data) & 0xFFFFFFFF
+
+
+def cddb_sum(seconds):
+    return sum(int(digit) for digit in str(seconds))
+
+
+def disc_ids(offsets, leadout):
+    """Get AccurateRip disc IDs from sector offsets of tracks and the lead out
+
+    Returns ID 1, ID 2 and the freedb ID the database is keyed by.
+    """
+    id1=sum(offsets)+leadout
+    id2=sum(max(offset, 1)*(number+1) for number, offset in enumerate(offsets))+leadout*(len(offsets)+1)
+
+    # freedb times include the two second lead in
+    checksum=sum(cddb_sum((offset+150)//75) for offset in offsets)
+    length=(leadout+150)//75-(offsets[0]+150)//75
+    cddb=((checksum % 255) << 24) | (length << 8) | len(offsets)
+
+    return id1 & 0xFFFFFFFF, id2 & 0xFFFFFFFF, cddb
+
+
+def dbar_name(track_count, id1, id2, cddb):
+    return f"dBAR-{track_count:03d}-{id1:08x}-{id2:08x}-{cddb:08x}.bin"
+
+
+class AccurateRipDatabase(object):
+    """Local copy of AccurateRip results
+
+    Files are found by name either directly in the folder or in the same
+    nested folders as the AccurateRip server. Each file can be the binary
+    response from AccurateRip or a JSON stand-in with the same name ending in
+    .json instead of .bin:
+
+        [{"tracks": [{"confidence": 3, "crc": "8c7b7e2f", "crc32": "..."}]}]
+    """
+
+    def __init__(self, path):
+        """Constructor to setup database folder
+
+        """
+        self.path=os.path.expanduser(path) if path is not None else None
+
+
+    def filePaths(self, name, id1):
+        nested=f"{id1 & 0xF:x}/{(id1 >> 4) & 0xF:x}/{(id1 >> 8) & 0xF:x}"
+        return [
+            f"{self.path}/{name}",
+            f"{self.path}/{nested}/{name}",
+            f"{self.path}/{name.replace(".bin",".json")}",
+            f"{self.path}/{nested}/{name.replace(".bin",".json")}"
+        ]
+
+
+    def parseBinary(self, data):
+        """Parse AccurateRip response into pressings
+
+        Each pressing has a header of track count and disc IDs followed by a
+        confidence and checksum for every track.
+        """
+        pressings=[]
+        position=0
+        while position+13 <= len(data):
+            track_count, id1, id2, cddb = struct.unpack_from("<BIII", data, position)
+            position+=13
+            tracks=[]
+            for track in range(track_count):
+                confidence, crc, crc450 = struct.unpack_from("<BII", data, position)
+                position+=9
+                tracks.append({"confidence": confidence, "crc": crc, "crc450": crc450})
+            pressings.append({"id1": id1, "id2": id2, "cddb": cddb, "tracks": tracks})
+        return pressings
+
+
+    def lookup(self, track_count, id1, id2, cddb):
+        """Get pressings of a disc or None if the disc is not in the database
+
+        """
+        if self.path is None:
+            return None
+        name=dbar_name(track_count, id1, id2, cddb)
+        for filepath in self.filePaths(name, id1):
+            if not os.path.isfile(filepath):
+                continue
+            if filepath.endswith(".json"):
+                with open(filepath, newline='') as jsonfile:
+                    pressings=json.load(jsonfile)
+                # Checksums may be stored as hex strings
+                for pressing in pressings:
+                    for track in pressing["tracks"]:
+                        for key in ["crc", "crc450", "crc32"]:
+                            if isinstance(track.get(key), str):
+                                track[key]=int(track[key], 16)
+                return pressings
+            with open(filepath, 'rb') as binfile:
+                return self.parseBinary(binfile.read())
+        return None
@@ -4,144 +4,179 @@
 import argparse
 import sys
 import os
-import re
-from enum import Enum
-
-class CD_MODE_SECTORS(Enum):
-    AUDIO = 2352
-    CDG = 2448
-    MODE1_RAW = 2352
-    MODE1_2048 = 2048
-    MODE1_2352 = 2352
-    MODE2_RAW = 2352
-    MODE2_2048 = 2048
-    MODE2_2324 = 2324
-    MODE2_2336 = 2336
-    MODE2_2352 = 2352
-    CDI_2336 = 2336
-    CDI_2352 = 2352
-
-
-def msf2sector(msf):
-    sector=0
-    sector+=int(msf.split(":")[0])*60*75
-    sector+=int(msf.split(":")[1])*75
-    sector+=int(msf.split(":")[2])
-
-    return sector
-
-def sector2msf(sector):
-    msf=""
-    m=sector // (60*75)
-    msf+=str(int(m)).zfill(2)+":"
-    s=(sector-(m*(60*75))) // (75)
-    msf+=str(int(s)).zfill(2)+":"
-    f=sector % 75
-    msf+=str(int(f)).zfill(2)
-
-    return msf
-
-def cue_by_line(cue_file, bin_out,path="./"):
+import json
+import zlib
+import hashlib
+
+# Internal Modules
+try:
+    from handler.util.cuesheet import CueSheet, CD_MODE_SECTORS, msf2sector, sector2msf
+except ImportError:
+    # Allow running directly from the util folder
+    from cuesheet import CueSheet, CD_MODE_SECTORS, msf2sector, sector2msf
+
+def copy_range(src_fd, dst_fd, offset, length):
+    """Copy part of one file to the current position of another
+
+    Uses kernel side copies with copy_file_range or sendfile so data is not
+    passed through python, falling back to plain reads and writes.
+    """
+    # Kernel side copy
+    for copy in ("copy_file_range", "sendfile"):
+        try:
+            while length > 0:
+                if copy == "copy_file_range":
+                    copied = os.copy_file_range(src_fd, dst_fd, length, offset)
+                else:
+                    copied = os.sendfile(dst_fd, src_fd, offset, length)
+                if copied == 0:
+                    return
+                offset+=copied
+                length-=copied
+            return
+        except (AttributeError, OSError):
+            # Not supported for these files, try next method
+            continue
+
+    # Userspace copy
+    while length > 0:
+        chunk = os.pread(src_fd, min(length, 1024*1024), offset)
+        if not chunk:
+            return
+        os.write(dst_fd, chunk)
+        offset+=len(chunk)
+        length-=len(chunk)
+
+
+def copy_hashed(src_path, output, checksum, chunk_size=4*1024*1024):
+    """Append a file to an open output while updating its checksums
+
+    Data is read in chunks into a reused buffer so only one chunk is held in
+    memory at a time.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+    with open(src_path, "rb", buffering=0) as r:
+        while True:
+            size = r.readinto(buffer)
+            if not size:
+                break
+            chunk = view[:size]
+            checksum["crc32"]=zlib.crc32(chunk, checksum["crc32"])
+            checksum["md5"].update(chunk)
+            checksum["sha1"].update(chunk)
+            checksum["size"]+=size
+            output.write(chunk)
+    view.release()
+
+
+def checksum_new():
+    """Setup empty running checksums
+
+    """
+    return {"size": 0, "crc32": 0, "md5": hashlib.md5(), "sha1": hashlib.sha1()}
+
+
+def checksum_json(checksum):
+    """Get final values of running checksums
+
+    """
+    return {
+        "size": checksum["size"],
+        "crc32": f"{checksum["crc32"]:08x}",
+        "md5": checksum["md5"].hexdigest(),
+        "sha1": checksum["sha1"].hexdigest()
+    }
+
 
+def cue_by_line(cue_file, bin_out,path="./",checksums=True):
+    """Merge all BIN files of each session in a CUE into one BIN
+
+    Writes a new CUE with index positions moved to the merged BINs. The CUE
+    can be a path or an already loaded CueSheet.
+    """
     # Create output folder if it doesn't exist
     if not os.path.exists(path):
         os.makedirs(path)
 
     # Load CUE file
-    cue_lines=None
-    cue_dir=os.path.dirname(cue_file) if os.path.dirname(cue_file) != "" else "./"
-    with open(cue_file) as file:
-        cue_lines = [line.rstrip() for line in file]
+    if isinstance(cue_file, CueSheet):
+        sheet=cue_file
+    else:
+        try:
+            sheet=CueSheet.load(cue_file)
+        except FileNotFoundError as e:
+            # Exit if file not found
+            print(e)
+            sys.exit(1)
 
     # Count sessions to know if is multisession disc image
-    session_total=0
-
-    # Check all BIN files exist
-    for line in cue_lines:
-        if "SESSION" in line:
-            session_total+=1
-        if "FILE" in line:
-            # Exist if file not found
-            if not os.path.exists(cue_dir+"/"+re.search(r'FILE "?(.*?)"? BINARY', line).group(1)):
-                print(f'BIN file [{re.search(r'FILE "?(.*?)"? BINARY', line).group(1)}] from CUE not found.')
-                sys.exit(1)
-
-    # Setup runtime
-    mode_size=2352
-    session=1
-    session_post="" if session_total == 0 or session_total == 1 else f'-s{session}'
-    track=0
-    # Track position in data with sector position relative to bin data
-    sector=0
-    file_size_full=0
-    file_size_used=0
+    session_total=len([line for line in sheet.lines if line["kind"] == "session"])
+    session_post="" if session_total == 0 or session_total == 1 else '-s1'
+    # First file of a session is replaced by merged BIN
+    session_file=False
 
     # Prepare output files
     if bin_out:
         output = open(f'{path}/{bin_out+session_post}.bin', "w+b")
         cue = open(f'{path}/{bin_out}.cue', 'w')
+        # Running checksums for each output BIN
+        bin_checksums = {f'{bin_out+session_post}.bin': checksum_new()}
 
     # Main CUE loop
-    for line in cue_lines:
-        # Reset on new session and start new file
-        if "SESSION" in line:
-            result=re.search(r'REM SESSION ([0-9]+)', line)
-            sector=0
-            session=int(result.group(1))
-            file_size_full=0
-            file_size_used=0
-            session_post=f'-s{session}'
+    for line in sheet.lines:
+        text=line["text"]
+
+        # Start new file on new session
+        if line["kind"] == "session":
+            session_post=f'-s{line["session"]}'
+            session_file=False
             if bin_out:
                 output.close()
                 output = open(f'{path}/{bin_out+session_post}.bin', "w+b")
+                bin_checksums[f'{bin_out+session_post}.bin'] = checksum_new()
 
-        # Use track to get sector size for upcoming data
-        if "TRACK" in line:
-            result=re.search(r'TRACK ([0-9]+) (.*)', line)
-            if result is not None:
-                track=result.group(1)
-                mode_size=CD_MODE_SECTORS[result.group(2).replace("/","_")].value
-
-        # Get size of files to calculate length of tracks using sector size
-        if "FILE" in line:
-            if file_size_full == 0:
-                if bin_out:
+        if line["kind"] == "file":
+            bin_file=sheet.files[line["file"]]
+            if bin_out:
+                # First file in session is replaced by merged BIN
+                if not session_file:
+                    session_file=True
                     cue.write(f'FILE "{bin_out+session_post}.bin" BINARY'+"\n")
 
-            # Copy bin file into output
-            if bin_out:
-                with open(cue_dir+"/"+re.search(r'FILE "?(.*?)"? BINARY', line).group(1), "rb") as r:
-                    output.write(r.read())
-
-            # Add any unaccounted for data to sector position
-            sector+=file_size_full
-
-            # Reset size
-            file_size_used=0
-            file_size_full=os.path.getsize(cue_dir+"/"+re.search(r'FILE "?(.*?)"? BINARY', line).group(1))/mode_size
-
-        # Check for MSF times in INDEXes
-        if "INDEX" in line:
-            result = re.search(r'[0-9]+:[0-9]+:[0-9]+', line)
-            if result is not None:
-                # Consume current file data
-                if file_size_full != 0:
-                    file_size_used=msf2sector(result.group(0))
-
-                # Update MSF in line
-                line=line.replace(result.group(0),sector2msf(sector+file_size_used))
-
-        # Pass all lines to new CUE except old FILE lines
-        if "FILE" not in line:
-            print(line)
-            if bin_out:
-                cue.write(line+"\n")
+                # Copy bin file into output
+                bin_in=sheet.filePath(bin_file)
+                if checksums:
+                    # Hash while copying so output doesn't need to be read again
+                    copy_hashed(bin_in, output, bin_checksums[f'{bin_out+session_post}.bin'])
+                else:
+                    # Copy in kernel without reading into memory
+                    output.flush()
+                    with open(bin_in, "rb") as r:
+                        copy_range(r.fileno(), output.fileno(), 0, bin_file["size"])
+
+            # Old FILE lines are not passed to new CUE
+            continue
+
+        # Update MSF in INDEX line to position in merged BIN
+        if line["kind"] == "index":
+            text=text.replace(line["msf"],sector2msf(sheet.mergedSector(line["track"], line["index"])))
+
+        # Pass all lines to new CUE
+        print(text)
+        if bin_out:
+            cue.write(text+"\n")
 
     # Close new files
     if bin_out:
         cue.close()
         output.close()
 
+        # Save checksums beside CUE
+        if checksums:
+            with open(f'{path}/{bin_out}.checksums.json', 'w') as file:
+                file.write(json.dumps({name: checksum_json(checksum) for name, checksum in bin_checksums.items()}, indent=4))
+
 
 if __name__ == "__main__":
     """ Run directly
@@ -153,6 +188,7 @@ if __name__ == "__main__":
             epilog='By Shelby Jueden')
     parser.add_argument('-d', '--debug', help="Only print CUE, don't write files", action='store_true')
     parser.add_argument('-o', '--output-folder', help="Path to output files to", default="./")
+    parser.add_argument('-n', '--no-checksums', help="Don't calculate checksums of output BINs", action='store_true')
     parser.add_argument('filenames', help="", default=None, nargs=argparse.REMAINDER)
     args = parser.parse_args()
 
@@ -179,4 +215,4 @@ if __name__ == "__main__":
         sys.exit(1)
     else:
         print(f'Working on {cue}')
-        cue_by_line(cue,bin_out,args.output_folder)
+        cue_by_line(cue,bin_out,args.output_folder,checksums=not args.no_checksums)
@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+
+# BIN/CUE track splitter for pyDiscRip. Writes each track of a BIN/CUE image
+# to a WAV or ISO file without running an external tool.
+
+# Python System
+import argparse
+import sys
+import os
+import mmap
+import struct
+
+# Internal Modules
+try:
+    from handler.util.bincon import copy_range
+    from handler.util.cuesheet import CueSheet
+except ImportError:
+    # Allow running directly from the util folder
+    from bincon import copy_range
+    from cuesheet import CueSheet
+
+
+# User data position in each sector for track modes
+# (offset into sector, bytes of user data, output extension)
+TRACK_DATA = {
+    "AUDIO": (0, 2352, "wav"),
+    "CDG": (0, 2448, "cdg"),
+    "MODE1_RAW": (16, 2048, "iso"),
+    "MODE1_2048": (0, 2048, "iso"),
+    "MODE1_2352": (16, 2048, "iso"),
+    "MODE2_RAW": (24, 2048, "iso"),
+    "MODE2_2048": (0, 2048, "iso"),
+    "MODE2_2324": (0, 2324, "iso"),
+    "MODE2_2336": (8, 2048, "iso"),
+    "MODE2_2352": (24, 2048, "iso"),
+    "CDI_2336": (8, 2048, "iso"),
+    "CDI_2352": (24, 2048, "iso"),
+}
+
+# Max sector slices passed to a single writev call
+IOV_MAX = 1024
+
+
+def wav_header(length):
+    """Build RIFF header for 44.1kHz 16-bit stereo CD audio
+
+    """
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", length+36, b"WAVE",
+        b"fmt ", 16, 1, 2, 44100, 44100*4, 4, 16,
+        b"data", length)
+
+
+def write_sectors(data, out_fd, track):
+    """Write user data from each sector of a track using memoryview slices
+
+    """
+    data_offset, data_size, ext = TRACK_DATA[track["mode"]]
+    sector_size=track["sector_size"]
+    view=memoryview(data)
+    try:
+        slices=[]
+        for sector in range(track["offset"], track["end"]-sector_size+1, sector_size):
+            slices.append(view[sector+data_offset:sector+data_offset+data_size])
+            if len(slices) == IOV_MAX:
+                os.writev(out_fd, slices)
+                slices=[]
+        if slices:
+            os.writev(out_fd, slices)
+        del slices
+    finally:
+        view.release()
+
+
+def cue_split(cue_file, wav_dir, iso_dir=None, basename="track"):
+    """Split all tracks in a CUE into WAV and ISO files
+
+    Audio tracks are copied with a RIFF header, data tracks have sync and
+    header bytes removed. The CUE can be a path or an already loaded
+    CueSheet. Returns a list of files written.
+    """
+    if iso_dir is None:
+        iso_dir=wav_dir
+
+    # Load CUE file
+    sheet = cue_file if isinstance(cue_file, CueSheet) else CueSheet.load(cue_file)
+
+    written=[]
+    for track in sheet.tracks:
+        data_offset, data_size, ext = TRACK_DATA[track["mode"]]
+        out_dir = wav_dir if ext == "wav" else iso_dir
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        out_file=f"{out_dir}/{basename}{str(track["number"]).zfill(2)}.{ext}"
+        length=max(0, track["end"]-track["offset"])
+        print(f"Track {track["number"]} {track["mode"]} session {track["session"]}: {out_file}")
+
+        with open(sheet.filePath(sheet.files[track["file"]]), "rb") as bin_file, open(out_file, "wb") as out:
+            out_fd=out.fileno()
+            if ext == "wav":
+                # Audio is copied directly after header
+                out.write(wav_header(length))
+                out.flush()
+                copy_range(bin_file.fileno(), out_fd, track["offset"], length)
+            elif data_offset == 0 and data_size == track["sector_size"]:
+                # Sectors are only user data
+                copy_range(bin_file.fileno(), out_fd, track["offset"], length)
+            elif length > 0:
+                # Strip sync, header and error correction from each sector
+                with mmap.mmap(bin_file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    write_sectors(data, out_fd, track)
+
+        written.append(out_file)
+
+    return written
+
+
+if __name__ == "__main__":
+    """ Run directly
+
+    """
+    parser = argparse.ArgumentParser(
+            prog='binsplit',
+            description='BIN/CUE track splitter to write tracks as WAV and ISO files.',
+            epilog='By Shelby Jueden')
+    parser.add_argument('-o', '--output-folder', help="Path to output files to", default="./")
+    parser.add_argument('-b', '--basename', help="Prefix for track file names", default="track")
+    parser.add_argument('cue', help="CUE file to split")
+    args = parser.parse_args()
+
+    try:
+        cue_split(args.cue, args.output_folder, basename=args.basename)
+    except FileNotFoundError as e:
+        print(e)
+        sys.exit(1)
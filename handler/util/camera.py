@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+
+# Camera capture service for pyDiscRip. Keeps a camera streaming in the
+# scheduler so rip processes can take a photo without opening the camera.
+
+# Python System
+import os
+import json
+import time
+import socket
+import threading
+
+
+def camera_open(video_id, width, height):
+    """Open camera and start YUYV capture
+
+    """
+    from linuxpy.video.device import Device, VideoCapture
+    cam = Device.from_id(video_id)
+    cam.open()
+    # set camera data format
+    capture = VideoCapture(cam)
+    capture.set_format(width, height, "YUYV")
+    cam.controls["focus_automatic_continuous"].value=False
+    return cam
+
+
+def capture_direct(video_id, width, height, focus):
+    """Take one frame with the camera opened only for this frame
+
+    Used when no capture service is running.
+    """
+    cam = camera_open(video_id, width, height)
+    try:
+        cam.controls["focus_absolute"].value=focus
+        time.sleep(3)
+        # get frame from camera after exposure and focus settle
+        for i, frame in enumerate(cam):
+            if i > 30:
+                return bytes(frame.data)
+    finally:
+        cam.close()
+
+
+class CameraService(object):
+    """Camera kept streaming with the latest frame ready for photos
+
+    Runs as threads in the scheduler process. Clients ask for a frame with a
+    focus value over a Unix socket and get the first frame captured after
+    their request, so a photo takes one frame time unless focus changed.
+    """
+
+    # Services started in this process by video ID
+    services={}
+
+    # Sockets of each camera
+    SOCKET_DIR="/tmp/discrip/camera"
+
+    # Frames to skip after changing focus
+    FOCUS_SETTLE_FRAMES=30
+
+
+    def __init__(self, video_id, width, height):
+        """Constructor to open camera and start capture and socket threads
+
+        """
+        self.video_id=video_id
+        self.width=width
+        self.height=height
+        self.focus=None
+        # Latest frame and its number
+        self.latest_frame=None
+        self.frame_count=0
+        self.condition=threading.Condition()
+
+        self.cam=camera_open(video_id, width, height)
+
+        if not os.path.exists(CameraService.SOCKET_DIR):
+            os.makedirs(CameraService.SOCKET_DIR, exist_ok=True)
+        path=CameraService.socketPath(video_id)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+
+        self.capture_thread=threading.Thread(target=self.capture, daemon=True)
+        self.capture_thread.start()
+        self.thread=threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def socketPath(video_id):
+        return f"{CameraService.SOCKET_DIR}/video{video_id}.sock"
+
+
+    def start(video_id, width, height):
+        """Start service for a camera if this process doesn't have one
+
+        """
+        if video_id not in CameraService.services:
+            CameraService.services[video_id]=CameraService(video_id, width, height)
+        return CameraService.services[video_id]
+
+
+    def capture(self):
+        """Keep latest frame from camera
+
+        """
+        for frame in self.cam:
+            with self.condition:
+                self.latest_frame=frame
+                self.frame_count+=1
+                self.condition.notify_all()
+
+
+    def nextFrame(self, focus):
+        """Get first frame after now with focus set
+
+        """
+        with self.condition:
+            after=self.frame_count
+            if focus != self.focus:
+                self.cam.controls["focus_absolute"].value=focus
+                self.focus=focus
+                after+=CameraService.FOCUS_SETTLE_FRAMES
+            while self.frame_count <= after:
+                if not self.condition.wait(10):
+                    raise OSError(f"No frames from camera {self.video_id}")
+            return bytes(self.latest_frame.data)
+
+
+    def run(self):
+        """Serve frame requests one at a time
+
+        """
+        while True:
+            connection, address = self.server.accept()
+            try:
+                with connection.makefile("rwb") as stream:
+                    for raw in stream:
+                        request=json.loads(raw)
+                        try:
+                            data=self.nextFrame(request["focus"])
+                            header={"width": self.width, "height": self.height, "format": "YUYV", "size": len(data)}
+                        except OSError as e:
+                            data=b""
+                            header={"error": repr(e)}
+                        stream.write((json.dumps(header)+"\n").encode("utf-8"))
+                        stream.write(data)
+                        stream.flush()
+            except (OSError, ValueError) as e:
+                print(f"Camera session on video{self.video_id} ended: {repr(e)}")
+            finally:
+                connection.close()
+
+
+    def frame(video_id, focus):
+        """Get a YUYV frame from the service of a camera
+
+        Raises FileNotFoundError or ConnectionRefusedError if no service is
+        running for the camera.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.connect(CameraService.socketPath(video_id))
+            with client.makefile("rwb") as stream:
+                stream.write((json.dumps({"focus": focus})+"\n").encode("utf-8"))
+                stream.flush()
+                header=json.loads(stream.readline())
+                if "error" in header:
+                    raise OSError(header["error"])
+                return stream.read(header["size"])
@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+
+# Conversion cache for pyDiscRip. Outputs of a conversion are stored by the
+# content of its inputs and the config of the handler that made them.
+
+# Python System
+import os
+import json
+import time
+import fcntl
+import shutil
+import hashlib
+
+
+# ioctl to share file extents on filesystems that support it (btrfs, xfs)
+FICLONE=0x40049409
+
+
+def clone_file(src, dst, copy=True):
+    """Put a copy of a file at a path as cheaply as possible
+
+    Tries a reflink, then a hardlink and copies the data if neither works and
+    copy is True. The destination is replaced in one step so readers never see
+    it partial. Returns False if the file was not placed without copying.
+    """
+    tmp_path=f"{dst}.{os.getpid()}.tmp"
+    linked=True
+    try:
+        with open(src, 'rb') as src_file, open(tmp_path, 'wb') as dst_file:
+            fcntl.ioctl(dst_file.fileno(), FICLONE, src_file.fileno())
+        shutil.copystat(src, tmp_path)
+    except OSError:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        try:
+            os.link(src, tmp_path)
+        except OSError:
+            if not copy:
+                return False
+            shutil.copy2(src, tmp_path)
+            linked=False
+    os.replace(tmp_path, dst)
+    return linked
+
+
+class ConvertCache(object):
+    """Conversion outputs stored by a key of inputs and config
+
+    A key is the hash of the content of every input file, the ID of the
+    handler and its config data. Outputs are only recorded after a conversion
+    worked, a record lists each output with its size and hash and is written
+    last so a record always has all of its outputs. Outputs are kept as
+    objects named by their hash only when they can be reflinked or hardlinked
+    into the cache, otherwise only their hashes are recorded. Outputs that are
+    hardlinked share the object, so they must be removed before being written
+    again rather than changed in place.
+
+    The cache is only used when settings have a convert_cache folder. Objects
+    no project links to are removed least recently used first once they are
+    over convert_cache_size GiB.
+    """
+
+    # Caches opened in this process by path
+    caches={}
+
+    # Hashes of files by inode in this process
+    hashes={}
+
+    # Default size limit of objects in GiB
+    CACHE_SIZE=20
+
+    # Read size for hashing
+    HASH_BLOCK=1024*1024
+
+
+    def __init__(self, path, size=None):
+        """Constructor to setup cache folders
+
+        """
+        self.path=path
+        self.size=(size if size is not None else ConvertCache.CACHE_SIZE)*1024**3
+        for folder in ["records", "objects", "hashes"]:
+            if not os.path.exists(f"{path}/{folder}"):
+                os.makedirs(f"{path}/{folder}", exist_ok=True)
+        self.prune()
+
+
+    def get(settings=None):
+        """Get cache from settings or None if caching is not enabled
+
+        """
+        if settings is None or settings.get("convert_cache") is None:
+            return None
+        path=os.path.expanduser(settings["convert_cache"])
+        if path not in ConvertCache.caches:
+            ConvertCache.caches[path]=ConvertCache(path, settings.get("convert_cache_size"))
+        return ConvertCache.caches[path]
+
+
+    def prune(self):
+        """Remove hashes of files that are gone and objects over the size limit
+
+        Objects that are still hardlinked into a project take no extra space
+        and are not counted.
+        """
+        for entry in os.scandir(f"{self.path}/hashes"):
+            memo=self.read(entry.path)
+            try:
+                stat=os.stat(memo["path"])
+                if entry.name != f"{stat.st_dev}-{stat.st_ino}.json":
+                    raise FileNotFoundError(memo["path"])
+            except (OSError, TypeError, KeyError):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+        objects=[]
+        for folder in os.scandir(f"{self.path}/objects"):
+            for entry in os.scandir(folder.path):
+                # Skip objects other processes are writing or removing
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat=entry.stat()
+                except OSError:
+                    continue
+                if stat.st_nlink == 1:
+                    objects.append((stat.st_atime, stat.st_size, entry.path))
+
+        # Remove least recently used first
+        total=sum(size for atime, size, filepath in objects)
+        for atime, size, filepath in sorted(objects):
+            if total <= self.size:
+                break
+            try:
+                os.remove(filepath)
+                total-=size
+            except OSError:
+                pass
+
+
+    def touch(self, object_path):
+        """Mark object as used
+
+        Only the access time is changed as the modified time of a hardlinked
+        object is shared with the project file and its hash.
+        """
+        stat=os.stat(object_path)
+        os.utime(object_path, ns=(time.time_ns(), stat.st_mtime_ns))
+
+
+    def write(self, filepath, data):
+        """Write JSON file so readers never see it partially written
+
+        """
+        tmp_path=f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as output:
+            output.write(json.dumps(data))
+        os.replace(tmp_path, filepath)
+
+
+    def read(self, filepath):
+        try:
+            with open(filepath, newline='') as jsonfile:
+                return json.load(jsonfile)
+        except (OSError, ValueError):
+            return None
+
+
+    def fileHash(self, filepath):
+        """Get sha256 of a file
+
+        Hashes are kept by inode along with size and modified time so a file
+        is only read again after it changes, including by other processes.
+        """
+        stat=os.stat(filepath)
+        inode=f"{stat.st_dev}-{stat.st_ino}"
+        memo_path=f"{self.path}/hashes/{inode}.json"
+
+        memo=ConvertCache.hashes.get(inode) or self.read(memo_path)
+        if memo is not None and memo["size"] == stat.st_size and memo["mtime_ns"] == stat.st_mtime_ns:
+            ConvertCache.hashes[inode]=memo
+            return memo["sha256"]
+
+        digest=hashlib.sha256()
+        with open(filepath, 'rb') as data:
+            while block := data.read(ConvertCache.HASH_BLOCK):
+                digest.update(block)
+
+        memo={"path": os.path.abspath(filepath), "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest.hexdigest()}
+        ConvertCache.hashes[inode]=memo
+        self.write(memo_path, memo)
+        return memo["sha256"]
+
+
+    def key(self, handle_id, inputs, config_data=None, outputs=None):
+        """Get key of a conversion
+
+        Inputs are file paths, only their content is used so the same data in
+        a different project has the same key. Outputs are the relative output
+        paths the handler expects when they depend on more than the inputs.
+        """
+        key_data={
+            "handle_id": handle_id,
+            "inputs": sorted(self.fileHash(filepath) for filepath in inputs),
+            "config_data": config_data,
+            "outputs": outputs
+        }
+        return hashlib.sha256(json.dumps(key_data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+    def recordPath(self, key):
+        return f"{self.path}/records/{key}.json"
+
+
+    def objectPath(self, sha256):
+        return f"{self.path}/objects/{sha256[:2]}/{sha256}"
+
+
+    def store(self, key, base_dir, files, keep=True):
+        """Record outputs of a conversion that worked
+
+        Files are paths relative to base_dir. With keep False, or when outputs
+        can't be linked into the cache, only sizes and hashes are recorded so
+        outputs can be checked but not restored.
+        """
+        outputs=[]
+        for filepath in files:
+            full_path=f"{base_dir}/{filepath}"
+            sha256=self.fileHash(full_path)
+            outputs.append({"path": filepath, "size": os.path.getsize(full_path), "sha256": sha256})
+
+            if keep:
+                object_path=self.objectPath(sha256)
+                if os.path.exists(object_path):
+                    self.touch(object_path)
+                    continue
+                if not os.path.exists(os.path.dirname(object_path)):
+                    os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                # Copying would double the space used by every output
+                keep=clone_file(full_path, object_path, copy=False)
+
+        self.write(self.recordPath(key), {
+            "key": key,
+            "time": time.time(),
+            "kept": keep,
+            "outputs": outputs
+        })
+        if keep:
+            self.prune()
+
+
+    def verify(self, key, base_dir):
+        """Check outputs of a record are in a folder unchanged
+
+        Returns relative paths of the outputs or None if any are missing or
+        different.
+        """
+        record=self.read(self.recordPath(key))
+        if record is None:
+            return None
+
+        for output in record["outputs"]:
+            full_path=f"{base_dir}/{output["path"]}"
+            if not os.path.isfile(full_path) or os.path.getsize(full_path) != output["size"]:
+                return None
+            if self.fileHash(full_path) != output["sha256"]:
+                return None
+
+        return [output["path"] for output in record["outputs"]]
+
+
+    def restore(self, key, base_dir):
+        """Put outputs of a record into a folder
+
+        Returns relative paths of the outputs or None if there is no usable
+        record for the key.
+        """
+        record=self.read(self.recordPath(key))
+        if record is None or not record["kept"]:
+            return None
+
+        # Check all objects before placing any
+        for output in record["outputs"]:
+            object_path=self.objectPath(output["sha256"])
+            if not os.path.isfile(object_path) or os.path.getsize(object_path) != output["size"]:
+                print(f"Conversion cache object missing for [{output["path"]}]")
+                return None
+
+        for output in record["outputs"]:
+            full_path=f"{base_dir}/{output["path"]}"
+            object_path=self.objectPath(output["sha256"])
+            self.touch(object_path)
+            if os.path.exists(full_path) and os.path.samefile(full_path, object_path):
+                continue
+            if not os.path.exists(os.path.dirname(full_path)):
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            clone_file(object_path, full_path)
+
+        print(f"Using cached conversion [{key[:12]}]")
+        return [output["path"] for output in record["outputs"]]
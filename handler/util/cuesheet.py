@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+
+# CUE sheet parser for pyDiscRip. Parses a CUE once into sessions, files and
+# tracks with sector positions and caches the result beside the CUE.
+
+# Python System
+import os
+import re
+import json
+from enum import Enum
+
+
+class CD_MODE_SECTORS(Enum):
+    AUDIO = 2352
+    CDG = 2448
+    MODE1_RAW = 2352
+    MODE1_2048 = 2048
+    MODE1_2352 = 2352
+    MODE2_RAW = 2352
+    MODE2_2048 = 2048
+    MODE2_2324 = 2324
+    MODE2_2336 = 2336
+    MODE2_2352 = 2352
+    CDI_2336 = 2336
+    CDI_2352 = 2352
+
+
+# CUE line patterns
+RE_SESSION = re.compile(r'REM SESSION ([0-9]+)')
+RE_FILE = re.compile(r'FILE "?(.*?)"? (BINARY|MOTOROLA|WAVE|AIFF|MP3)\s*$')
+RE_TRACK = re.compile(r'TRACK ([0-9]+) (\S+)')
+RE_INDEX = re.compile(r'INDEX ([0-9]+) ([0-9]+:[0-9]+:[0-9]+)')
+
+
+def msf2sector(msf):
+    sector=0
+    sector+=int(msf.split(":")[0])*60*75
+    sector+=int(msf.split(":")[1])*75
+    sector+=int(msf.split(":")[2])
+
+    return sector
+
+def sector2msf(sector):
+    msf=""
+    m=sector // (60*75)
+    msf+=str(int(m)).zfill(2)+":"
+    s=(sector-(m*(60*75))) // (75)
+    msf+=str(int(s)).zfill(2)+":"
+    f=sector % 75
+    msf+=str(int(f)).zfill(2)
+
+    return msf
+
+
+class CueSheet(object):
+    """Parsed CUE sheet
+
+    Holds every line of the CUE along with the files, tracks and sessions it
+    describes. Track indexes are stored in sectors relative to their file and
+    each track has the byte range of its data within the file.
+    """
+
+    # Increase when stored structure changes to invalidate caches
+    CACHE_VERSION=2
+
+
+    def __init__(self, cue_file, parse=True):
+        """Constructor to parse CUE file
+
+        """
+        self.cue_file=cue_file
+        self.cue_dir=os.path.dirname(cue_file) if os.path.dirname(cue_file) != "" else "./"
+        # All lines with what they describe
+        self.lines=[]
+        # BIN files in order with sizes
+        self.files=[]
+        # Tracks in order across all sessions
+        self.tracks=[]
+        # Session numbers with their files and tracks
+        self.sessions=[]
+
+        if parse:
+            self.parse()
+
+
+    def load(cue_file):
+        """Get parsed CUE sheet using cache if CUE and BINs haven't changed
+
+        """
+        cache_file=CueSheet.cachePath(cue_file)
+        try:
+            with open(cache_file) as file:
+                cache = json.load(file)
+            if cache["version"] == CueSheet.CACHE_VERSION and cache["key"] == CueSheet.cacheKey(cue_file, cache["files"]):
+                sheet = CueSheet(cue_file, parse=False)
+                sheet.lines=cache["lines"]
+                sheet.files=cache["files"]
+                sheet.tracks=cache["tracks"]
+                sheet.sessions=cache["sessions"]
+                return sheet
+        except (OSError, ValueError, KeyError, TypeError):
+            # Missing or stale cache
+            pass
+
+        sheet = CueSheet(cue_file)
+        sheet.save()
+        return sheet
+
+
+    def cachePath(cue_file):
+        """Path to cached parse of CUE
+
+        """
+        return f"{cue_file}.sheet.json"
+
+
+    def cacheKey(cue_file, files):
+        """Build key from mtimes and sizes of CUE and BINs
+
+        """
+        cue_dir=os.path.dirname(cue_file) if os.path.dirname(cue_file) != "" else "./"
+        key=[os.stat(cue_file).st_mtime_ns]
+        for bin_file in files:
+            stat = os.stat(f"{cue_dir}/{bin_file["name"]}")
+            key.append([bin_file["name"], stat.st_mtime_ns, stat.st_size])
+        return key
+
+
+    def save(self):
+        """Save parsed CUE beside CUE file
+
+        """
+        try:
+            with open(CueSheet.cachePath(self.cue_file), 'w') as file:
+                file.write(json.dumps({
+                    "version": CueSheet.CACHE_VERSION,
+                    "key": CueSheet.cacheKey(self.cue_file, self.files),
+                    "lines": self.lines,
+                    "files": self.files,
+                    "tracks": self.tracks,
+                    "sessions": self.sessions
+                }))
+        except OSError as e:
+            # Cache is optional, CUE can be parsed again
+            print(f"Could not cache CUE sheet: {repr(e)}")
+
+
+    def parse(self):
+        """Parse CUE lines and calculate sector positions
+
+        """
+        with open(self.cue_file) as file:
+            cue_lines = [line.rstrip() for line in file]
+
+        session=1
+        for text in cue_lines:
+            line={"kind": "other", "text": text}
+
+            result=RE_SESSION.search(text)
+            if result is not None:
+                session=int(result.group(1))
+                line["kind"]="session"
+                line["session"]=session
+                self.lines.append(line)
+                continue
+
+            result=RE_FILE.search(text)
+            if result is not None:
+                path=f"{self.cue_dir}/{result.group(1)}"
+                if not os.path.exists(path):
+                    raise FileNotFoundError(f"BIN file [{result.group(1)}] from CUE not found.")
+                self.files.append({
+                    "name": result.group(1),
+                    "size": os.path.getsize(path),
+                    "session": session,
+                    "tracks": []
+                })
+                line["kind"]="file"
+                line["file"]=len(self.files)-1
+                self.lines.append(line)
+                continue
+
+            result=RE_TRACK.search(text)
+            if result is not None and len(self.files) > 0:
+                mode=result.group(2).replace("/","_")
+                self.tracks.append({
+                    "number": int(result.group(1)),
+                    "mode": mode,
+                    "sector_size": CD_MODE_SECTORS[mode].value,
+                    "file": len(self.files)-1,
+                    "session": session,
+                    "indexes": {}
+                })
+                self.files[-1]["tracks"].append(len(self.tracks)-1)
+                line["kind"]="track"
+                line["track"]=len(self.tracks)-1
+                self.lines.append(line)
+                continue
+
+            result=RE_INDEX.search(text)
+            if result is not None and len(self.tracks) > 0:
+                self.tracks[-1]["indexes"][str(int(result.group(1)))]=msf2sector(result.group(2))
+                line["kind"]="index"
+                line["track"]=len(self.tracks)-1
+                line["index"]=str(int(result.group(1)))
+                line["msf"]=result.group(2)
+                self.lines.append(line)
+                continue
+
+            self.lines.append(line)
+
+        self.calculate()
+
+
+    def calculate(self):
+        """Calculate byte ranges of tracks and sector offsets of files
+
+        Track byte offsets are counted from the sector size of each previous
+        track in the same file so mixed mode BINs are split correctly.
+        """
+        # Track data starts at INDEX 01, pregaps stay with the previous track
+        for track in self.tracks:
+            track["start"]=track["indexes"].get("1", min(track["indexes"].values(), default=0))
+
+        # Byte ranges within each file, the first track starts at its INDEX 01
+        # so a pregap at the start of the file isn't part of its data
+        for bin_file in self.files:
+            tracks=[self.tracks[i] for i in bin_file["tracks"]]
+            for i, track in enumerate(tracks):
+                if i == 0:
+                    offset=tracks[0]["start"]*tracks[0]["sector_size"]
+                else:
+                    offset+=(track["start"]-tracks[i-1]["start"])*tracks[i-1]["sector_size"]
+                track["offset"]=offset
+            for i, track in enumerate(tracks):
+                track["end"]=tracks[i+1]["offset"] if i+1 < len(tracks) else bin_file["size"]
+                track["sectors"]=max(0, track["end"]-track["offset"]) // track["sector_size"]
+
+            # Sector length of file
+            sector_size=tracks[0]["sector_size"] if len(tracks) > 0 else CD_MODE_SECTORS.AUDIO.value
+            bin_file["sectors"]=bin_file["size"] // sector_size
+
+        # Sector position of files if all files in a session were one BIN
+        self.sessions=[]
+        for index, bin_file in enumerate(self.files):
+            if len(self.sessions) == 0 or self.sessions[-1]["number"] != bin_file["session"]:
+                self.sessions.append({"number": bin_file["session"], "files": [], "tracks": []})
+            session=self.sessions[-1]
+            if len(session["files"]) == 0:
+                bin_file["sector_base"]=0
+            else:
+                previous=self.files[session["files"][-1]]
+                bin_file["sector_base"]=previous["sector_base"]+previous["sectors"]
+            session["files"].append(index)
+            session["tracks"]+=bin_file["tracks"]
+
+
+    def filePath(self, bin_file):
+        """Full path to a BIN file in the sheet
+
+        """
+        return f"{self.cue_dir}/{bin_file["name"]}"
+
+
+    def mergedSector(self, track, index):
+        """Sector of a track index if its session was a single BIN
+
+        """
+        track=self.tracks[track]
+        return self.files[track["file"]]["sector_base"]+track["indexes"][index]
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+# ddrescue mapfile tools for pyDiscRip. Reads which areas of a disc are still
+# missing so a rescue can be continued with another drive.
+
+# Python System
+import os
+
+
+# Block status of areas that were read
+STATUS_FINISHED="+"
+
+
+def mapfile_read(filepath):
+    """Read blocks of a ddrescue mapfile
+
+    Returns a list of (position, size, status) for each block or None if the
+    mapfile doesn't exist.
+    """
+    if not os.path.isfile(filepath):
+        return None
+
+    blocks=[]
+    status_line=True
+    with open(filepath) as mapfile:
+        for line in mapfile:
+            line=line.strip()
+            if line == "" or line.startswith("#"):
+                continue
+            # First line is the current position and pass, not a block
+            if status_line:
+                status_line=False
+                continue
+            position, size, status = line.split()[:3]
+            blocks.append((int(position, 0), int(size, 0), status))
+    return blocks
+
+
+def mapfile_remaining(blocks):
+    """Get bytes in blocks that were not read
+
+    """
+    return sum(size for position, size, status in blocks if status != STATUS_FINISHED)
+
+
+def domain_write(blocks, filepath):
+    """Write domain mapfile of blocks that were not read
+
+    ddrescue only reads blocks marked finished in a domain mapfile, so status
+    is swapped to limit a pass to the areas earlier passes could not read.
+    """
+    tmp_path=f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as mapfile:
+        mapfile.write("# Domain of areas not read by earlier drives\n")
+        mapfile.write("0x00000000     ?     1\n")
+        mapfile.write("#      pos        size  status\n")
+        for position, size, status in blocks:
+            domain="?" if status == STATUS_FINISHED else STATUS_FINISHED
+            mapfile.write(f"0x{position:08X}  0x{size:08X}  {domain}\n")
+    os.replace(tmp_path, filepath)
+
+
+def mapfile_write(blocks, filepath):
+    """Write blocks as a ddrescue mapfile
+
+    The next run starts by copying any areas that were never tried.
+    """
+    tmp_path=f"{filepath}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding="utf-8") as mapfile:
+        mapfile.write("# Mapfile of areas read by all drives\n")
+        mapfile.write("0x00000000     ?     1\n")
+        mapfile.write("#      pos        size  status\n")
+        for position, size, status in blocks:
+            mapfile.write(f"0x{position:08X}  0x{size:08X}  {status}\n")
+    os.replace(tmp_path, filepath)
+
+
+def mapfile_merge(blocks, drive_blocks):
+    """Mark areas another drive read as finished
+
+    Returns blocks with the status of every area finished in drive_blocks
+    set to finished and other areas left as they were.
+    """
+    # Split at the edges of blocks of both mapfiles, both are sorted
+    edges=sorted({position for position, size, status in blocks + drive_blocks} | {position+size for position, size, status in blocks + drive_blocks})
+
+    merged=[]
+    index=0
+    drive_index=0
+    for start, end in zip(edges, edges[1:]):
+        while index < len(blocks) and blocks[index][0]+blocks[index][1] <= start:
+            index+=1
+        while drive_index < len(drive_blocks) and drive_blocks[drive_index][0]+drive_blocks[drive_index][1] <= start:
+            drive_index+=1
+        # Areas outside the main mapfile are left out
+        if index == len(blocks) or blocks[index][0] > start:
+            continue
+
+        status=blocks[index][2]
+        if drive_index < len(drive_blocks) and drive_blocks[drive_index][0] <= start and drive_blocks[drive_index][2] == STATUS_FINISHED:
+            status=STATUS_FINISHED
+
+        # Join areas with the same status
+        if merged and merged[-1][2] == status and merged[-1][0]+merged[-1][1] == start:
+            merged[-1]=(merged[-1][0], merged[-1][1]+end-start, status)
+        else:
+            merged.append((start, end-start, status))
+    return merged
+
+
+def disc_matches(device, image_path, blocks, samples=4, sector_size=2048):
+    """Check a disc is the one an image was partly read from
+
+    Sectors from finished areas of the image are read again from the disc,
+    starting with the volume descriptor at sector 16 that holds the label and
+    ID of the disc. Returns True if all sectors read matched, False if any
+    differed and None if none could be read.
+    """
+    finished=[(position, size) for position, size, status in blocks if status == STATUS_FINISHED and size >= sector_size]
+    positions=[]
+    if any(position <= 16*sector_size and 17*sector_size <= position+size for position, size in finished):
+        positions.append(16*sector_size)
+    # Middle of the largest areas
+    for position, size in sorted(finished, key=lambda block: block[1], reverse=True)[:samples]:
+        positions.append(position+(size//sector_size//2)*sector_size)
+
+    matched=None
+    try:
+        with open(device, 'rb', buffering=0) as disc, open(image_path, 'rb') as image:
+            for position in positions:
+                try:
+                    sector=os.pread(disc.fileno(), sector_size, position)
+                except OSError:
+                    # Drive may not read every area others could
+                    continue
+                if sector != os.pread(image.fileno(), sector_size, position):
+                    return False
+                matched=True
+    except OSError:
+        return None
+    return matched
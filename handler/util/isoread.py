@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+
+# ISO9660 reader for pyDiscRip. Lists and extracts files from ISO9660 images
+# with Joliet and Rock Ridge names without running an external tool.
+
+# Python System
+import argparse
+import sys
+import os
+import mmap
+import json
+import zlib
+import struct
+import hashlib
+import calendar
+from concurrent.futures import ThreadPoolExecutor
+
+# Internal Modules
+try:
+    from handler.util.bincon import copy_range
+except ImportError:
+    # Allow running directly from the util folder
+    from bincon import copy_range
+
+
+# Volume descriptors start at sector 16
+DESCRIPTOR_START=16
+DESCRIPTOR_SIZE=2048
+
+# Directory record flags
+FLAG_DIRECTORY=0x02
+FLAG_MULTI_EXTENT=0x80
+
+# Escape sequences marking a Joliet supplementary volume descriptor
+JOLIET_ESCAPES=(b"%/@", b"%/C", b"%/E")
+
+
+def record_time(data):
+    """Convert 7 byte directory record date to unix time
+
+    """
+    year, month, day, hour, minute, second, offset = struct.unpack("<6Bb", data)
+    try:
+        return calendar.timegm((1900+year, month, day, hour, minute, second)) - offset*15*60
+    except (ValueError, OverflowError):
+        return None
+
+
+def safe_name(name):
+    """Make a name from the image safe to use as a path part
+
+    """
+    name = name.replace("/", "_").replace("\x00", "")
+    if name in ("", ".", ".."):
+        return "_"
+    return name
+
+
+class IsoImage(object):
+    """ISO9660 image opened with mmap
+
+    Directory records are walked once when opened to build a list of entries
+    with their paths and extents. Rock Ridge names are used when present,
+    then Joliet names, then plain ISO9660 names.
+    """
+
+    def __init__(self, path):
+        """Open image and read directory tree
+
+        Raises ValueError if the image is not ISO9660.
+        """
+        self.path=path
+        self.file=open(path, "rb")
+        try:
+            self.data=mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            self.file.close()
+            raise ValueError(f"Empty image [{path}]")
+
+        self.block_size=2048
+        self.joliet=False
+        self.rock_ridge=False
+        self.susp=False
+        self.label=""
+        # All files and directories in image
+        self.entries=[]
+
+        try:
+            self.readDescriptors()
+        except Exception:
+            self.close()
+            raise
+
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+    def readDescriptors(self):
+        """Find volume descriptors and walk the best directory tree
+
+        """
+        primary=None
+        joliet=None
+        sector=DESCRIPTOR_START
+        while (sector+1)*DESCRIPTOR_SIZE <= len(self.data):
+            descriptor=self.data[sector*DESCRIPTOR_SIZE:(sector+1)*DESCRIPTOR_SIZE]
+            if descriptor[1:6] != b"CD001":
+                break
+            # Terminator
+            if descriptor[0] == 255:
+                break
+            # Primary volume descriptor
+            if descriptor[0] == 1 and primary is None:
+                primary=descriptor
+            # Joliet supplementary volume descriptor
+            if descriptor[0] == 2 and descriptor[88:91] in JOLIET_ESCAPES:
+                joliet=descriptor
+            sector+=1
+
+        if primary is None:
+            raise ValueError(f"No ISO9660 primary volume descriptor in [{self.path}]")
+
+        # Records of a truncated or corrupt image point past its end
+        try:
+            self.block_size=struct.unpack("<H", primary[128:130])[0]
+            self.label=primary[40:72].decode("ascii", "replace").strip()
+
+            # Rock Ridge names are stored in the primary tree
+            self.susp=self.hasSUSP(primary[156:190])
+            self.entries=self.walk(primary[156:190], joliet=False)
+            if self.rock_ridge:
+                return
+
+            # Fall back to Joliet names if available
+            if joliet is not None:
+                self.joliet=True
+                self.label=joliet[40:72].decode("utf-16-be", "replace").strip()
+                self.entries=self.walk(joliet[156:190], joliet=True)
+        except (struct.error, IndexError) as e:
+            raise ValueError(f"Corrupt ISO9660 image [{self.path}]: {repr(e)}") from e
+
+
+    def records(self, lba, length):
+        """Get directory records from a directory extent
+
+        Records never cross a block boundary, a zero length record means the
+        rest of the block is padding.
+        """
+        start=lba*self.block_size
+        end=min(start+length, len(self.data))
+        position=start
+        while position < end:
+            record_length=self.data[position]
+            if record_length == 0:
+                # Skip to next block
+                position=((position-start)//self.block_size+1)*self.block_size+start
+                continue
+            yield self.data[position:position+record_length]
+            position+=record_length
+
+
+    def systemUse(self, record):
+        """Get system use area of a directory record
+
+        """
+        name_length=record[32]
+        return record[33+name_length+(1 if name_length % 2 == 0 else 0):]
+
+
+    def hasSUSP(self, root):
+        """Check root directory for the SUSP SP entry used by Rock Ridge
+
+        """
+        lba=struct.unpack("<I", root[2:6])[0]
+        length=struct.unpack("<I", root[10:14])[0]
+        for record in self.records(lba, length):
+            area=self.systemUse(record)
+            return area[0:2] == b"SP" and area[4:6] == b"\xbe\xef"
+        return False
+
+
+    def rockRidgeName(self, record):
+        """Get Rock Ridge NM name from record system use area
+
+        """
+        if not self.susp:
+            return None
+        area=self.systemUse(record)
+        name=None
+
+        # Follow continuation areas
+        areas=[area]
+        while areas:
+            area=areas.pop(0)
+            position=0
+            while position+4 <= len(area):
+                signature=area[position:position+2]
+                length=area[position+2]
+                if length < 4:
+                    break
+                entry=area[position:position+length]
+                if signature == b"NM":
+                    flags=entry[4]
+                    # Current and parent directory names are not used
+                    if flags & 0x06 == 0:
+                        name=(name or b"")+entry[5:]
+                elif signature == b"CE" and len(entry) >= 28:
+                    block=struct.unpack("<I", entry[4:8])[0]
+                    offset=struct.unpack("<I", entry[12:16])[0]
+                    size=struct.unpack("<I", entry[20:24])[0]
+                    start=block*self.block_size+offset
+                    areas.append(self.data[start:start+size])
+                elif signature == b"ST":
+                    break
+                position+=length
+
+        if name is None:
+            return None
+        self.rock_ridge=True
+        return name.decode("utf-8", "replace")
+
+
+    def recordName(self, record, joliet):
+        """Get best available name from a directory record
+
+        """
+        name_length=record[32]
+        raw=record[33:33+name_length]
+
+        if not joliet:
+            name=self.rockRidgeName(record)
+            if name is not None:
+                return name
+
+        if joliet:
+            name=raw.decode("utf-16-be", "replace")
+        else:
+            name=raw.decode("ascii", "replace")
+
+        # Remove version number and empty extension
+        name=name.split(";")[0]
+        if name.endswith(".") and not joliet:
+            name=name[:-1]
+        return name
+
+
+    def walk(self, root, joliet):
+        """Walk directory tree building list of entries
+
+        """
+        entries=[]
+        visited=set()
+        directories=[("", struct.unpack("<I", root[2:6])[0], struct.unpack("<I", root[10:14])[0])]
+
+        while directories:
+            parent, lba, length=directories.pop(0)
+            if lba in visited:
+                continue
+            visited.add(lba)
+
+            current=None
+            for record in self.records(lba, length):
+                if len(record) < 34:
+                    continue
+                name_length=record[32]
+                # Skip . and .. records
+                if name_length == 1 and record[33] in (0, 1):
+                    continue
+
+                extent_lba=struct.unpack("<I", record[2:6])[0]
+                extent_size=struct.unpack("<I", record[10:14])[0]
+                flags=record[25]
+
+                # Continue multi-extent file
+                if current is not None:
+                    current["extents"].append([extent_lba, extent_size])
+                    current["size"]+=extent_size
+                else:
+                    path=safe_name(self.recordName(record, joliet))
+                    if parent != "":
+                        path=f"{parent}/{path}"
+                    current={
+                        "path": path,
+                        "directory": bool(flags & FLAG_DIRECTORY),
+                        "extents": [[extent_lba, extent_size]],
+                        "size": extent_size,
+                        "mtime": record_time(record[18:25])
+                    }
+
+                # Final extent of entry
+                if not flags & FLAG_MULTI_EXTENT:
+                    if current["directory"]:
+                        current["size"]=0
+                        directories.append((current["path"], extent_lba, extent_size))
+                    entries.append(current)
+                    current=None
+
+        return entries
+
+
+    def files(self):
+        """Get file entries
+
+        """
+        return [entry for entry in self.entries if not entry["directory"]]
+
+
+    def fileRanges(self, entry):
+        """Get byte ranges of file extents clamped to image size
+
+        """
+        ranges=[]
+        for lba, size in entry["extents"]:
+            start=lba*self.block_size
+            end=min(start+size, len(self.data))
+            if end > start:
+                ranges.append((start, end-start))
+        return ranges
+
+
+    def hashFile(self, entry):
+        """Hash file data directly from mapped image
+
+        """
+        crc=0
+        md5=hashlib.md5()
+        sha1=hashlib.sha1()
+        view=memoryview(self.data)
+        try:
+            for start, size in self.fileRanges(entry):
+                chunk=view[start:start+size]
+                crc=zlib.crc32(chunk, crc)
+                md5.update(chunk)
+                sha1.update(chunk)
+                chunk.release()
+        finally:
+            view.release()
+
+        return {
+            "path": entry["path"],
+            "size": entry["size"],
+            "lba": entry["extents"][0][0],
+            "mtime": entry["mtime"],
+            "crc32": f"{crc:08x}",
+            "md5": md5.hexdigest(),
+            "sha1": sha1.hexdigest()
+        }
+
+
+    def manifest(self, workers=None):
+        """List all files with hashes without extracting
+
+        """
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            files = list(pool.map(self.hashFile, self.files()))
+
+        return {
+            "image": os.path.basename(self.path),
+            "label": self.label,
+            "joliet": self.joliet,
+            "rock_ridge": self.rock_ridge,
+            "files": files
+        }
+
+
+    def extractFile(self, entry, out_dir):
+        """Copy one file out of the image
+
+        """
+        out_path=f"{out_dir}/{entry["path"]}"
+        with open(out_path, "wb") as out:
+            for start, size in self.fileRanges(entry):
+                copy_range(self.file.fileno(), out.fileno(), start, size)
+        if entry["mtime"] is not None:
+            os.utime(out_path, (entry["mtime"], entry["mtime"]))
+        return out_path
+
+
+    def extract(self, out_dir, workers=None):
+        """Extract all files in parallel
+
+        Returns list of extracted file paths.
+        """
+        # Create directories first so files can be written in any order
+        if not os.path.exists(out_dir):
+            os.makedirs(out_dir)
+        for entry in self.entries:
+            if entry["directory"]:
+                os.makedirs(f"{out_dir}/{entry["path"]}", exist_ok=True)
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            extracted = list(pool.map(lambda entry: self.extractFile(entry, out_dir), self.files()))
+
+        # Set directory times after their contents are written
+        for entry in self.entries:
+            if entry["directory"] and entry["mtime"] is not None:
+                os.utime(f"{out_dir}/{entry["path"]}", (entry["mtime"], entry["mtime"]))
+
+        return extracted
+
+
+if __name__ == "__main__":
+    """ Run directly
+
+    """
+    parser = argparse.ArgumentParser(
+            prog='isoread',
+            description='ISO9660 reader to list or extract files from an image.',
+            epilog='By Shelby Jueden')
+    parser.add_argument('-l', '--list', help="Print manifest with hashes instead of extracting", action='store_true')
+    parser.add_argument('-o', '--output-folder', help="Path to extract files to", default="./")
+    parser.add_argument('iso', help="ISO file to read")
+    args = parser.parse_args()
+
+    try:
+        with IsoImage(args.iso) as iso:
+            if args.list:
+                print(json.dumps(iso.manifest(), indent=4))
+            else:
+                for path in iso.extract(args.output_folder):
+                    print(path)
+    except (OSError, ValueError) as e:
+        print(e)
+        sys.exit(1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+
+# Persistent job queue for pyDiscRip stored in SQLite.
+
+# Python System
+import os
+import json
+import time
+import sqlite3
+
+
+class JobStore(object):
+    """Job queue stored in an embedded SQLite database
+
+    Each media sample is a job that moves through the states:
+        queued -> loading -> ripping -> converting -> done / failed
+
+    State changes are single transactions so the scheduler, rip processes and
+    web interface can all share the database. Each process must open its own
+    JobStore as SQLite connections can not be shared across a fork.
+    """
+
+    STATES=["queued","loading","ripping","converting","done","failed"]
+
+    # Jobs in these states were interrupted if the scheduler restarts
+    STATES_ACTIVE=["loading","ripping","converting"]
+
+    # Jobs in these states will not be ripped again
+    STATES_FINISHED=["done","failed"]
+
+
+    def __init__(self, path):
+        """Open or create the database
+
+        """
+        self.path=path
+        if os.path.dirname(path) != "" and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        # Autocommit mode, transactions are started explicitly
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS jobs (
+                name TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                front INTEGER NOT NULL DEFAULT 0,
+                state TEXT NOT NULL,
+                drive TEXT,
+                sample TEXT NOT NULL,
+                time_updated REAL NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state)")
+
+
+    def dbPath(settings):
+        """Get database path from settings
+
+        """
+        if settings.get("job_db") is not None:
+            return settings["job_db"]
+        return os.path.join(settings["output"], "discrip.db")
+
+
+    def close(self):
+        self.db.close()
+
+
+    def nextSeq(self):
+        """Get the next free sequence number for ordering jobs
+
+        """
+        row = self.db.execute("SELECT MAX(seq) FROM jobs").fetchone()
+        return 0 if row[0] is None else row[0]+1
+
+
+    def add(self, media_sample, front=False):
+        """Add a new job in the queued state
+
+        Returns False if a job with the same name already exists.
+        """
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO jobs (name, seq, front, state, drive, sample, time_updated) VALUES (?,?,?,?,?,?,?)",
+            (
+                media_sample["name"],
+                media_sample["id"],
+                int(front),
+                "queued",
+                media_sample.get("drive"),
+                json.dumps(media_sample),
+                time.time()
+            ))
+        return cur.rowcount == 1
+
+
+    def setState(self, name, state, media_sample=None, expect=None):
+        """Move a job to a new state
+
+        Optionally stores an updated copy of the media sample and only changes
+        state if the job is currently in one of the expected states. Returns
+        True if the job was changed.
+        """
+        if state not in JobStore.STATES:
+            raise ValueError(f"Unknown job state [{state}]")
+
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.db.execute("SELECT state FROM jobs WHERE name=?", (name,)).fetchone()
+            if row is None or (expect is not None and row["state"] not in expect):
+                self.db.execute("ROLLBACK")
+                return False
+
+            if media_sample is not None:
+                self.db.execute(
+                    "UPDATE jobs SET state=?, drive=?, sample=?, time_updated=? WHERE name=?",
+                    (state, media_sample.get("drive"), json.dumps(media_sample), time.time(), name))
+            else:
+                self.db.execute(
+                    "UPDATE jobs SET state=?, time_updated=? WHERE name=?",
+                    (state, time.time(), name))
+            self.db.execute("COMMIT")
+            return True
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+
+    def get(self, name):
+        """Get a job as a media sample with its state
+
+        """
+        row = self.db.execute("SELECT * FROM jobs WHERE name=?", (name,)).fetchone()
+        if row is None:
+            return None
+        return JobStore.rowSample(row)
+
+
+    def rowSample(row):
+        """Build media sample dict from a database row
+
+        """
+        media_sample = json.loads(row["sample"])
+        media_sample["id"] = row["seq"]
+        media_sample["state"] = row["state"]
+        media_sample["done"] = row["state"] in JobStore.STATES_FINISHED
+        return media_sample
+
+
+    def jobs(self, states=None):
+        """Get jobs in queue order, front of queue lane first
+
+        """
+        query = "SELECT * FROM jobs"
+        params = ()
+        if states is not None:
+            query += f" WHERE state IN ({",".join("?"*len(states))})"
+            params = tuple(states)
+        query += " ORDER BY front DESC, CASE WHEN front THEN -seq ELSE seq END"
+        return [JobStore.rowSample(row) for row in self.db.execute(query, params)]
+
+
+    def recover(self):
+        """Requeue jobs interrupted by a restart
+
+        Jobs that were loading or ripping are queued again. Jobs that were
+        converting already have their rip data and are returned so conversion
+        can be resumed without the drive.
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = self.db.execute("SELECT * FROM jobs WHERE state='converting'").fetchall()
+            self.db.execute(
+                "UPDATE jobs SET state='queued', time_updated=? WHERE state IN ('loading','ripping')",
+                (time.time(),))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+        return [JobStore.rowSample(row) for row in rows]
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+
+# Cross-process locking for pyDiscRip hardware shared by rip processes.
+
+# Python System
+import os
+import time
+import fcntl
+
+
+class QueueLock(object):
+    """First come first served lock between processes
+
+    Each process waiting for the lock takes a numbered ticket file and holds
+    an flock on it until it releases the lock. A waiter blocks on the flock of
+    the ticket just before its own, so it wakes the moment that process
+    releases the lock or dies. Tickets of processes that died are removed by
+    the process after them.
+    """
+
+    def __init__(self, path):
+        """Constructor to setup ticket folder
+
+        """
+        self.path=path
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+        # Ticket of this process while waiting or holding
+        self.ticket=None
+        self.ticket_fd=None
+        self.held=False
+
+
+    def take(self):
+        """Take the next ticket
+
+        The ticket file is locked before it is given its name so other
+        processes never see an unlocked live ticket.
+        """
+        counter_fd=os.open(f"{self.path}/counter", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(counter_fd, fcntl.LOCK_EX)
+            try:
+                ticket=int(os.pread(counter_fd, 32, 0).decode("ascii"))+1
+            except ValueError:
+                ticket=1
+            os.ftruncate(counter_fd, 0)
+            os.pwrite(counter_fd, str(ticket).encode("ascii"), 0)
+
+            tmp_path=f"{self.path}/{ticket:012d}.{os.getpid()}.tmp"
+            self.ticket_fd=os.open(tmp_path, os.O_RDWR | os.O_CREAT | os.O_EXCL, 0o644)
+            fcntl.flock(self.ticket_fd, fcntl.LOCK_EX)
+            os.rename(tmp_path, f"{self.path}/{ticket:012d}.ticket")
+            self.ticket=ticket
+        finally:
+            os.close(counter_fd)
+
+
+    def ahead(self):
+        """Get ticket paths before this one
+
+        """
+        tickets=[]
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if entry.name.endswith(".ticket") and int(entry.name[:-7]) < self.ticket:
+                    tickets.append(entry.path)
+        return sorted(tickets)
+
+
+    def acquire(self, timeout=None):
+        """Wait for the lock
+
+        Returns False if the timeout passed, the ticket is kept so calling
+        again keeps this process's place in line.
+        """
+        if self.held:
+            return True
+        if self.ticket is None:
+            self.take()
+
+        end=None if timeout is None else time.time()+timeout
+        while True:
+            tickets=self.ahead()
+            if not tickets:
+                self.held=True
+                return True
+
+            # Wait for the process just ahead
+            try:
+                fd=os.open(tickets[-1], os.O_RDWR)
+            except FileNotFoundError:
+                continue
+            try:
+                if end is None:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                else:
+                    while True:
+                        try:
+                            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                            break
+                        except BlockingIOError:
+                            if time.time() >= end:
+                                return False
+                            time.sleep(min(0.05, max(0, end-time.time())))
+                # Process ahead is done, its ticket is only left if it died
+                try:
+                    os.remove(tickets[-1])
+                except FileNotFoundError:
+                    pass
+            finally:
+                os.close(fd)
+
+
+    def release(self):
+        """Release the lock or give up waiting for it
+
+        """
+        if self.ticket is None:
+            return
+        # Remove ticket before unlocking so the next process finds it gone
+        try:
+            os.remove(f"{self.path}/{self.ticket:012d}.ticket")
+        except FileNotFoundError:
+            pass
+        os.close(self.ticket_fd)
+        self.ticket=None
+        self.ticket_fd=None
+        self.held=False
+
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.release()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+# Optical media detection for pyDiscRip. Listens for udev media change events
+# and caches what is in each drive so rips don't need to poll drives.
+
+# Python System
+import sys
+import os
+import json
+import time
+import pathlib
+import multiprocessing
+
+
+class MediaMonitor(object):
+    """udev media change listener shared by all drives
+
+    Started in the process running the queue before rip processes are forked
+    so one listener serves every drive. Media found in a drive is written to a
+    cache file and processes waiting for media are woken through a shared
+    condition.
+    """
+
+    # Monitor of this process, inherited by forked rip processes
+    shared=None
+
+    # Media info of each drive
+    CACHE_DIR="/tmp/discrip/media"
+
+    # Seconds between direct reads of a drive when no event arrives
+    RECHECK=3
+
+
+    def __init__(self):
+        """Constructor to cache current media and start listening
+
+        """
+        try:
+            import pyudev
+        except Exception as e:
+            print("Need to install Python module [pyudev]")
+            sys.exit(1)
+        self.pyudev=pyudev
+        self.context=pyudev.Context()
+        self.context_pid=os.getpid()
+        # Wakes waiting processes when any drive changes
+        self.condition=multiprocessing.Condition()
+
+        if not os.path.exists(MediaMonitor.CACHE_DIR):
+            os.makedirs(MediaMonitor.CACHE_DIR, exist_ok=True)
+
+        # Cache media already in drives
+        for device in self.context.list_devices(subsystem="block", ID_CDROM="1"):
+            self.update(device)
+
+        # Listen for media changes
+        monitor = pyudev.Monitor.from_netlink(self.context)
+        monitor.filter_by(subsystem="block", device_type="disk")
+        self.observer = pyudev.MonitorObserver(monitor, callback=self.event, name="media-monitor")
+        self.observer.start()
+
+
+    def get():
+        """Get the shared monitor, starting one if there is none yet
+
+        """
+        if MediaMonitor.shared is None:
+            MediaMonitor.shared=MediaMonitor()
+        return MediaMonitor.shared
+
+
+    def cachePath(drive):
+        """Get cache file path of a drive
+
+        """
+        # Solve symlinks to standard drive path
+        drivepath=str(pathlib.Path(drive).resolve())
+        return f"{MediaMonitor.CACHE_DIR}/{os.path.basename(drivepath)}.json"
+
+
+    def mediaInfo(properties):
+        """Get media type and layout from udev properties
+
+        """
+        # Determine media type by ID
+        media_type=None
+        if properties.get("ID_CDROM_MEDIA_CD", False) or properties.get("ID_CDROM_MEDIA_CD_R", False) or properties.get("ID_CDROM_MEDIA_CD_RW", False):
+            media_type="CD"
+        elif properties.get("ID_CDROM_MEDIA_DVD", False):
+            media_type="DVD"
+        elif properties.get("ID_CDROM_MEDIA_BD", False):
+            media_type="BD"
+
+        sessions=properties.get("ID_CDROM_MEDIA_SESSION_COUNT")
+        return {
+            "present": properties.get("ID_CDROM_MEDIA", False) == "1" or media_type is not None,
+            "media_type": media_type,
+            "tracks": int(properties.get("ID_CDROM_MEDIA_TRACK_COUNT", 0)),
+            "sessions": int(sessions) if sessions is not None else None
+        }
+
+
+    def write(self, drive, info):
+        """Replace cache file of a drive and wake waiting processes
+
+        """
+        info["drive"]=drive
+        info["time"]=time.time()
+        filepath=MediaMonitor.cachePath(drive)
+        tmp_path=f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as output:
+            output.write(json.dumps(info))
+        os.replace(tmp_path, filepath)
+
+        with self.condition:
+            self.condition.notify_all()
+        return info
+
+
+    def update(self, device):
+        """Cache media of a udev device
+
+        """
+        return self.write(device.device_node, MediaMonitor.mediaInfo(device.properties))
+
+
+    def event(self, device):
+        """Handle udev event from listener thread
+
+        """
+        if device.properties.get("ID_CDROM", False) != "1" or device.device_node is None:
+            return
+        try:
+            self.update(device)
+        except OSError as e:
+            print(f"Could not cache media of [{device.device_node}]: {repr(e)}")
+
+
+    def refresh(self, drive):
+        """Read drive properties from udev directly
+
+        Used if no event has arrived, udev contexts are not shared across a
+        fork so each process opens its own.
+        """
+        if self.context_pid != os.getpid():
+            self.context=self.pyudev.Context()
+            self.context_pid=os.getpid()
+        drivepath=str(pathlib.Path(drive).resolve())
+        try:
+            device=self.pyudev.Devices.from_device_file(self.context, drivepath)
+        except (self.pyudev.DeviceNotFoundError, OSError) as e:
+            print(f"Could not read drive [{drive}]: {repr(e)}")
+            return None
+        return self.update(device)
+
+
+    def read(self, drive):
+        """Get cached media info of a drive
+
+        """
+        try:
+            with open(MediaMonitor.cachePath(drive), newline='') as jsonfile:
+                return json.load(jsonfile)
+        except (OSError, ValueError):
+            return None
+
+
+    def clear(self, drive):
+        """Mark drive as empty when media is removed
+
+        Keeps a rip that starts right after an eject from seeing the old media
+        before the udev event for the eject arrives.
+        """
+        try:
+            self.write(drive, {"present": False, "media_type": None, "tracks": 0, "sessions": None})
+        except OSError as e:
+            print(f"Could not cache media of [{drive}]: {repr(e)}")
+
+
+    def wait(self, drive, timeout, known_type=False):
+        """Wait for media to be in a drive
+
+        Returns cached media info as soon as media is present, or the media
+        type is known if known_type is set. Returns None after the timeout.
+        """
+        end=time.time()+timeout
+        if self.read(drive) is None:
+            self.refresh(drive)
+
+        with self.condition:
+            while True:
+                info=self.read(drive)
+                if info is not None and info["present"] and (not known_type or info["media_type"] is not None):
+                    return info
+
+                remaining=end-time.time()
+                if remaining <= 0:
+                    return None
+                if not self.condition.wait(min(remaining, MediaMonitor.RECHECK)):
+                    # No events, drive may not report media changes
+                    self.refresh(drive)
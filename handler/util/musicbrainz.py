@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+# MusicBrainz lookups for pyDiscRip shared by all rip processes. Requests are
+# spaced by a rate limiter across processes and responses are cached by discid.
+
+# Python System
+import sys
+import os
+import json
+import time
+import fcntl
+
+# External Modules
+try:
+    import musicbrainzngs
+except Exception as e:
+        print("Need to install Python module [musicbrainzngs]")
+        sys.exit(1)
+
+
+class RateLimiter(object):
+    """Request spacing shared between processes through a locked file
+
+    The file holds the time of the next free request slot. Each request takes
+    a slot while the file is locked and then sleeps until its slot after the
+    lock is released, so waiting processes are served in order.
+    """
+
+    def __init__(self, path, interval):
+        """Constructor to setup lock file
+
+        """
+        self.path=path
+        self.interval=interval
+        if os.path.dirname(path) != "" and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+
+    def acquire(self):
+        """Wait for the next free request slot
+
+        """
+        fd=os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                slot=float(os.pread(fd, 64, 0).decode("ascii"))
+            except ValueError:
+                slot=0
+            now=time.time()
+            slot=max(slot, now)
+            # Take slot and move next one
+            os.ftruncate(fd, 0)
+            os.pwrite(fd, f"{slot+self.interval:.6f}".encode("ascii"), 0)
+        finally:
+            # Closing releases the lock
+            os.close(fd)
+
+        if slot > now:
+            time.sleep(slot-now)
+
+
+class MusicBrainzCache(object):
+    """Responses stored as JSON files by discid
+
+    Discs MusicBrainz doesn't know are also stored so they are not looked up
+    again until NOT_FOUND_TTL has passed.
+    """
+
+    # Seconds before looking up an unknown disc again
+    NOT_FOUND_TTL=7*24*60*60
+
+    def __init__(self, path):
+        """Constructor to setup cache folder
+
+        """
+        self.path=path
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+
+    def filePath(self, disc_id):
+        return f"{self.path}/{disc_id}.json"
+
+
+    def get(self, disc_id):
+        """Get cached entry for a discid or None if it must be looked up
+
+        """
+        try:
+            with open(self.filePath(disc_id), newline='') as jsonfile:
+                entry = json.load(jsonfile)
+        except (OSError, ValueError):
+            return None
+
+        if entry["result"] is None and time.time()-entry["time"] > MusicBrainzCache.NOT_FOUND_TTL:
+            return None
+        return entry
+
+
+    def put(self, disc_id, result):
+        """Store lookup result, None for discs that were not found
+
+        """
+        filepath=self.filePath(disc_id)
+        tmp_path=f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as output:
+            output.write(json.dumps({"disc_id": disc_id, "time": time.time(), "result": result}))
+        os.replace(tmp_path, filepath)
+
+
+# MusicBrainz allows one request per second
+LIMITER_PATH="/tmp/discrip/musicbrainz.lock"
+LIMITER_INTERVAL=1.0
+
+# Default cache location
+CACHE_PATH="~/.cache/discrip/musicbrainz"
+
+
+def lookup_discid(disc_id, cache_path=None):
+    """Get MusicBrainz releases for a discid
+
+    Returns the response of get_releases_by_discid or None if the disc is not
+    known or the lookup failed.
+    """
+    cache = MusicBrainzCache(os.path.expanduser(cache_path or CACHE_PATH))
+    entry = cache.get(disc_id)
+    if entry is not None:
+        print(f"Using cached MusicBrainz response for [{disc_id}]")
+        return entry["result"]
+
+    # https://python-discid.readthedocs.io/en/latest/usage/#fetching-metadata
+    musicbrainzngs.set_useragent("AkBKukU: pyDiscRip", "0.1", "akbkuku@akbkuku.com")
+    RateLimiter(LIMITER_PATH, LIMITER_INTERVAL).acquire()
+    try:
+        # Fetch metadata using discid
+        result = musicbrainzngs.get_releases_by_discid(disc_id, includes=["artists", "recordings"])
+    except musicbrainzngs.ResponseError as e:
+        print("disc not found or bad response")
+        # Only remember discs that are really not known
+        if getattr(e.cause, "code", None) == 404:
+            cache.put(disc_id, None)
+        return None
+    except musicbrainzngs.WebServiceError as e:
+        print(f"MusicBrainz lookup failed: {repr(e)}")
+        return None
+
+    cache.put(disc_id, result)
+    return result
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+
+# Progress parsers for tools run by pyDiscRip. Each parser reads one line of
+# tool output at a time and returns progress when the line has any.
+
+# Python System
+import os
+import re
+
+
+# ddrescue status lines
+RE_DDRESCUE_PCT = re.compile(r'pct rescued:\s*([0-9.]+)%')
+RE_DDRESCUE_RESCUED = re.compile(r'rescued:\s*([0-9.]+ [kMGT]?i?B)')
+RE_DDRESCUE_RATE = re.compile(r'current rate:\s*([0-9.]+ [kMGT]?i?B/s)')
+
+# redumper sector progress
+RE_REDUMPER_LBA = re.compile(r'(?:\[\s*([0-9]+)%\]\s*)?(?:LBA|sector):\s*(-?[0-9]+)/([0-9]+)')
+
+# cdrdao track and size progress
+RE_CDRDAO_TRACK = re.compile(r'(Analyzing|Copying) (?:audio |data )?tracks? ([0-9]+)(?:-([0-9]+))?')
+RE_CDRDAO_SIZE = re.compile(r'([0-9]+) of ([0-9]+) MB')
+
+
+class ProgressParser(object):
+    """Base parser that keeps the latest progress of a tool
+
+    """
+
+    def __init__(self):
+        # Latest known progress
+        self.percent=None
+        self.text=None
+
+
+    def parse(self, line):
+        """Read one line of output
+
+        Returns True if the line changed the progress.
+        """
+        return False
+
+
+class ProgressDDRescue(ProgressParser):
+    """Parser for ddrescue -v status output
+
+    Newer versions print a pct rescued line, older ones only the rescued size.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.rescued=None
+        self.rate=None
+
+
+    def parse(self, line):
+        changed=False
+        result=RE_DDRESCUE_RATE.search(line)
+        if result is not None:
+            self.rate=result.group(1)
+        result=RE_DDRESCUE_RESCUED.search(line)
+        if result is not None and not line.lstrip().startswith("pct"):
+            self.rescued=result.group(1)
+            changed=True
+        result=RE_DDRESCUE_PCT.search(line)
+        if result is not None:
+            self.percent=float(result.group(1))
+            changed=True
+
+        if changed:
+            text=[]
+            if self.percent is not None:
+                text.append(f"{self.percent:.2f}%")
+            if self.rescued is not None:
+                text.append(f"{self.rescued} rescued")
+            if self.rate is not None:
+                text.append(f"at {self.rate}")
+            self.text=" ".join(text)
+        return changed
+
+
+class ProgressRedumper(ProgressParser):
+    """Parser for redumper LBA progress output
+
+    """
+
+    def parse(self, line):
+        result=RE_REDUMPER_LBA.search(line)
+        if result is None:
+            return False
+        lba=int(result.group(2))
+        total=int(result.group(3))
+        if result.group(1) is not None:
+            self.percent=float(result.group(1))
+        elif total > 0:
+            self.percent=max(0.0, min(100.0, lba*100/total))
+        if self.percent is not None:
+            self.text=f"{self.percent:.0f}% LBA {lba}/{total}"
+        else:
+            self.text=f"LBA {lba}/{total}"
+        return True
+
+
+class ProgressCdrdao(ProgressParser):
+    """Parser for cdrdao track analysis and copy output
+
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.track=None
+
+
+    def parse(self, line):
+        result=RE_CDRDAO_TRACK.search(line)
+        if result is not None:
+            if result.group(3) is not None:
+                self.track=f"{result.group(1)} tracks {result.group(2)}-{result.group(3)}"
+            else:
+                self.track=f"{result.group(1)} track {result.group(2)}"
+            self.text=self.track
+            return True
+        result=RE_CDRDAO_SIZE.search(line)
+        if result is not None and int(result.group(2)) > 0:
+            self.percent=int(result.group(1))*100/int(result.group(2))
+            self.text=f"{self.track or "Copying"} {self.percent:.0f}%"
+            return True
+        return False
+
+
+# Parsers by tool name
+PARSERS={
+    "ddrescue": ProgressDDRescue,
+    "redumper": ProgressRedumper,
+    "cdrdao": ProgressCdrdao,
+}
+
+
+def parser_for(cmd):
+    """Get a new progress parser for a command if the tool has one
+
+    """
+    parser=PARSERS.get(os.path.basename(cmd[0]))
+    if parser is None:
+        return None
+    return parser()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+
+# Lazy handler registry for pyDiscRip. Handlers are declared by key with the
+# module path of their class and are only imported when first used.
+
+# Python System
+import importlib
+
+
+class HandlerRegistry(object):
+    """Registry of handlers declared by import path
+
+    Each declaration holds the module and class name of a handler along with
+    the IDs used to match it so matching doesn't need the handler module.
+    Handler classes are imported once per process and instances are created
+    on first use by each registry.
+    """
+
+    # Handler classes already imported in this process
+    classes={}
+
+
+    def __init__(self, handlers):
+        """Constructor to setup declarations
+
+        """
+        # Handler declarations by key in match order
+        self.handlers=dict(handlers)
+        # Handlers created by this registry
+        self.instances={}
+
+
+    def handlerClass(declaration):
+        """Import a handler class the first time it is needed
+
+        """
+        path=(declaration["module"], declaration["class"])
+        if path not in HandlerRegistry.classes:
+            module = importlib.import_module(declaration["module"])
+            HandlerRegistry.classes[path] = getattr(module, declaration["class"])
+        return HandlerRegistry.classes[path]
+
+
+    def add(self, key, handler, **ids):
+        """Add an already created handler
+
+        """
+        self.handlers[key]={"type_id": handler.type_id} | ids
+        self.instances[key]=handler
+
+
+    def get(self, key):
+        """Get handler by key, creating it if needed
+
+        """
+        if key not in self.instances:
+            self.instances[key]=HandlerRegistry.handlerClass(self.handlers[key])()
+        return self.instances[key]
+
+
+    def declarations(self):
+        """Get keys and declarations without creating handlers
+
+        """
+        return self.handlers.items()
+
+
+    def items(self):
+        """Get keys and handlers, creating all handlers
+
+        """
+        for key in self.handlers:
+            yield key, self.get(key)
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+# Robot request queue for pyDiscRip. Rip processes add load and eject
+# requests and the process using the robot runs them in planned order.
+
+# Python System
+import os
+import json
+import time
+
+
+class RobotQueue(object):
+    """Requests for a robot shared between processes as files
+
+    Each request is a JSON file written in one step. The process using the
+    robot takes pending requests in any order and writes a result beside each
+    one, so processes waiting on a request can return without ever using the
+    robot themselves.
+    """
+
+    def __init__(self, path):
+        """Constructor to setup queue folder
+
+        """
+        self.path=path
+        if not os.path.exists(path):
+            os.makedirs(path, exist_ok=True)
+
+
+    def write(self, filepath, data):
+        """Write JSON file so readers never see it partially written
+
+        """
+        tmp_path=f"{filepath}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding="utf-8") as output:
+            output.write(json.dumps(data))
+        os.replace(tmp_path, filepath)
+
+
+    def read(self, filepath):
+        try:
+            with open(filepath, newline='') as jsonfile:
+                return json.load(jsonfile)
+        except (OSError, ValueError):
+            return None
+
+
+    def submit(self, op, drive):
+        """Add request for an operation on a drive
+
+        """
+        request={
+            "id": f"{time.time_ns()}-{os.getpid()}",
+            "op": op,
+            "drive": drive,
+            "pid": os.getpid(),
+            "time": time.time()
+        }
+        self.write(f"{self.path}/{request["id"]}.request", request)
+        return request
+
+
+    def pending(self):
+        """Get requests not run yet in the order they were added
+
+        Requests of processes that have ended are removed.
+        """
+        requests=[]
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                if not entry.name.endswith(".request"):
+                    continue
+                request=self.read(entry.path)
+                if request is None:
+                    continue
+                try:
+                    os.kill(request["pid"], 0)
+                except ProcessLookupError:
+                    print(f"Dropping robot request of ended process {request["pid"]}")
+                    self.remove(entry.path)
+                    continue
+                except PermissionError:
+                    pass
+                requests.append(request)
+        return sorted(requests, key=lambda request: request["time"])
+
+
+    def finish(self, request, result):
+        """Store result of a request and remove it from pending
+
+        """
+        self.write(f"{self.path}/{request["id"]}.result", result)
+        self.remove(f"{self.path}/{request["id"]}.request")
+
+
+    def result(self, request):
+        """Get result of a request if it has been run
+
+        """
+        return self.read(f"{self.path}/{request["id"]}.result")
+
+
+    def collect(self, request):
+        """Get result of a request and remove it
+
+        """
+        result=self.result(request)
+        if result is not None:
+            self.remove(f"{self.path}/{request["id"]}.result")
+        return result
+
+
+    def remove(self, filepath):
+        try:
+            os.remove(filepath)
+        except FileNotFoundError:
+            pass
+
+
+    def clear(self):
+        """Remove all requests and results
+
+        """
+        with os.scandir(self.path) as entries:
+            for entry in entries:
+                self.remove(entry.path)
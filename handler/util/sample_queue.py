@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+# Indexed media sample queue for pyDiscRip group ripping.
+
+# Python System
+from collections import deque
+
+
+class SampleQueue(object):
+    """Queue of media samples waiting for a free drive
+
+    Samples are indexed by name and kept in per-group (or per-drive for
+    non-group samples) deques. Samples sent to the front of the queue are kept
+    in a separate lane that is always served first, newest first, which is the
+    same order the scheduler used when inserting at the start of a list.
+    """
+
+    def __init__(self):
+        """Constructor to setup empty index and lanes
+
+        """
+        # All samples by name, including ones already dispatched
+        self.samples={}
+        # Front of queue lane, newest sample at the start
+        self.front={}
+        # Normal queue lane, oldest sample at the start
+        self.back={}
+
+
+    def __contains__(self, name):
+        return name in self.samples
+
+
+    def __len__(self):
+        return len(self.samples)
+
+
+    def key(media_sample):
+        """Get the lane key a sample is queued under
+
+        """
+        if "group" in media_sample:
+            return ("group", media_sample["group"])
+        return ("drive", media_sample.get("drive"))
+
+
+    def add(self, media_sample, front=False):
+        """Add a sample to the index and queue it if it is not done
+
+        Returns False if a sample with the same name was already added.
+        """
+        if media_sample["name"] in self.samples:
+            return False
+        self.samples[media_sample["name"]]=media_sample
+
+        if not media_sample["done"]:
+            key = SampleQueue.key(media_sample)
+            if front:
+                self.front.setdefault(key, deque()).appendleft(media_sample)
+            else:
+                self.back.setdefault(key, deque()).append(media_sample)
+        return True
+
+
+    def requeue(self, media_sample, front=False):
+        """Queue a sample that was already added again
+
+        """
+        self.samples.pop(media_sample["name"], None)
+        return self.add(media_sample, front)
+
+
+    def get(self, name):
+        """Get a sample by name
+
+        """
+        return self.samples.get(name)
+
+
+    def first(lane, drive):
+        """Get first sample in a lane that can use a drive
+
+        """
+        for media_sample in lane:
+            if drive not in media_sample.get("exclude_drives", []):
+                return media_sample
+        return None
+
+
+    def next(self, group_name, drive):
+        """Remove and return the next sample for a free drive in a group
+
+        Samples queued for the group and samples queued directly to the drive
+        share the drive, so the earliest of both lanes is picked. Samples that
+        exclude the drive are left for another drive.
+        """
+        keys = [("group", group_name), ("drive", drive)]
+
+        # Front lane, newest sample first
+        lanes = [(self.front[key], SampleQueue.first(self.front[key], drive)) for key in keys if self.front.get(key)]
+        lanes = [(lane, media_sample) for lane, media_sample in lanes if media_sample is not None]
+        if lanes:
+            lane, media_sample = max(lanes, key=lambda lane: lane[1]["id"])
+            lane.remove(media_sample)
+            return media_sample
+
+        # Normal lane, oldest sample first
+        lanes = [(self.back[key], SampleQueue.first(self.back[key], drive)) for key in keys if self.back.get(key)]
+        lanes = [(lane, media_sample) for lane, media_sample in lanes if media_sample is not None]
+        if lanes:
+            lane, media_sample = min(lanes, key=lambda lane: lane[1]["id"])
+            lane.remove(media_sample)
+            return media_sample
+
+        return None
@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+
+# Serial port broker for pyDiscRip. Keeps robot serial ports open in the
+# scheduler and shares them with rip processes over a Unix socket.
+
+# Python System
+import sys
+import os
+import json
+import time
+import socket
+import threading
+from collections import deque
+
+# External Modules
+try:
+    import serial
+except Exception as e:
+    print("Need to install Python module [pyserial]")
+    sys.exit(1)
+
+
+class SerialBroker(object):
+    """Serial port kept open and shared through a Unix socket
+
+    Runs as a thread in the scheduler process. Each client connection is a
+    session with the port to itself, sessions are served one at a time in the
+    order they connect so command sequences from different processes never
+    mix. Time from a write to each response is kept as latency metrics.
+    """
+
+    # Brokers started in this process by port
+    brokers={}
+
+    # Sockets and metrics of each port
+    SOCKET_DIR="/tmp/discrip/serial"
+
+    # Latencies kept for percentiles
+    LATENCY_SAMPLES=1000
+
+    # Seconds a session can wait for its client's next request
+    SESSION_IDLE=60
+
+
+    def __init__(self, port, baudrate=9600, parity=serial.PARITY_NONE, timeout=30, settle=0):
+        """Constructor to setup port settings and socket
+
+        """
+        self.port=port
+        self.baudrate=baudrate
+        self.parity=parity
+        self.timeout=timeout
+        self.settle=settle
+        self.serial=None
+
+        # Metrics
+        self.latencies=deque(maxlen=SerialBroker.LATENCY_SAMPLES)
+        self.stats_data={
+            "port": port,
+            "opens": 0,
+            "sessions": 0,
+            "commands": 0,
+            "errors": 0,
+            "latency_count": 0,
+            "latency_total": 0.0,
+            "latency_max": 0.0
+        }
+        self.last_write=None
+
+        if not os.path.exists(SerialBroker.SOCKET_DIR):
+            os.makedirs(SerialBroker.SOCKET_DIR, exist_ok=True)
+        path=SerialBroker.socketPath(port)
+        if os.path.exists(path):
+            os.remove(path)
+        self.server=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.server.bind(path)
+        self.server.listen(16)
+
+        self.thread=threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def socketPath(port):
+        return f"{SerialBroker.SOCKET_DIR}/{os.path.basename(port)}.sock"
+
+
+    def start(port, **options):
+        """Start broker for a port if this process doesn't have one
+
+        """
+        if port not in SerialBroker.brokers:
+            SerialBroker.brokers[port]=SerialBroker(port, **options)
+        return SerialBroker.brokers[port]
+
+
+    def connect(port, baudrate=9600, parity=serial.PARITY_NONE, timeout=30, settle=0):
+        """Get connection to a port through its broker
+
+        Opens the port directly if no broker is running for it.
+        """
+        try:
+            return SerialClient(port, timeout)
+        except (FileNotFoundError, ConnectionRefusedError):
+            ser = serial.Serial(port, baudrate, timeout=timeout, parity=parity)
+            # Some devices reset when the port is opened
+            if settle:
+                time.sleep(settle)
+            return ser
+
+
+    def open(self):
+        """Open port if it isn't already
+
+        """
+        if self.serial is None:
+            self.serial=serial.Serial(self.port, self.baudrate, timeout=self.timeout, parity=self.parity)
+            self.stats_data["opens"]+=1
+            # Some devices reset when the port is opened
+            if self.settle:
+                time.sleep(self.settle)
+        return self.serial
+
+
+    def record(self):
+        """Store latency since the last write
+
+        """
+        if self.last_write is None:
+            return
+        latency=time.time()-self.last_write
+        self.last_write=None
+        self.latencies.append(latency)
+        self.stats_data["latency_count"]+=1
+        self.stats_data["latency_total"]+=latency
+        self.stats_data["latency_max"]=max(self.stats_data["latency_max"], latency)
+
+
+    def stats(self):
+        """Get latency metrics
+
+        """
+        stats=dict(self.stats_data)
+        if self.latencies:
+            latencies=sorted(self.latencies)
+            stats["latency_mean"]=stats["latency_total"]/stats["latency_count"]
+            stats["latency_p50"]=latencies[len(latencies)//2]
+            stats["latency_p95"]=latencies[min(len(latencies)-1, int(len(latencies)*0.95))]
+        return stats
+
+
+    def readLine(self, ser):
+        line=ser.read_until()
+        self.record()
+        return line.decode("latin-1")
+
+
+    def command(self, ser, data, until, clear=None):
+        """Write command and read lines until a line contains any end marker
+
+        An empty line means the read timed out.
+        """
+        ser.write(data.encode("latin-1"))
+        self.last_write=time.time()
+        self.stats_data["commands"]+=1
+        lines=[]
+        while True:
+            line=self.readLine(ser)
+            lines.append(line)
+            if line == "" or line == "\x15":
+                if clear is not None:
+                    ser.write(clear.encode("latin-1"))
+                break
+            if any(marker in line for marker in until):
+                break
+        return lines
+
+
+    def handle(self, request):
+        """Run one request from a client
+
+        """
+        op=request["op"]
+        if op == "stats":
+            return {"stats": self.stats()}
+
+        ser=self.open()
+        if "timeout" in request:
+            ser.timeout=request["timeout"]
+
+        if op == "reset":
+            ser.reset_input_buffer()
+            ser.reset_output_buffer()
+            return {}
+        if op == "dtr":
+            ser.dtr=request["value"]
+            return {}
+        if op == "write":
+            ser.write(request["data"].encode("latin-1"))
+            self.last_write=time.time()
+            return {}
+        if op == "read":
+            data=ser.read(request.get("size", 1))
+            self.record()
+            return {"data": data.decode("latin-1")}
+        if op == "readline":
+            return {"data": self.readLine(ser)}
+        if op == "command":
+            return {"lines": self.command(ser, request["data"], request["until"], request.get("clear"))}
+        if op == "batch":
+            return {"results": [
+                self.command(ser, command["data"], command["until"], command.get("clear"))
+                for command in request["commands"]
+            ]}
+        return {"error": f"Unknown op [{op}]"}
+
+
+    def session(self, connection):
+        """Serve one client until it disconnects
+
+        """
+        self.stats_data["sessions"]+=1
+        # A client that stops sending would otherwise hold the port forever
+        connection.settimeout(max(SerialBroker.SESSION_IDLE, (self.timeout or 0)*2))
+        stream=connection.makefile("rwb")
+        try:
+            # Tell client its session started
+            stream.write((json.dumps({"ready": True})+"\n").encode("utf-8"))
+            stream.flush()
+            for raw in stream:
+                try:
+                    response=self.handle(json.loads(raw))
+                except (OSError, serial.SerialException) as e:
+                    # Reopen port on next request
+                    self.stats_data["errors"]+=1
+                    if self.serial is not None:
+                        self.serial.close()
+                        self.serial=None
+                    response={"error": repr(e)}
+                except Exception as e:
+                    # Malformed request, only this request fails
+                    self.stats_data["errors"]+=1
+                    response={"error": repr(e)}
+                finally:
+                    # Timeout set by a client only lasts for its session
+                    if self.serial is not None:
+                        self.serial.timeout=self.timeout
+                stream.write((json.dumps(response)+"\n").encode("utf-8"))
+                stream.flush()
+        except (OSError, ValueError) as e:
+            print(f"Serial session on [{self.port}] ended: {repr(e)}")
+        finally:
+            stream.close()
+            connection.close()
+            self.last_write=None
+
+
+    def run(self):
+        """Accept sessions one at a time
+
+        """
+        while True:
+            connection, address = self.server.accept()
+            try:
+                self.session(connection)
+            except Exception as e:
+                # Keep serving other clients
+                print(f"Serial session on [{self.port}] failed: {repr(e)}")
+            # Store metrics for anything watching the port
+            try:
+                with open(f"{SerialBroker.SOCKET_DIR}/{os.path.basename(self.port)}.stats.json", 'w', encoding="utf-8") as output:
+                    output.write(json.dumps(self.stats(), indent=4))
+            except OSError:
+                pass
+
+
+class SerialClient(object):
+    """Connection to a serial port through its broker
+
+    Supports the parts of serial.Serial used by controllers along with
+    command and batch requests that read responses in the broker. Responses
+    are waited for longer than the serial timeout and the connection is
+    dropped if the broker doesn't answer in time.
+    """
+
+    # Seconds added to the serial timeout when waiting on the broker
+    TIMEOUT_MARGIN=10
+
+
+    def __init__(self, port, timeout=None):
+        """Connect to broker of a port
+
+        Waits until sessions of other clients are done.
+        """
+        self.port=port
+        self.timeout=timeout
+        self.socket=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            self.socket.connect(SerialBroker.socketPath(port))
+        except OSError:
+            self.socket.close()
+            raise
+        self.stream=self.socket.makefile("rwb")
+        if not self.stream.readline():
+            self.close()
+            raise serial.SerialException(f"Serial broker for [{port}] closed connection")
+
+
+    def request(self, op, **args):
+        """Send request and wait for response
+
+        """
+        if self.socket.fileno() == -1:
+            raise serial.SerialException(f"Serial broker for [{self.port}] connection was dropped")
+        request={"op": op} | args
+        if self.timeout is not None and "timeout" not in request:
+            request["timeout"]=self.timeout
+        timeout=request.get("timeout")
+        if timeout is not None:
+            # Each command of a batch can wait for the serial timeout
+            self.socket.settimeout(timeout*max(1, len(request.get("commands", [])))+SerialClient.TIMEOUT_MARGIN)
+        try:
+            self.stream.write((json.dumps(request)+"\n").encode("utf-8"))
+            self.stream.flush()
+            raw=self.stream.readline()
+        except OSError as e:
+            # A late response would be read as the answer to the next request
+            self.close()
+            raise serial.SerialException(f"Serial broker for [{self.port}] did not respond: {repr(e)}") from e
+        if not raw:
+            raise serial.SerialException(f"Serial broker for [{self.port}] closed connection")
+        response=json.loads(raw)
+        if "error" in response:
+            raise serial.SerialException(response["error"])
+        return response
+
+
+    @property
+    def dtr(self):
+        return None
+
+
+    @dtr.setter
+    def dtr(self, value):
+        self.request("dtr", value=value)
+
+
+    def reset_input_buffer(self):
+        self.request("reset")
+
+
+    def reset_output_buffer(self):
+        # Both buffers are reset by reset_input_buffer
+        return
+
+
+    def write(self, data):
+        self.request("write", data=bytes(data).decode("latin-1"))
+        return len(data)
+
+
+    def read(self, size=1):
+        return self.request("read", size=size)["data"].encode("latin-1")
+
+
+    def read_until(self):
+        return self.request("readline")["data"].encode("latin-1")
+
+
+    def command(self, data, until, clear=None):
+        """Write command and get response lines read by the broker
+
+        """
+        return self.request("command", data=data, until=until, clear=clear)["lines"]
+
+
+    def batch(self, commands):
+        """Run several commands in one exchange with the broker
+
+        """
+        return self.request("batch", commands=commands)["results"]
+
+
+    def stats(self):
+        return self.request("stats")["stats"]
+
+
+    def close(self):
+        self.stream.close()
+        self.socket.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
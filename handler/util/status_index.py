@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+# Rip status index for pyDiscRip stored in SQLite beside the job queue.
+
+# Python System
+import os
+import json
+import sqlite3
+
+
+class StatusIndex(object):
+    """Index of the latest status.json of every media sample
+
+    Each write gets an increasing sequence number so readers can fetch only
+    what changed since the last sequence they saw. Each process must open its
+    own StatusIndex as SQLite connections can not be shared across a fork.
+    """
+
+    def __init__(self, path, check_same_thread=True):
+        """Open or create the index tables
+
+        Set check_same_thread to False to share the connection between
+        threads that take turns using it.
+        """
+        self.path=path
+        if os.path.dirname(path) != "" and not os.path.exists(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+
+        # Autocommit mode, transactions are started explicitly
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=check_same_thread)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS status (
+                name TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL,
+                done INTEGER NOT NULL DEFAULT 0,
+                time_added TEXT,
+                status TEXT NOT NULL
+            )""")
+        self.db.execute("CREATE INDEX IF NOT EXISTS status_seq ON status (seq)")
+        self.db.execute("CREATE TABLE IF NOT EXISTS status_meta (key TEXT PRIMARY KEY, value TEXT)")
+
+
+    def close(self):
+        self.db.close()
+
+
+    def update(self, media_sample):
+        """Store latest status of a media sample
+
+        """
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self.db.execute("SELECT COALESCE(MAX(seq),0)+1 FROM status").fetchone()[0]
+            self.db.execute(
+                "INSERT OR REPLACE INTO status (name, seq, done, time_added, status) VALUES (?,?,?,?,?)",
+                (
+                    media_sample["name"],
+                    seq,
+                    int(bool(media_sample.get("done", False))),
+                    media_sample.get("time_added"),
+                    json.dumps(media_sample)
+                ))
+            self.db.execute("COMMIT")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+
+    def since(self, seq=0):
+        """Get statuses changed after a sequence number in order of change
+
+        """
+        return [
+            (row["seq"], json.loads(row["status"]))
+            for row in self.db.execute("SELECT seq, status FROM status WHERE seq > ? ORDER BY seq", (seq,))
+        ]
+
+
+    def backfill(self, output):
+        """Add status files already in the output folder to the index
+
+        Only runs once for each database, status files written after that are
+        indexed as they are written.
+        """
+        row = self.db.execute("SELECT value FROM status_meta WHERE key='backfill'").fetchone()
+        if row is not None:
+            return 0
+
+        count=0
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            seq = self.db.execute("SELECT COALESCE(MAX(seq),0) FROM status").fetchone()[0]
+            with os.scandir(output) as entries:
+                for entry in entries:
+                    filepath=f"{entry.path}/status/status.json"
+                    if not entry.is_dir() or not os.path.exists(filepath):
+                        continue
+                    try:
+                        with open(filepath, newline='') as jsonfile:
+                            status = json.load(jsonfile)
+                        seq+=1
+                        self.db.execute(
+                            "INSERT OR IGNORE INTO status (name, seq, done, time_added, status) VALUES (?,?,?,?,?)",
+                            (status["name"], seq, int(bool(status.get("done", False))), status.get("time_added"), json.dumps(status)))
+                        count+=1
+                    except (OSError, ValueError, KeyError) as e:
+                        print(f"Could not index [{filepath}]: {repr(e)}")
+            self.db.execute("INSERT OR REPLACE INTO status_meta (key, value) VALUES ('backfill', ?)", (str(count),))
+            self.db.execute("COMMIT")
+        except FileNotFoundError:
+            # Nothing ripped yet, try again later
+            self.db.execute("ROLLBACK")
+        except Exception:
+            self.db.execute("ROLLBACK")
+            raise
+
+        return count
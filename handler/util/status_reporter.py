@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+
+# Background status reporting for pyDiscRip. Sends updates to the web
+# interface from a thread so ripping never waits on the web server.
+
+# Python System
+import os
+import json
+import time
+import threading
+import http.client
+
+
+class StatusReporter(object):
+    """Queue of pending web updates with a sender thread
+
+    Updates are merged while waiting to be sent so only the latest values for
+    each drive and queue entry are posted. The sender keeps one keep-alive
+    connection open and backs off while the web server is unreachable.
+    """
+
+    # Reporter for each web server in this process
+    reporters={}
+    reporters_lock=threading.Lock()
+
+    # Seconds to wait between attempts while the server is down
+    BACKOFF_MIN=1
+    BACKOFF_MAX=30
+
+    # Drive fields kept when the drive status changes
+    DRIVE_KEEP=("name", "media")
+
+
+    def __init__(self, host, port):
+        """Constructor to setup pending updates and start sender thread
+
+        """
+        self.host=host
+        self.port=port
+        self.connection=None
+        # Merged updates waiting to be sent
+        self.pending={}
+        # Update currently being sent
+        self.sending=False
+        self.condition=threading.Condition()
+        self.backoff=0
+        # Last send failed, web server is probably down
+        self.failed=False
+
+        self.thread=threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+
+    def get(host, port):
+        """Get reporter for a web server, one per process
+
+        Threads don't survive a fork so a new reporter is made in each child.
+        """
+        key=(host, port, os.getpid())
+        with StatusReporter.reporters_lock:
+            if key not in StatusReporter.reporters:
+                StatusReporter.reporters[key]=StatusReporter(host, port)
+            return StatusReporter.reporters[key]
+
+
+    def driveUpdate(drive_status, drive, update):
+        """Apply an update to the status of one drive
+
+        A new status replaces the fields of the last one, like progress, so
+        only the drive name and loaded media carry over.
+        """
+        current=drive_status.get(drive, {})
+        if "status" in update:
+            current={key: current[key] for key in StatusReporter.DRIVE_KEEP if key in current}
+        current.update(update)
+        drive_status[drive]=current
+
+
+    def merge(pending, data):
+        """Merge an update into pending updates
+
+        Drive status is merged per drive and queue entries per name so later
+        values replace stale ones.
+        """
+        for key, value in data.items():
+            if key == "drive_status":
+                drives=pending.setdefault("drive_status", {})
+                for drive, update in value.items():
+                    StatusReporter.driveUpdate(drives, drive, update)
+            elif key == "queue":
+                samples=pending.setdefault("queue", {})
+                for media_sample in (value if isinstance(value, list) else [value]):
+                    samples.setdefault(media_sample["name"], {}).update(media_sample)
+            else:
+                pending[key]=value
+
+
+    def send(self, data):
+        """Add an update to be sent, never blocks on the web server
+
+        """
+        with self.condition:
+            StatusReporter.merge(self.pending, data)
+            self.condition.notify()
+
+
+    def flush(self, timeout=5):
+        """Wait for pending updates to be sent
+
+        Returns False if updates were still pending after the timeout. Doesn't
+        wait once a send failed so processes exit quickly without a web server.
+        """
+        end=time.time()+timeout
+        with self.condition:
+            while self.pending or self.sending:
+                if self.failed:
+                    return False
+                remaining=end-time.time()
+                if remaining <= 0:
+                    return False
+                self.condition.wait(remaining)
+        return True
+
+
+    def post(self, data):
+        """Post update over the kept open connection
+
+        """
+        body=json.dumps(data).encode("utf-8")
+        for attempt in range(2):
+            if self.connection is None:
+                self.connection=http.client.HTTPConnection(self.host, self.port, timeout=5)
+            try:
+                self.connection.request("POST", "/update", body=body, headers={"Content-Type": "application/json"})
+                self.connection.getresponse().read()
+                return
+            except (OSError, http.client.HTTPException):
+                # Server may have closed an idle connection, retry once with a new one
+                self.connection.close()
+                self.connection=None
+                if attempt == 1:
+                    raise
+
+
+    def run(self):
+        """Send merged updates as they arrive
+
+        """
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+                data=self.pending
+                self.pending={}
+                self.sending=True
+
+            # Queue entries were merged by name
+            if "queue" in data:
+                data["queue"]=list(data["queue"].values())
+
+            try:
+                self.post(data)
+                self.backoff=0
+                self.failed=False
+            except (OSError, http.client.HTTPException):
+                # Web server probably isn't running, keep newer updates over these
+                with self.condition:
+                    failed={}
+                    StatusReporter.merge(failed, data)
+                    newer=self.pending
+                    if "queue" in newer:
+                        newer["queue"]=list(newer["queue"].values())
+                    StatusReporter.merge(failed, newer)
+                    self.pending=failed
+                    self.failed=True
+                self.backoff=min(max(self.backoff*2, StatusReporter.BACKOFF_MIN), StatusReporter.BACKOFF_MAX)
+
+            with self.condition:
+                self.sending=False
+                self.condition.notify_all()
+
+            if self.backoff:
+                time.sleep(self.backoff)
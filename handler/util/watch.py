@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+
+# Watch folder ingest for pyDiscRip. Reports new or modified JSON sample files
+# using inotify when available and falls back to polling the folder.
+
+# Python System
+import os
+import time
+
+# External Modules
+try:
+    from inotify_simple import INotify, flags
+except Exception as e:
+    # Polling is used when inotify is not available
+    INotify = None
+
+
+class WatchFolder(object):
+    """Track JSON sample files in a watch folder
+
+    Files are tracked by path and mtime so each file is only read when it is
+    created or modified.
+    """
+
+    def __init__(self, path, extension=".json"):
+        """Constructor to setup folder tracking and inotify if available
+
+        """
+        # Folder to watch
+        self.path=path
+        # File extension to ingest
+        self.extension=extension
+        # Tracked files with the mtime they were last read at
+        self.seen={}
+        # Files reported by inotify that still need checking
+        self.pending=set()
+
+        # Setup inotify watch
+        self.inotify=None
+        if INotify is not None:
+            try:
+                self.inotify=INotify()
+                self.inotify.add_watch(self.path, flags.CLOSE_WRITE | flags.MOVED_TO)
+                print(f"Watching [{self.path}] with inotify")
+            except Exception as e:
+                print(f"inotify unavailable, polling [{self.path}]: {repr(e)}")
+                self.inotify=None
+
+        # Files that existed before the watch started still need to be read
+        self.scan()
+
+
+    def scan(self):
+        """Add all matching files in the folder to the pending set
+
+        """
+        try:
+            with os.scandir(self.path) as entries:
+                for entry in entries:
+                    if entry.name.endswith(self.extension) and entry.is_file():
+                        self.pending.add(entry.path)
+        except FileNotFoundError:
+            return
+
+        # Stop tracking files that were removed
+        for path in list(self.seen):
+            if not os.path.exists(path):
+                del self.seen[path]
+
+
+    def readEvents(self, timeout=0):
+        """Read inotify events and queue matching files
+
+        Returns True if any events were read.
+        """
+        events = self.inotify.read(timeout=int(timeout*1000))
+        for event in events:
+            # Events were dropped, fall back to a full scan
+            if event.mask & flags.Q_OVERFLOW:
+                self.scan()
+                continue
+            if event.name.endswith(self.extension):
+                self.pending.add(f"{self.path}/{event.name}")
+        return len(events) > 0
+
+
+    def changed(self):
+        """Get new or modified files without blocking
+
+        Files are returned oldest first so samples keep their submission order.
+        """
+        # Collect new files
+        if self.inotify is not None:
+            self.readEvents()
+        else:
+            self.scan()
+
+        # Check mtime against last read
+        changed=[]
+        for path in self.pending:
+            try:
+                mtime = os.stat(path).st_mtime_ns
+            except FileNotFoundError:
+                self.seen.pop(path, None)
+                continue
+            if self.seen.get(path) != mtime:
+                self.seen[path]=mtime
+                changed.append((mtime, path))
+        self.pending=set()
+
+        return [path for mtime, path in sorted(changed)]
+
+
+    def retry(self, path):
+        """Forget a file so it is read again, used when a file was incomplete
+
+        """
+        self.seen.pop(path, None)
+        self.pending.add(path)
+
+
+    def wait(self, timeout):
+        """Block until the folder changes or timeout seconds have passed
+
+        """
+        if self.inotify is not None:
+            self.readEvents(timeout)
+        else:
+            time.sleep(timeout)
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+
+# Tests for the BIN/CUE track splitter. Run with: python -m unittest discover tests
+
+# Python System
+import os
+import tempfile
+import unittest
+
+# Internal Modules
+from handler.util.binsplit import cue_split
+
+
+class TestCueSplit(unittest.TestCase):
+    """Tracks written from BINs with a pregap before INDEX 01
+
+    """
+
+    def setUp(self):
+        self.tmp=tempfile.TemporaryDirectory()
+        self.path=self.tmp.name
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def test_data_track_pregap_not_written(self):
+        # 150 sector pregap then 100 MODE1 sectors, user data of each sector
+        # is filled with its sector number in the track
+        sectors=bytearray(150*2352)
+        for sector in range(100):
+            raw=bytearray(2352)
+            raw[16:16+2048]=bytes([sector+1])*2048
+            sectors+=raw
+        with open(f"{self.path}/track01.bin", 'wb') as output:
+            output.write(sectors)
+        with open(f"{self.path}/disc.cue", 'w') as cue:
+            cue.write(
+                'FILE "track01.bin" BINARY\n'
+                '  TRACK 01 MODE1/2352\n'
+                '    INDEX 00 00:00:00\n'
+                '    INDEX 01 00:02:00\n')
+
+        written=cue_split(f"{self.path}/disc.cue", f"{self.path}/out")
+
+        self.assertEqual(written, [f"{self.path}/out/track01.iso"])
+        with open(written[0], 'rb') as iso:
+            data=iso.read()
+        self.assertEqual(len(data), 100*2048)
+        # Volume descriptors start at sector 16 of the image
+        self.assertEqual(data[16*2048], 17)
+        self.assertEqual(data[0], 1)
+
+
+    def test_audio_track_pregap_not_written(self):
+        with open(f"{self.path}/track01.bin", 'wb') as output:
+            output.write(bytes(150*2352)+b"\x01"*(10*2352))
+        with open(f"{self.path}/disc.cue", 'w') as cue:
+            cue.write(
+                'FILE "track01.bin" BINARY\n'
+                '  TRACK 01 AUDIO\n'
+                '    INDEX 00 00:00:00\n'
+                '    INDEX 01 00:02:00\n')
+
+        written=cue_split(f"{self.path}/disc.cue", f"{self.path}/out")
+
+        # 44 byte RIFF header then only the audio after INDEX 01
+        self.assertEqual(os.path.getsize(written[0]), 44+10*2352)
+        with open(written[0], 'rb') as wav:
+            self.assertEqual(wav.read()[44:], b"\x01"*(10*2352))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+
+# Tests for the CUE sheet model. Run with: python -m unittest discover tests
+
+# Python System
+import os
+import tempfile
+import unittest
+
+# Internal Modules
+from handler.util.cuesheet import CueSheet
+
+
+class TestCueSheetOffsets(unittest.TestCase):
+    """Track byte ranges of per-track BIN files
+
+    """
+
+    def setUp(self):
+        self.tmp=tempfile.TemporaryDirectory()
+        self.path=self.tmp.name
+
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+
+    def write(self, name, data):
+        with open(f"{self.path}/{name}", 'wb') as output:
+            output.write(data)
+
+
+    def test_first_track_starts_at_index_1(self):
+        # Data track with a 150 sector pregap in its own BIN and an audio
+        # track with no pregap in a second BIN
+        self.write("track01.bin", bytes(250*2352))
+        self.write("track02.bin", bytes(10*2352))
+        with open(f"{self.path}/disc.cue", 'w') as cue:
+            cue.write(
+                'FILE "track01.bin" BINARY\n'
+                '  TRACK 01 MODE1/2352\n'
+                '    INDEX 00 00:00:00\n'
+                '    INDEX 01 00:02:00\n'
+                'FILE "track02.bin" BINARY\n'
+                '  TRACK 02 AUDIO\n'
+                '    INDEX 01 00:00:00\n')
+
+        sheet=CueSheet(f"{self.path}/disc.cue")
+
+        self.assertEqual(sheet.tracks[0]["offset"], 150*2352)
+        self.assertEqual(sheet.tracks[0]["end"], 250*2352)
+        self.assertEqual(sheet.tracks[0]["sectors"], 100)
+        self.assertEqual(sheet.tracks[1]["offset"], 0)
+        self.assertEqual(sheet.tracks[1]["sectors"], 10)
+
+
+    def test_later_tracks_follow_first_track(self):
+        # Pregap of the second track stays with the first track
+        self.write("disc.bin", bytes(400*2352))
+        with open(f"{self.path}/disc.cue", 'w') as cue:
+            cue.write(
+                'FILE "disc.bin" BINARY\n'
+                '  TRACK 01 AUDIO\n'
+                '    INDEX 00 00:00:00\n'
+                '    INDEX 01 00:02:00\n'
+                '  TRACK 02 AUDIO\n'
+                '    INDEX 00 00:03:00\n'
+                '    INDEX 01 00:04:00\n')
+
+        sheet=CueSheet(f"{self.path}/disc.cue")
+
+        self.assertEqual(sheet.tracks[0]["offset"], 150*2352)
+        self.assertEqual(sheet.tracks[0]["end"], 300*2352)
+        self.assertEqual(sheet.tracks[1]["offset"], 300*2352)
+        self.assertEqual(sheet.tracks[1]["end"], 400*2352)
+
+
+if __name__ == '__main__':
+    unittest.main()
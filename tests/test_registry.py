@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+
+# Tests for the handler declarations of each manager. Run with: python -m unittest discover tests
+
+# Python System
+import unittest
+
+# Internal Modules
+from handler.util.registry import HandlerRegistry
+from handler.media.manager import MediaHandlerManager
+from handler.data.manager import DataHandlerManager
+from handler.controller.manager import ControllerHandlerManager
+
+
+class TestHandlerDeclarations(unittest.TestCase):
+    """Declared IDs match the handlers they create
+
+    Matching uses the declarations without importing handlers so they must
+    stay the same as what each handler sets in its constructor.
+    """
+
+    def assertDeclarations(self, handlers, fields):
+        for key, declaration in handlers.items():
+            with self.subTest(key=key):
+                try:
+                    handler = HandlerRegistry.handlerClass(declaration)()
+                except (ImportError, SystemExit):
+                    # Handler modules exit when a required module is missing
+                    self.skipTest(f"Dependencies of {declaration["module"]} not installed")
+                for field in fields:
+                    self.assertEqual(declaration[field], getattr(handler, field), field)
+
+
+    def test_media_handlers(self):
+        self.assertDeclarations(MediaHandlerManager.HANDLERS, ["type_id", "handler_id"])
+
+
+    def test_data_handlers(self):
+        self.assertDeclarations(DataHandlerManager.HANDLERS, ["type_id", "handle_id", "data_outputs"])
+
+
+    def test_controller_handlers(self):
+        self.assertDeclarations(ControllerHandlerManager.HANDLERS, ["type_id"])
+
+
+if __name__ == '__main__':
+    unittest.main()
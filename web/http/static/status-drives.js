@@ -45,48 +45,76 @@ function drivesUpdateAction(drive)
 	});
 }
 
+function drivesRender(data)
+{
+	elm = document.getElementById("status-drives")
+	if (!built)
+		elm.appendChild(drivesBuild(data));
+
+	for (const [key, value] of Object.entries(data))
+	{
+		drive=document.getElementById("driveStatus_"+key);
+		if (drive === null) continue;
+		drive.className = '';
+		switch(value["status"])
+		{
+			case 0:
+				drive.classList.add("idle");
+				break;
+			case 1:
+				drive.classList.add("good");
+				break;
+			case 2:
+			case 4:
+				drive.classList.add("working");
+				break;
+			case 3:
+				drive.classList.add("attention");
+				break;
+		}
+
+		if ("title" in value)
+		{
+			drive.title = value["title"];
+		}
+		drive=document.getElementById("driveStatus_media_"+key);
+		drive.innerText = value["media"];
+	}
+}
+
 function drivesLoadStatus(event)
 {
 	fetch('/status/drive_status.json').then((response) => response.json())
 	.then((data) =>
 		{
-			elm = document.getElementById("status-drives")
-			if (!built)
-				elm.appendChild(drivesBuild(data));
-
-			for (const [key, value] of Object.entries(data))
-			{
-				drive=document.getElementById("driveStatus_"+key);
-				drive.className = '';
-				switch(value["status"])
-				{
-					case 0:
-						drive.classList.add("idle");
-						break;
-					case 1:
-						drive.classList.add("good");
-						break;
-					case 2:
-					case 4:
-						drive.classList.add("working");
-						break;
-					case 3:
-						drive.classList.add("attention");
-						break;
-				}
-
-				if ("title" in value)
-				{
-					drive.title = value["title"];
-				}
-				drive=document.getElementById("driveStatus_media_"+key);
-				drive.innerText = value["media"];
-			}
+			drivesRender(data);
 		}
 	);
 
 
 	setTimeout(drivesLoadStatus, 3000);
 }
-window.addEventListener("load", drivesLoadStatus);
 
+var drivesData = {};
+function drivesEvent(event)
+{
+	// Apply changes to last known drive status
+	if (event["reset"]) drivesData = {};
+	for (const [drive, update] of Object.entries(event["data"]))
+	{
+		if (!(drive in drivesData)) drivesData[drive] = {};
+		// A new status replaces the last one except drive name and media
+		if ("status" in update)
+		{
+			let kept = {};
+			for (const key of ["name", "media"])
+			{
+				if (key in drivesData[drive]) kept[key] = drivesData[drive][key];
+			}
+			drivesData[drive] = kept;
+		}
+		Object.assign(drivesData[drive], update);
+	}
+	drivesRender(drivesData);
+}
+window.addEventListener("load", function() { statusEventsListen("drive_status", drivesEvent, drivesLoadStatus); });
@@ -0,0 +1,41 @@
+// Shared server-sent event stream for status pages, falls back to polling
+var statusEventSource = null;
+var statusEventFallbacks = [];
+var statusEventFailed = false;
+
+function statusEventsFallback()
+{
+	if (statusEventFailed) return;
+	statusEventFailed = true;
+	if (statusEventSource !== null) statusEventSource.close();
+	for (const fallback of statusEventFallbacks) fallback();
+}
+
+function statusEventsConnect()
+{
+	if (!window.EventSource)
+	{
+		statusEventsFallback();
+		return;
+	}
+	statusEventSource = new EventSource("/status/events");
+	statusEventSource.onerror = function()
+	{
+		// Browser reconnects by itself unless the stream was refused
+		if (statusEventSource.readyState == EventSource.CLOSED)
+			statusEventsFallback();
+	};
+}
+
+function statusEventsListen(event, handler, fallback)
+{
+	statusEventFallbacks.push(fallback);
+	if (!statusEventFailed && statusEventSource === null)
+		statusEventsConnect();
+	if (statusEventFailed)
+	{
+		fallback();
+		return;
+	}
+	statusEventSource.addEventListener(event, function(e) { handler(JSON.parse(e.data)); });
+}
@@ -52,79 +52,126 @@ fetch('/status/queue_status.json').then((response) => response.json())
     });
 }
 
-function queueLoadStatus(event)
+var queuePaused = false;
+function queueRender(data)
 {
-    fetch('/status/queue.json').then((response) => response.json())
-    .then((data) =>
+    document.getElementById("queue").replaceChildren();
+
+    var table = document.createElement("table");
+    var tr = document.createElement("tr");
+    var th = document.createElement("th");
+    th.innerText = "Queue";
+    th.colSpan = 3;
+    tr.appendChild(th);
+    table.appendChild(tr);
+
+    tr = document.createElement("tr");
+    th = document.createElement("td");
+    var label = document.createElement("label");
+    var input = document.createElement("input");
+    th.colSpan = 3;
+    input.checked = queuePaused;
+    label.innerText = "Queue Pause";
+    label.for = "queue_pause";
+    input.type = "checkbox";
+    input.id = "queue_pause";
+    input.name = "queue_pause";
+    input.addEventListener('click', toggle_pause);
+
+    th.appendChild(label);
+    th.appendChild(input);
+    tr.appendChild(th);
+    table.appendChild(tr);
+
+    tr = document.createElement("tr");
+    th = document.createElement("th");
+    th.innerText = "Sample";
+    tr.appendChild(th);
+    th = document.createElement("th");
+    th.innerText = "Source";
+    tr.appendChild(th);
+    th = document.createElement("th");
+    th.innerText = "State";
+    tr.appendChild(th);
+    table.appendChild(tr);
+
+    for (i in data)
     {
-        document.getElementById("queue").replaceChildren();
-
-        var table = document.createElement("table");
-        var tr = document.createElement("tr");
-        var th = document.createElement("th");
-        th.innerText = "Queue";
-        th.colSpan = 2;
-        tr.appendChild(th);
-        table.appendChild(tr);
+        if (data[i]["done"]) continue;
 
         tr = document.createElement("tr");
-        th = document.createElement("td");
-        var label = document.createElement("label");
-        var input = document.createElement("input");
-        th.colSpan = 2;
-        fetch('/status/queue_status.json').then((response) => response.json())
-        .then((data) =>
-        {
-            input.checked = data["pause"];
-        });
-        label.innerText = "Queue Pause";
-        label.for = "queue_pause";
-        input.type = "checkbox";
-        input.id = "queue_pause";
-        input.name = "queue_pause";
-        input.addEventListener('click', toggle_pause);
-
-        th.appendChild(label);
-        th.appendChild(input);
-        tr.appendChild(th);
-        table.appendChild(tr);
+        var td = document.createElement("td");
+        td.innerText = data[i]["name"];
+        tr.appendChild(td);
 
-        tr = document.createElement("tr");
-        th = document.createElement("th");
-        th.innerText = "Sample";
-        tr.appendChild(th);
-        th = document.createElement("th");
-        th.innerText = "Source";
-        tr.appendChild(th);
-        table.appendChild(tr);
+        td = document.createElement("td");
+        if ("group" in data[i])
+        {
+            td.innerText = data[i]["group"];
+        }else{
+            td.innerText = data[i]["drive"];
+        }
+        tr.appendChild(td);
 
-        for (i in data)
+        td = document.createElement("td");
+        if ("state" in data[i])
         {
-            if (data[i]["done"]) continue;
-
-            tr = document.createElement("tr");
-            var td = document.createElement("td");
-            td.innerText = data[i]["name"];
-            tr.appendChild(td);
-
-            td = document.createElement("td");
-            if ("group" in data[i])
-            {
-                td.innerText = data[i]["group"];
-            }else{
-                td.innerText = data[i]["drive"];
-            }
-            tr.appendChild(td);
-            table.appendChild(tr);
+            td.innerText = data[i]["state"];
         }
+        tr.appendChild(td);
+        table.appendChild(tr);
+    }
 
 
-        document.getElementById("queue").appendChild(table);
-    }
-    );
+    document.getElementById("queue").appendChild(table);
+}
+
+function queueLoadStatus(event)
+{
+    fetch('/status/queue_status.json').then((response) => response.json())
+    .then((data) =>
+    {
+        queuePaused = data["pause"];
+        fetch('/status/queue.json').then((response) => response.json())
+        .then((data) =>
+        {
+            queueRender(data);
+        });
+    });
 
 
     setTimeout(queueLoadStatus, 3000);
 }
-window.addEventListener("load", queueLoadStatus);
 
+var queueData = [];
+function queueEvent(event)
+{
+    // Apply changes to last known queue
+    if (event["reset"]) queueData = [];
+    for (const media_sample of event["data"])
+    {
+        var match = queueData.find((item) => item["name"] == media_sample["name"]);
+        if (match !== undefined)
+        {
+            Object.assign(match, media_sample);
+        }else if (!("queue_front" in media_sample) || media_sample["queue_front"] == "false"){
+            queueData.push(media_sample);
+        }else{
+            queueData.unshift(media_sample);
+        }
+    }
+    queueData = queueData.filter((item) => !item["done"]);
+    queueRender(queueData);
+}
+
+function queueStatusEvent(event)
+{
+    queuePaused = event["data"]["pause"];
+    var input = document.getElementById("queue_pause");
+    if (input !== null) input.checked = queuePaused;
+}
+
+window.addEventListener("load", function() {
+    statusEventsListen("queue_status", queueStatusEvent, function() {});
+    statusEventsListen("queue", queueEvent, queueLoadStatus);
+});
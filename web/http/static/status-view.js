@@ -236,11 +236,21 @@ function mediaSampleView(media_sample)
 }
 
 
+var statusETag = null;
 function loadStatus(event)
 {
-	fetch('/status/status.json').then((response) => response.json())
+	// Only send statuses if changed since last load
+	var headers = {};
+	if (statusETag !== null) headers["If-None-Match"] = statusETag;
+	fetch('/status/status.json', {headers: headers, cache: "no-store"}).then((response) =>
+		{
+			if (response.status == 304) return null;
+			statusETag = response.headers.get("ETag");
+			return response.json();
+		})
 	.then((data) =>
 		{
+			if (data === null) return;
 			document.getElementById("status").replaceChildren();
 
 			data.sort(function(a, b) {
@@ -3,6 +3,9 @@
 from pprint import pprint
 import os, sys
 import json
+import time
+import queue as queue_module
+import threading
 from pathlib import Path
 
 import logging
@@ -15,6 +18,9 @@ try:
     from flask import redirect
     from flask import make_response
     from flask import send_from_directory
+    from flask import Response
+    from flask import stream_with_context
+    from werkzeug.serving import WSGIRequestHandler
 except Exception as e:
         print("Need to install Python module [flask]")
         sys.exit(1)
@@ -23,6 +29,9 @@ from multiprocessing import Process
 
 # Internal Modules
 from handler.mediareader import MediaReader
+from handler.util.job_store import JobStore
+from handler.util.status_index import StatusIndex
+from handler.util.status_reporter import StatusReporter
 
 
 class WebInterface(object):
@@ -53,6 +62,7 @@ class WebInterface(object):
         self.app.add_url_rule('/status/drive_status.json','drive_status_json', self.drive_status_json)
         self.app.add_url_rule('/status/queue.json','queue_json', self.queue_json)
         self.app.add_url_rule('/status/queue_status.json','queue_status', self.queue_status)
+        self.app.add_url_rule('/status/events','status_events', self.status_events)
         self.app.add_url_rule('/status/file','settings_json', self.settings_json)
         self.app.add_url_rule('/update','update', self.update,methods=["POST"])
         self.app.add_url_rule('/pause','pause', self.pause)
@@ -61,6 +71,21 @@ class WebInterface(object):
         self.drive_status={}
         self.queue=[]
 
+        # Rip statuses by name kept up to date from the status index
+        self.status_cache={}
+        self.status_seq=0
+        self.status_lock=threading.Lock()
+        # Serialized responses for current status by query
+        self.status_responses={}
+
+        # Event stream clients, each with a queue of pending events
+        self.listeners=[]
+        self.listeners_lock=threading.Lock()
+        # Events held for each client before it is dropped to resync
+        self.listener_max=256
+        # Seconds between keep alive comments on idle streams
+        self.heartbeat=15
+
         # Set headers for server
         self.app.after_request(self.add_header)
 
@@ -139,6 +164,7 @@ class WebInterface(object):
         else:
                 Path(f"{self.settings["watch"]}/pause").touch()
 
+        self.publish("queue_status",{"reset":True,"data":self.queue_status_dict()})
         return "You got it"
 
     def update(self):
@@ -157,10 +183,10 @@ class WebInterface(object):
         if "drive_status" in data:
             print("Updating drive status")
             for drive, update in data["drive_status"].items():
-                if drive not in self.drive_status:
-                    self.drive_status[drive]={}
-                for key, value in update.items():
-                    self.drive_status[drive][key] = value
+                StatusReporter.driveUpdate(self.drive_status, drive, update)
+
+            # Send changes to event stream clients
+            self.publish("drive_status",{"reset":False,"data":data["drive_status"]})
 
 
         if "queue" in data:
@@ -172,13 +198,15 @@ class WebInterface(object):
                 media_sample.pop('settings', None)
                 match = next((i for i, item in enumerate(self.queue) if item["name"] == media_sample["name"]), None)
                 if match is not None:
-                    self.queue[match] = media_sample
+                    self.queue[match].update(media_sample)
                 else:
                     if "queue_front" not in media_sample or media_sample["queue_front"] == "false":
                         self.queue.append(media_sample)
                     else:
                         self.queue.insert(0,media_sample)
 
+            # Send changes to event stream clients
+            self.publish("queue",{"reset":False,"data":data["queue"]})
 
 
         return "thx"
@@ -194,45 +222,157 @@ class WebInterface(object):
         print(f"web_rip_data: {name}")
         return send_file(f"{name}")
 
-    def output_status_json(self):
-        done = request.args.get('done')=="true"
-        outputs=[]
-        names=None
-        if (request.args.get('names') is not None):
-            names=json.dumps(request.args.get('names'))
-
-        for root, dirs, files in os.walk(self.settings["output"]):
-            for output in dirs:
-
-                if os.path.exists(f"{self.settings["output"]}/{output}/status/status.json"):
+    def status_refresh(self):
+        """ Load statuses changed since last refresh from the status index """
+        with self.status_lock:
+            try:
+                index = StatusIndex(JobStore.dbPath(self.settings))
+                # Index existing rips the first time
+                if self.status_seq == 0:
+                    index.backfill(self.settings["output"])
+                for seq, status in index.since(self.status_seq):
+                    self.status_cache[status["name"]] = status
+                    self.status_seq = seq
+                index.close()
+            except Exception as e:
+                print(f"Status index unavailable: {repr(e)}")
 
-                    with open(f"{self.settings["output"]}/{output}/status/status.json", newline='') as jsonfile:
-                        status = json.load(jsonfile)
-                        # Filter by status
-                        if request.args.get('done') is not None and status["done"] != done:
-                            continue
-                        # Filter by name
-                        if names is not None and status["name"] not in names:
-                            continue
-
-                        outputs.append(status)
-
-            return json.dumps(outputs), 200, {'Content-Type': 'application/json; charset=utf-8'}
-        return ""
+    def output_status_json(self):
+        """ Send rip statuses with optional done, names, offset and limit filters """
+        # Pagination must be whole numbers
+        try:
+            offset=max(0, int(request.args.get('offset', 0)))
+            limit=int(request.args.get('limit')) if request.args.get('limit') is not None else None
+        except ValueError:
+            return json.dumps({"error": "offset and limit must be integers"}), 400, {'Content-Type': 'application/json; charset=utf-8'}
+        if limit is not None and limit < 0:
+            return json.dumps({"error": "limit must not be negative"}), 400, {'Content-Type': 'application/json; charset=utf-8'}
+
+        self.status_refresh()
+
+        # Unchanged since client last asked
+        etag=f'"{self.status_seq}-{len(self.status_cache)}"'
+        if request.headers.get("If-None-Match") == etag:
+            return "", 304, {"ETag": etag}
+
+        query=request.query_string.decode("utf-8")
+        response=self.status_responses.get(query)
+        if response is None or response[0] != etag:
+            done = request.args.get('done')=="true"
+            names=None
+            if (request.args.get('names') is not None):
+                try:
+                    names=json.loads(request.args.get('names'))
+                except ValueError:
+                    names=request.args.get('names').split(",")
+
+            outputs=[]
+            for status in list(self.status_cache.values()):
+                # Filter by status
+                if request.args.get('done') is not None and status.get("done", False) != done:
+                    continue
+                # Filter by name
+                if names is not None and status["name"] not in names:
+                    continue
+                outputs.append(status)
+
+            # Newest first
+            outputs.sort(key=lambda status: status.get("time_added") or "", reverse=True)
+
+            # Pagination
+            total=len(outputs)
+            if limit is not None:
+                outputs=outputs[offset:offset+limit]
+            else:
+                outputs=outputs[offset:]
+
+            response=(etag, json.dumps(outputs), total)
+            # Only keep responses for current state
+            self.status_responses={key: value for key, value in self.status_responses.items() if value[0] == etag}
+            self.status_responses[query]=response
+
+        return response[1], 200, {'Content-Type': 'application/json; charset=utf-8', 'ETag': etag, 'X-Total-Count': str(response[2])}
 
     def drive_status_json(self):
         """ Simple class function to send HTML to browser """
         return json.dumps(self.drive_status), 200, {'Content-Type': 'application/json; charset=utf-8'}
 
+    def queue_list(self):
+        """ Get unfinished jobs from the job store, or the updated queue if it is unavailable """
+        try:
+            jobs = JobStore(JobStore.dbPath(self.settings))
+            queue = jobs.jobs(["queued","loading","ripping","converting"])
+            jobs.close()
+        except Exception as e:
+            print(f"Job store unavailable: {repr(e)}")
+            return self.queue
+
+        for media_sample in queue:
+            media_sample.pop('config_data', None)
+            media_sample.pop('settings', None)
+        return queue
+
     def queue_json(self):
-        """ Simple class function to send HTML to browser """
-        return json.dumps(self.queue), 200, {'Content-Type': 'application/json; charset=utf-8'}
+        """ Send unfinished jobs """
+        return json.dumps(self.queue_list()), 200, {'Content-Type': 'application/json; charset=utf-8'}
 
-    def queue_status(self):
-        """ Simple class function to send HTML to browser """
+    def queue_status_dict(self):
         status = {}
         status["pause"]=os.path.isfile(f"{self.settings["watch"]}/pause")
-        return json.dumps(status), 200, {'Content-Type': 'application/json; charset=utf-8'}
+        return status
+
+    def queue_status(self):
+        """ Simple class function to send HTML to browser """
+        return json.dumps(self.queue_status_dict()), 200, {'Content-Type': 'application/json; charset=utf-8'}
+
+    def publish(self,event,data):
+        """ Send an event to all event stream clients
+
+        Clients that have fallen too far behind are dropped so their browser
+        reconnects and gets a full snapshot.
+        """
+        with self.listeners_lock:
+            for listener in list(self.listeners):
+                try:
+                    listener.put_nowait((event,data))
+                except queue_module.Full:
+                    self.listeners.remove(listener)
+                    # Replace pending events with end of stream
+                    with listener.mutex:
+                        listener.queue.clear()
+                    listener.put_nowait(None)
+
+    def status_events(self):
+        """ Stream drive and queue changes as server-sent events """
+        listener = queue_module.Queue(maxsize=self.listener_max)
+        with self.listeners_lock:
+            self.listeners.append(listener)
+
+        def stream():
+            try:
+                # Full state first, changes after
+                yield "retry: 3000\n\n"
+                yield f"event: drive_status\ndata: {json.dumps({"reset":True,"data":self.drive_status})}\n\n"
+                yield f"event: queue\ndata: {json.dumps({"reset":True,"data":self.queue_list()})}\n\n"
+                yield f"event: queue_status\ndata: {json.dumps({"reset":True,"data":self.queue_status_dict()})}\n\n"
+                while True:
+                    try:
+                        item = listener.get(timeout=self.heartbeat)
+                    except queue_module.Empty:
+                        # Keep alive comment
+                        yield ": ping\n\n"
+                        continue
+                    # Client was dropped for falling behind
+                    if item is None:
+                        return
+                    event, data = item
+                    yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+            finally:
+                with self.listeners_lock:
+                    if listener in self.listeners:
+                        self.listeners.remove(listener)
+
+        return Response(stream_with_context(stream()), mimetype="text/event-stream", headers={"X-Accel-Buffering": "no"})
 
     def callback_update(self,data):
         if "drive_status" in data:
@@ -246,12 +386,15 @@ class WebInterface(object):
     async def start(self):
         """ Run Flask in a process thread that is non-blocking """
         print("Starting Flask")
+        # Keep connections open for status reporters
+        WSGIRequestHandler.protocol_version = "HTTP/1.1"
         self.web_thread = Process(target=self.app.run,
             kwargs={
                 "host":self.host,
                 "port":self.port,
                 "debug":True,
-                "use_reloader":False
+                "use_reloader":False,
+                "threaded":True
                 }
             )
         self.web_thread.start()